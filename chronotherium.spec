@@ -8,7 +8,8 @@ a = Analysis(['chronotherium/main.py'],
              binaries=[('shared/libBearLibTerminal.so', '.')],
       	     datas=[('./resources/VeraMono.ttf', '.'),
                     ('./resources/ttf-symbola/Symbola.ttf', './ttf-symbola'),
-                    ('./resources/symbola_codepage.txt', '.')],
+                    ('./resources/symbola_codepage.txt', '.'),
+                    ('./resources/vaults.txt', '.')],
              hiddenimports=[],
              hookspath=[],
              runtime_hooks=[],
@@ -0,0 +1,95 @@
+from logging import getLogger
+from threading import Condition, Thread
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+
+from chronotherium.save import SAVE_PATH, Snapshot, snapshot
+from chronotherium.timing import PhaseTimer
+
+if TYPE_CHECKING:
+    from chronotherium.scene import GameScene
+
+
+class Autosave:
+
+    # Turns between autosaves, 0 to turn autosaving off
+    INTERVAL = 50
+
+    logger = getLogger()
+
+    def __init__(self, scene: 'GameScene', timer: PhaseTimer, path: str = SAVE_PATH, interval: Optional[int] = None):
+        """
+        Periodically saves the game without making the turn loop wait for the disk. The game is snapshotted into
+        immutable bytes on the calling thread, and a worker thread writes, syncs and renames the file. If the
+        worker falls behind, only the newest snapshot is written.
+
+        :param scene: Scene of the game to save
+
+        :param timer: Timer to record the 'snapshot' and 'autosave' phases with
+
+        :param path: Where to save the game
+
+        :param interval: Turns between autosaves, INTERVAL if not given
+        """
+        self.scene = scene
+        self.timer = timer
+        self.path = path
+        self.interval = interval if interval is not None else self.INTERVAL
+        self._last_tick = scene.time.time
+        # Terrain version and packed terrain of every floor as of the last snapshot
+        self._terrain: Dict[int, Tuple[int, bytes]] = {}
+        self._pending: Optional[Snapshot] = None
+        self._closed = False
+        self._condition = Condition()
+        self._thread = None
+
+    def update(self):
+        """
+        Called after every key the game handles. Snapshots the game once the interval has passed.
+        """
+        if self.interval <= 0 or self._closed:
+            return
+        if self.scene.time.time - self._last_tick < self.interval:
+            return
+        self._last_tick = self.scene.time.time
+
+        game_map = self.scene.map
+        with self.timer.phase('snapshot'):
+            # Only the floors whose terrain changed since the last snapshot are packed again
+            unchanged = {index: terrain for index, (version, terrain) in self._terrain.items()
+                         if game_map.terrain_version(index) == version}
+            pending = snapshot(self.scene, unchanged)
+        self._terrain = {index: (game_map.terrain_version(index), terrain)
+                         for index, terrain in enumerate(pending.terrain)}
+
+        with self._condition:
+            self._pending = pending
+            self._condition.notify()
+        if self._thread is None:
+            self._thread = Thread(target=self._run, name='autosave', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._pending is None and not self._closed:
+                    self._condition.wait()
+                if self._pending is None:
+                    return
+                pending = self._pending
+                self._pending = None
+            try:
+                with self.timer.phase('autosave'):
+                    pending.write(self.path, sync=True)
+            except OSError as err:
+                self.logger.warning(f'Autosave failed: {err}')
+
+    def close(self):
+        """
+        Waits for the snapshot being written, if any, and stops the worker
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
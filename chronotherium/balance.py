@@ -0,0 +1,337 @@
+"""
+Monte Carlo balance analysis. Simulates melee encounters and whole runs with NumPy, one array element
+per encounter, using the stats and rules constants of the entity classes. Run it with
+
+    python -m chronotherium.balance [--encounters N] [--runs N] [--policy melee|skills] [--seed SEED]
+
+An encounter is a duel between the player and one enemy that is already adjacent, the player moving first.
+Turns play out as they do in GameScene.run_turn: the player acts and heals, then the enemy acts. An enemy
+killed by the player still takes the turn it was killed in, as it does in the game.
+
+A run clears every floor in turn. Each floor gets as many enemies as Map.populate_floor would place on a
+generated floor of the same index and layout, fought in a random order. Between fights the player walks for
+--travel turns, healing as Player.turn does, and picks up whatever the enemy dropped. The Chronotherium is
+fought last.
+Positioning is not modelled: Golems always see the player, Wormhole doesn't push and Event Horizon hits a
+single enemy.
+"""
+from argparse import ArgumentParser
+from time import perf_counter
+from typing import Dict, List, Sequence
+import sys
+
+import numpy as np
+
+from chronotherium.entities.chronotherium import Chronotherium
+from chronotherium.entities.items import HealthPotion, TimePotion
+from chronotherium.entities.player import Player, Freeze, Push, Diagonal
+from chronotherium.map import Map
+from chronotherium.rand import RNG
+from chronotherium.time import Time
+
+
+ENEMIES = Map.ENEMIES
+BOSS = Chronotherium
+LEVELS = Player.LEVELS
+# Level each skill is learned at
+LEARNED = {Freeze: 0, **{level['skill']: number for number, level in LEVELS.items()}}
+THRESHOLDS = np.array([LEVELS[number]['xp'] for number in sorted(LEVELS)])
+
+MELEE = 'melee'
+SKILLS = 'skills'
+POLICIES = [MELEE, SKILLS]
+
+# Encounters still going after this many turns count as lost
+MAX_TURNS = 200
+TRAVEL_TURNS = 20
+
+
+def level_for(xp: np.ndarray) -> np.ndarray:
+    """
+    Returns the level reached with the given XP, as Player.level_up would
+    """
+    return np.searchsorted(THRESHOLDS, xp, side='left')
+
+
+def d6(rng: np.random.Generator, count: int, limit: np.ndarray) -> np.ndarray:
+    """
+    Rolls count dice, True where the roll is over limit
+    """
+    return rng.integers(1, 7, count) > limit
+
+
+class Players:
+
+    def __init__(self, count: int, level: int = 0):
+        """
+        The player of each of a batch of encounters or runs, at full health.
+
+        :param count: Number of players
+
+        :param level: Level to start at
+        """
+        self.count = count
+        self.level = np.full(count, level)
+        self.xp = np.zeros(count, dtype=int)
+        if level > 0:
+            self.xp[:] = THRESHOLDS[level - 1] + 1
+        self.hp = self.max_hp.copy()
+        self.tp = self.max_tp.copy()
+        self.heal_clock = np.zeros(count, dtype=int)
+        self.alive = np.ones(count, dtype=bool)
+        self.hp_lost = np.zeros(count, dtype=int)
+
+    @property
+    def max_hp(self) -> np.ndarray:
+        return Player.BASE_HP + self.level * Player.HP_PER_LEVEL
+
+    @property
+    def max_tp(self) -> np.ndarray:
+        return Player.BASE_TP + self.level * Player.TP_PER_LEVEL
+
+    def knows(self, skill) -> np.ndarray:
+        return self.level >= LEARNED[skill]
+
+    def skill_damage(self, skill) -> np.ndarray:
+        # As the damage properties of Player
+        if skill is Freeze:
+            return Freeze.DAMAGE + self.level // 4
+        if skill is Push:
+            return Push.DAMAGE + self.level // 3
+        return np.full(self.count, skill.DAMAGE)
+
+    @property
+    def bump_damage(self) -> np.ndarray:
+        return Player.BUMP_DAMAGE + self.level // 4
+
+    def heal(self, mask: np.ndarray, turns: int = 1):
+        """
+        Passes turns turns for the players in mask, recovering HP and TP as Player.turn does
+        """
+        hurt = mask & ((self.hp < self.max_hp) | (self.tp < self.max_tp))
+        self.heal_clock += hurt * turns
+        ticks = self.heal_clock // Player.HEAL_RATE
+        self.heal_clock %= Player.HEAL_RATE
+        self.hp = np.minimum(self.hp + ticks, np.maximum(self.hp, self.max_hp))
+        self.tp = np.minimum(self.tp + ticks, np.maximum(self.tp, self.max_tp))
+
+    def gain_xp(self, xp: np.ndarray):
+        self.xp += xp
+        self.level = np.maximum(self.level, level_for(self.xp))
+
+
+class Enemies:
+
+    def __init__(self, kinds: Sequence[type], index: np.ndarray):
+        """
+        The enemy of each of a batch of encounters, with its stats taken from its class.
+
+        :param kinds: Enemy classes
+
+        :param index: Index into kinds of the enemy of each encounter
+        """
+        def column(attribute: str) -> np.ndarray:
+            return np.array([getattr(kind, attribute, 0) or 0 for kind in kinds])[index]
+
+        self.hp = column('BASE_HP')
+        self.tp = column('BASE_TP')
+        self.bump_damage = column('BUMP_DAMAGE')
+        self.bump_limit = column('BUMP_LIMIT')
+        self.xp = column('XP')
+        self.drop_chance = column('DROP_CHANCE')
+        self.drop_hp = np.array([HealthPotion.HP if kind.DROP is HealthPotion else 0 for kind in kinds])[index]
+        self.drop_tp = np.array([TimePotion.TP if kind.DROP is TimePotion else 0 for kind in kinds])[index]
+        # Only Golems drain, every TP_DRAIN_RATE turns
+        self.drain_rate = column('TP_DRAIN_RATE')
+        self.drain_cost = column('TP_DRAIN_COST')
+        self.drain_limit = column('TP_DRAIN_LIMIT')
+        self.drain_amount = column('TP_DRAIN_AMOUNT')
+        self.drain_clock = np.zeros(len(index), dtype=int)
+        self.frozen = np.zeros(len(index), dtype=int)
+
+
+def fight(rng: np.random.Generator, players: Players, enemies: Enemies, active: np.ndarray,
+          policy: str = MELEE) -> Dict[str, np.ndarray]:
+    """
+    Plays out the encounters in active until the player or the enemy of each of them is dead, updating
+    players and enemies in place.
+
+    :param policy: MELEE to only bump, SKILLS to cast the strongest affordable skill known each turn,
+    Freeze whenever the enemy isn't frozen
+
+    :return: Whether each encounter was won, the number of turns it took and the HP the player lost
+    """
+    count = players.count
+    fighting = active & players.alive
+    won = np.zeros(count, dtype=bool)
+    turns = np.zeros(count, dtype=int)
+    hp = players.hp.copy()
+
+    for turn in range(0, MAX_TURNS):
+        if not fighting.any():
+            break
+
+        # The player's turn
+        damage = np.where(d6(rng, count, Player.BUMP_LIMIT), players.bump_damage, 0)
+        cost = np.zeros(count, dtype=int)
+        freeze = np.zeros(count, dtype=bool)
+        if policy == SKILLS:
+            best = players.bump_damage
+            for skill in (Push, Diagonal):
+                cast = players.knows(skill) & (players.tp >= skill.COST) & (players.skill_damage(skill) > best)
+                best = np.where(cast, players.skill_damage(skill), best)
+                cost = np.where(cast, skill.COST, cost)
+            damage = np.where(cost > 0, best, damage)
+            freeze = players.knows(Freeze) & (players.tp >= Freeze.COST) & (enemies.frozen <= 0)
+            damage = np.where(freeze, players.skill_damage(Freeze), damage)
+            cost = np.where(freeze, Freeze.COST, cost)
+        enemies.hp -= damage * fighting
+        players.tp -= cost * fighting
+        # Frozen for randrange(1, 3) turns, plus the two Input.freeze adds
+        enemies.frozen += (freeze & fighting) * (rng.integers(1, 3, count) + 2)
+        killed = fighting & (enemies.hp <= 0)
+        players.heal(fighting)
+
+        # The enemy's turn, as Golem.drain_tp and Enemy.ai_behavior
+        can_drain = fighting & (enemies.drain_rate > 0) & (enemies.tp >= enemies.drain_cost)
+        enemies.drain_clock += can_drain
+        draining = can_drain & (enemies.drain_clock % np.maximum(enemies.drain_rate, 1) == 0)
+        enemies.tp -= enemies.drain_cost * draining
+        drained = draining & d6(rng, count, enemies.drain_limit)
+        players.tp = np.maximum(players.tp - enemies.drain_amount * drained, 0)
+
+        acting = fighting & ~drained
+        hit = acting & (enemies.frozen <= 0) & d6(rng, count, enemies.bump_limit)
+        players.hp -= enemies.bump_damage * hit
+        enemies.frozen -= acting & (enemies.frozen > 0)
+
+        turns += fighting
+        dead = fighting & (players.hp <= 0)
+        players.alive &= ~dead
+        won |= killed & ~dead
+        fighting &= ~(killed | dead)
+
+    players.alive &= ~fighting
+    lost = np.where(active, np.maximum(hp - players.hp, 0), 0)
+    players.hp_lost += lost
+    return {'won': won, 'turns': turns, 'hp_lost': lost}
+
+
+def duels(rng: np.random.Generator, encounters: int, policy: str) -> List[str]:
+    """
+    Fights every enemy at every level from full health, encounters times each
+    """
+    lines = [f'{"Enemy":<18}{"Level":>6}{"Win %":>8}{"HP lost":>9}{"Turns":>7}']
+    for kind in list(ENEMIES) + [BOSS]:
+        for level in range(0, len(LEVELS) + 1):
+            players = Players(encounters, level)
+            enemies = Enemies([kind], np.zeros(encounters, dtype=int))
+            result = fight(rng, players, enemies, np.ones(encounters, dtype=bool), policy)
+            lines.append(f'{kind.NAME:<18}{level:>6}{result["won"].mean() * 100:>8.2f}'
+                         f'{result["hp_lost"].mean():>9.2f}{result["turns"].mean():>7.2f}')
+    return lines
+
+
+def open_tile_counts(maps: int, seed: int) -> np.ndarray:
+    """
+    Generates maps whole maps, so that every floor has the layout and stairs the game gives its index, and
+    returns how many open tiles each floor had when its enemies were placed, shape (maps, Map.FLOORS)
+    """
+    counts = []
+    for i in range(0, maps):
+        game_map = Map(None, Time(), RNG(seed + i))
+        counts.append([game_map.get_floor(index).open_count for index in range(0, Map.FLOORS)])
+    return np.array(counts)
+
+
+def roster(rng: np.random.Generator, open_tiles: np.ndarray) -> np.ndarray:
+    """
+    Returns the enemies of one floor of each run as indices into ENEMIES in a random order, padded with -1
+
+    :param open_tiles: Number of open tiles of the floor of each run
+    """
+    total = (open_tiles / Map.ENEMY_DENSITY).astype(int)
+    counts = np.stack([(total * kind.DENSITY).astype(int) for kind in ENEMIES], axis=1)
+    ends = np.cumsum(counts, axis=1)
+    slots = np.arange(0, max(int(ends[:, -1].max()), 1))
+    kinds = (slots[None, :, None] >= ends[:, None, :]).sum(axis=2)
+    valid = slots[None, :] < ends[:, -1:]
+    order = np.argsort(np.where(valid, rng.random(kinds.shape), 2.0), axis=1)
+    return np.where(np.take_along_axis(valid, order, axis=1), np.take_along_axis(kinds, order, axis=1), -1)
+
+
+def runs(rng: np.random.Generator, count: int, open_tiles: np.ndarray, policy: str, travel: int) -> List[str]:
+    """
+    Plays count runs through every floor and reports how they fared floor by floor
+
+    :param open_tiles: Open tiles of the floors of generated maps, shape (maps, Map.FLOORS), as open_tile_counts returns
+    """
+    players = Players(count)
+    lines = [f'{"Floor":<6}{"Reached %":>10}{"Cleared %":>10}{"Fights":>8}{"HP lost":>9}{"XP":>7}{"Level":>7}']
+    for floor in range(0, Map.FLOORS):
+        reached = players.alive.copy()
+        players.hp_lost[:] = 0
+        enemies = roster(rng, rng.choice(open_tiles[:, floor], count))
+        fights = np.zeros(count, dtype=int)
+        for slot in range(0, enemies.shape[1]):
+            active = players.alive & (enemies[:, slot] >= 0)
+            opponents = Enemies(ENEMIES, np.maximum(enemies[:, slot], 0))
+            result = fight(rng, players, opponents, active, policy)
+            fights += active
+            after(rng, players, opponents, result['won'], travel)
+        if floor == Map.FLOORS - 1:
+            opponents = Enemies([BOSS], np.zeros(count, dtype=int))
+            active = players.alive.copy()
+            fight(rng, players, opponents, active, policy)
+            fights += active
+
+        started = max(int(reached.sum()), 1)
+        lines.append(f'{floor:<6}{reached.mean() * 100:>10.2f}{(players.alive.sum() / started) * 100:>10.2f}'
+                     f'{fights[reached].mean() if reached.any() else 0:>8.2f}'
+                     f'{players.hp_lost[reached].mean() if reached.any() else 0:>9.2f}'
+                     f'{players.xp[players.alive].mean() if players.alive.any() else 0:>7.2f}'
+                     f'{players.level[players.alive].mean() if players.alive.any() else 0:>7.2f}')
+    lines.append(f'Victories: {players.alive.mean() * 100:.2f}%')
+    return lines
+
+
+def after(rng: np.random.Generator, players: Players, enemies: Enemies, won: np.ndarray, travel: int):
+    """
+    Awards the XP and drops of the encounters won and walks to the next fight
+    """
+    players.gain_xp(enemies.xp * won)
+    dropped = won & (rng.random(players.count) < enemies.drop_chance)
+    players.hp = np.where(dropped, np.minimum(players.hp + enemies.drop_hp, np.maximum(players.hp, players.max_hp)),
+                          players.hp)
+    players.tp = np.where(dropped, np.minimum(players.tp + enemies.drop_tp, np.maximum(players.tp, players.max_tp)),
+                          players.tp)
+    players.heal(players.alive, travel)
+
+
+def main() -> int:
+    parser = ArgumentParser(description='Simulate encounters and runs to check the balance of the game')
+    parser.add_argument('--encounters', type=int, default=100000, help='Encounters per enemy and level')
+    parser.add_argument('--runs', type=int, default=100000, help='Number of runs through the whole game')
+    parser.add_argument('--maps', type=int, default=30, help='Maps to generate to count open tiles')
+    parser.add_argument('--policy', choices=POLICIES, default=MELEE, help='How the player fights')
+    parser.add_argument('--travel', type=int, default=TRAVEL_TURNS, help='Turns walked between fights')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the simulation')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    start = perf_counter()
+    print(f'Duels from full health, {args.encounters} each, policy {args.policy}')
+    for line in duels(rng, args.encounters, args.policy):
+        print(line)
+    print()
+    open_tiles = open_tile_counts(args.maps, args.seed)
+    print(f'{args.runs} runs, open tiles per floor on average: ' +
+          ', '.join(f'{count:.0f}' for count in open_tiles.mean(axis=0)))
+    for line in runs(rng, args.runs, open_tiles, args.policy, args.travel):
+        print(line)
+    print(f'\nSimulated in {perf_counter() - start:.1f} s')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
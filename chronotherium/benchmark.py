@@ -0,0 +1,78 @@
+"""
+Import-time benchmark. Worker processes import the game modules on startup, so this keeps
+
+    python -c "import chronotherium.map"
+
+within IMPORT_BUDGET and free of heavy or terminal-touching imports. Run it with
+
+    python -m chronotherium.benchmark [--runs N] [--budget SECONDS]
+
+It exits with a non-zero status if the budget is exceeded.
+"""
+from argparse import ArgumentParser
+from statistics import median
+from time import perf_counter
+from typing import List
+import os
+import subprocess
+import sys
+
+
+# Seconds importing chronotherium.map may add to interpreter startup
+IMPORT_BUDGET = 0.1
+MODULE = 'chronotherium.map'
+# Modules that must only be imported once they are actually used
+LAZY_MODULES = ['numpy']
+
+
+def python_env() -> dict:
+    """
+    Returns the environment for a fresh interpreter that imports this checkout of the game
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [root, os.environ.get('PYTHONPATH')])))
+
+
+def time_command(code: str, runs: int) -> List[float]:
+    env = python_env()
+    timings = []
+    for i in range(0, runs):
+        start = perf_counter()
+        subprocess.run([sys.executable, '-c', code], env=env, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        timings.append(perf_counter() - start)
+    return timings
+
+
+def lazy_modules_imported(module: str) -> List[str]:
+    code = f'import sys, {module}; print(" ".join(m for m in {LAZY_MODULES!r} if m in sys.modules))'
+    output = subprocess.run([sys.executable, '-c', code], env=python_env(), check=True, capture_output=True,
+                            text=True)
+    return output.stdout.split()
+
+
+def main() -> int:
+    parser = ArgumentParser(description='Measure how long importing the game modules takes')
+    parser.add_argument('--runs', type=int, default=15, help='Number of timed imports')
+    parser.add_argument('--budget', type=float, default=IMPORT_BUDGET, help='Budget in seconds')
+    args = parser.parse_args()
+
+    baseline = median(time_command('pass', args.runs))
+    total = median(time_command(f'import {MODULE}', args.runs))
+    cost = total - baseline
+    print(f'import {MODULE}: {cost * 1000:.1f} ms over a {baseline * 1000:.1f} ms interpreter startup '
+          f'(budget {args.budget * 1000:.0f} ms)')
+
+    failed = False
+    if cost > args.budget:
+        print('Over budget!')
+        failed = True
+    imported = lazy_modules_imported(MODULE)
+    if imported:
+        print(f'Imported eagerly: {", ".join(imported)}')
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
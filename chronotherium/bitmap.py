@@ -0,0 +1,131 @@
+from typing import TYPE_CHECKING, Iterable, Iterator
+
+from clubsandwich.geom import Point, Rect, Size
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+class Bitmap:
+
+    def __init__(self, size: Size, bits: int = 0):
+        """
+        A set of points on a floor stored as one bit per cell, packed row by row into a single integer.
+        Unions, intersections and neighbourhood tests are whole-map integer operations.
+
+        :param size: Size of the floor the bitmap covers
+
+        :param bits: Initial contents, bit (y * width + x) being the point (x, y)
+        """
+        self.size = size
+        self.width = size.width
+        self.height = size.height
+        self.full = (1 << (self.width * self.height)) - 1
+        self.bits = bits & self.full
+
+    @classmethod
+    def from_points(cls, size: Size, points: Iterable[Point]) -> 'Bitmap':
+        width = size.width
+        height = size.height
+        bits = 0
+        for point in points:
+            if 0 <= point.x < width and 0 <= point.y < height:
+                bits |= 1 << (point.y * width + point.x)
+        return cls(size, bits)
+
+    @classmethod
+    def from_rect(cls, size: Size, rect: Rect) -> 'Bitmap':
+        """
+        Returns the bitmap of the points of rect that are on the floor
+        """
+        x1, y1 = max(rect.x, 0), max(rect.y, 0)
+        x2, y2 = min(rect.x2, size.width - 1), min(rect.y2, size.height - 1)
+        if x1 > x2 or y1 > y2:
+            return cls(size)
+        row = ((1 << (x2 - x1 + 1)) - 1) << x1
+        bits = 0
+        for y in range(y1, y2 + 1):
+            bits |= row << (y * size.width)
+        return cls(size, bits)
+
+    def _column_mask(self, column: int) -> int:
+        """
+        Returns the bits of every cell in the given column
+        """
+        row = 1 << column
+        mask = 0
+        for y in range(0, self.height):
+            mask |= row << (y * self.width)
+        return mask
+
+    def __contains__(self, point: Point) -> bool:
+        if not (0 <= point.x < self.width and 0 <= point.y < self.height):
+            return False
+        return bool(self.bits >> (point.y * self.width + point.x) & 1)
+
+    def __or__(self, other: 'Bitmap') -> 'Bitmap':
+        return Bitmap(self.size, self.bits | other.bits)
+
+    def __ior__(self, other: 'Bitmap') -> 'Bitmap':
+        self.bits |= other.bits
+        return self
+
+    def __and__(self, other: 'Bitmap') -> 'Bitmap':
+        return Bitmap(self.size, self.bits & other.bits)
+
+    def __invert__(self) -> 'Bitmap':
+        return Bitmap(self.size, ~self.bits & self.full)
+
+    def __len__(self) -> int:
+        return bin(self.bits).count('1')
+
+    def __bool__(self) -> bool:
+        return self.bits != 0
+
+    def __iter__(self) -> Iterator[Point]:
+        return self.points()
+
+    def points(self) -> Iterator[Point]:
+        """
+        Yields the set points in row order
+        """
+        bits = self.bits
+        width = self.width
+        while bits:
+            low = bits & -bits
+            index = low.bit_length() - 1
+            yield Point(index % width, index // width)
+            bits ^= low
+
+    def to_bytes(self) -> bytes:
+        """
+        Returns the bits packed little-endian, eight cells per byte in row order
+        """
+        return self.bits.to_bytes((self.width * self.height + 7) // 8, 'little')
+
+    def array(self) -> 'np.ndarray':
+        """
+        Returns the bitmap as a boolean array, shape (height, width)
+        """
+        import numpy as np
+
+        bits = np.unpackbits(np.frombuffer(self.to_bytes(), dtype=np.uint8), bitorder='little')
+        return bits[:self.width * self.height].reshape(self.height, self.width).astype(bool)
+
+    def add(self, point: Point):
+        if 0 <= point.x < self.width and 0 <= point.y < self.height:
+            self.bits |= 1 << (point.y * self.width + point.x)
+
+    def discard(self, point: Point):
+        if 0 <= point.x < self.width and 0 <= point.y < self.height:
+            self.bits &= ~(1 << (point.y * self.width + point.x))
+
+    def dilate(self) -> 'Bitmap':
+        """
+        Returns a bitmap with every point of this one plus its eight neighbours
+        """
+        bits = self.bits
+        # Shifting along a row must not wrap around into the neighbouring row
+        horizontal = bits | (bits << 1) & ~self._column_mask(0) | (bits >> 1) & ~self._column_mask(self.width - 1)
+        dilated = horizontal | (horizontal << self.width) | (horizontal >> self.width)
+        return Bitmap(self.size, dilated)
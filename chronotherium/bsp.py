@@ -0,0 +1,133 @@
+from array import array
+from typing import List, Optional, Tuple
+
+from clubsandwich.geom import Point, Rect, Size
+
+from chronotherium.rand import Stream
+
+
+class BSP:
+
+    # Levels of splits below the root
+    DEPTH = 8
+    # Parent of the root and children of the leaves
+    NONE = -1
+
+    def __init__(self, size: Size, leaf_min: int, rng: Stream):
+        """
+        Splits a floor into rectangles by binary space partitioning. Nodes are indices into flat arrays holding
+        their rects, parents and children, rather than objects linked to each other, and the leaves and sibling
+        pairs are listed once as the tree is built.
+
+        The splits are rolled in the same order as clubsandwich's RandomBSPTree rolls them.
+
+        :param size: Size of the floor
+
+        :param leaf_min: Smallest width and height a leaf is split down to
+
+        :param rng: Stream the splits are drawn from
+        """
+        self.leaf_min = leaf_min
+        self.rng = rng
+        # Rect of every node
+        self.x = array('i')
+        self.y = array('i')
+        self.width = array('i')
+        self.height = array('i')
+        # Whether each node is split across its width rather than its height
+        self.horizontal = bytearray()
+        self.parent = array('i')
+        self.child_a = array('i')
+        self.child_b = array('i')
+        # Leaves from the top left to the bottom right
+        self.leaves: List[int] = []
+        # Room of every leaf
+        self.rooms: List[Optional[Rect]] = []
+        # Whether each node has been connected to its sibling
+        self.connected = bytearray()
+
+        self._add(0, 0, size.width, size.height, True, self.NONE)
+        self._split()
+
+    def __len__(self) -> int:
+        return len(self.x)
+
+    def _add(self, x: int, y: int, width: int, height: int, horizontal: bool, parent: int) -> int:
+        self.x.append(x)
+        self.y.append(y)
+        self.width.append(width)
+        self.height.append(height)
+        self.horizontal.append(horizontal)
+        self.parent.append(parent)
+        self.child_a.append(self.NONE)
+        self.child_b.append(self.NONE)
+        self.rooms.append(None)
+        self.connected.append(False)
+        return len(self.x) - 1
+
+    def _split(self):
+        # Depth first, child A before child B, which is the order RandomBSPTree rolls its splits in
+        stack = [(0, self.DEPTH)]
+        while stack:
+            node, depth = stack.pop()
+            horizontal = self.horizontal[node]
+            length = self.width[node] if horizontal else self.height[node]
+            low = self.leaf_min
+            high = length - 1 - self.leaf_min * 2
+            if depth < 1 or high - low < 1:
+                self.leaves.append(node)
+                continue
+
+            value = self.rng.randrange(low, high)
+            x, y, width, height = self.x[node], self.y[node], self.width[node], self.height[node]
+            if horizontal:
+                a = self._add(x, y, value, height, False, node)
+                b = self._add(x + value + 1, y, width - value - 1, height, False, node)
+            else:
+                a = self._add(x, y, width, value, True, node)
+                b = self._add(x, y + value + 1, width, height - value - 1, True, node)
+            self.child_a[node] = a
+            self.child_b[node] = b
+            stack.append((b, depth - 1))
+            stack.append((a, depth - 1))
+
+    def rect(self, node: int) -> Rect:
+        return Rect(Point(self.x[node], self.y[node]), Size(self.width[node], self.height[node]))
+
+    def random_rect(self, node: int, min_size: int) -> Rect:
+        """
+        Returns a random rect inside a node at least min_size across each way, or the node's rect if one won't
+        fit. It is rolled the way clubsandwich's Rect.get_random_rect rolls one.
+        """
+        width, height = self.width[node], self.height[node]
+        if width <= min_size or height <= min_size:
+            return self.rect(node)
+        room_width = self.rng.randint(min_size, width)
+        room_height = self.rng.randint(min_size, height)
+        x = self.x[node] + self.rng.randint(0, width - room_width)
+        y = self.y[node] + self.rng.randint(0, height - room_height)
+        return Rect(Point(x, y), Size(room_width, room_height))
+
+    def sibling(self, node: int) -> int:
+        parent = self.parent[node]
+        if parent == self.NONE:
+            return self.NONE
+        return self.child_b[parent] if self.child_a[parent] == node else self.child_a[parent]
+
+    def sibling_pairs(self) -> List[Tuple[int, int]]:
+        """
+        Returns the children of every split node, deepest first: the pairs under child A, then those under child
+        B, then the node's own
+        """
+        pairs = []
+        # Visiting child B before child A and reversing lists every node after both of its subtrees
+        stack = [0]
+        while stack:
+            node = stack.pop()
+            if self.child_a[node] == self.NONE:
+                continue
+            pairs.append((self.child_a[node], self.child_b[node]))
+            stack.append(self.child_a[node])
+            stack.append(self.child_b[node])
+        pairs.reverse()
+        return pairs
@@ -0,0 +1,158 @@
+from typing import List, Tuple
+
+import numpy as np
+from clubsandwich.geom import Size
+
+from chronotherium.stamps import FLOOR, wall_codes
+
+
+def neighbor_count(cells: np.ndarray) -> np.ndarray:
+    """
+    Returns how many of the eight neighbours of every cell are set, counting cells off the edge as unset
+    """
+    height, width = cells.shape
+    padded = np.zeros((height + 2, width + 2), dtype=np.uint8)
+    padded[1:-1, 1:-1] = cells
+    count = np.zeros((height, width), dtype=np.uint8)
+    for dy in (0, 1, 2):
+        for dx in (0, 1, 2):
+            if dy != 1 or dx != 1:
+                count += padded[dy:dy + height, dx:dx + width]
+    return count
+
+
+def label_components(cells: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Labels the orthogonally connected components of the set cells. The runs of set cells of each row are found
+    with array operations, and only the runs are joined up one by one.
+
+    :return: The label of every cell, 0 for unset cells and 1 onwards for the components, and the size of each
+    component by label, entry 0 being unused
+    """
+    height, width = cells.shape
+    padded = np.zeros((height, width + 2), dtype=np.int8)
+    padded[:, 1:-1] = cells
+    edges = np.diff(padded, axis=1)
+    rows, starts = np.nonzero(edges == 1)
+    _, ends = np.nonzero(edges == -1)
+    row_first = np.searchsorted(rows, np.arange(0, height + 1)).tolist()
+    starts_list = starts.tolist()
+    ends_list = ends.tolist()
+
+    parent = list(range(0, len(starts_list)))
+
+    def find(run: int) -> int:
+        while parent[run] != run:
+            parent[run] = parent[parent[run]]
+            run = parent[run]
+        return run
+
+    for y in range(0, height - 1):
+        above, above_end = row_first[y], row_first[y + 1]
+        below, below_end = row_first[y + 1], row_first[y + 2]
+        while above < above_end and below < below_end:
+            if starts_list[above] < ends_list[below] and starts_list[below] < ends_list[above]:
+                parent[find(above)] = find(below)
+            if ends_list[above] < ends_list[below]:
+                above += 1
+            else:
+                below += 1
+
+    roots = np.array([find(run) for run in range(0, len(parent))], dtype=np.int64)
+    _, run_labels = np.unique(roots, return_inverse=True)
+    lengths = ends - starts
+    labels = np.zeros((height, width), dtype=np.int32)
+    # Every cell of every run, in order, with the label of its run
+    offsets = np.repeat(np.cumsum(lengths) - lengths - starts, lengths)
+    columns = np.arange(0, int(lengths.sum())) - offsets
+    labels[np.repeat(rows, lengths), columns] = np.repeat(run_labels + 1, lengths)
+    sizes = np.bincount(run_labels + 1, weights=lengths, minlength=1)
+    return labels, sizes.astype(np.int64)
+
+
+class Caves:
+
+    # Chance of each cell starting out as rock
+    FILL = 0.45
+    # Smoothing passes. A cell becomes rock when at least ROCK of its neighbours are rock, or KEEP if it already is.
+    PASSES = 4
+    ROCK = 5
+    KEEP = 4
+    # Pockets of open cells smaller than this are filled in rather than tunnelled to
+    POCKET_MIN = 8
+
+    def __init__(self, size: Size, seed: int):
+        """
+        Generates a cave floor with cellular automata. Random rock is smoothed by passes of neighbourhood sums
+        over the whole floor, the largest open area is kept and every other area big enough to matter is joined
+        to it by a tunnel. The result is a single connected cave.
+
+        :param size: Size of the floor
+
+        :param seed: Seed of the random fill
+        """
+        self.size = size
+        self.generator = np.random.default_rng(seed)
+
+    def open_cells(self) -> np.ndarray:
+        """
+        Returns whether every cell of the floor is open, shape (height, width). The cells along the edges are
+        always rock.
+        """
+        height, width = self.size.height, self.size.width
+        rock = self.generator.random((height, width)) < self.FILL
+        rock[[0, -1], :] = True
+        rock[:, [0, -1]] = True
+        for _ in range(0, self.PASSES):
+            # Cells off the edge count as rock
+            count = 8 - neighbor_count(~rock)
+            rock = (count >= self.ROCK) | rock & (count >= self.KEEP)
+            rock[[0, -1], :] = True
+            rock[:, [0, -1]] = True
+        open_cells = ~rock
+
+        labels, sizes = label_components(open_cells)
+        if len(sizes) <= 1:
+            return open_cells
+        main = int(np.argmax(sizes))
+        open_cells[np.isin(labels, np.nonzero(sizes < self.POCKET_MIN)[0])] = False
+        main_rows, main_columns = np.nonzero(labels == main)
+        for label in np.nonzero(sizes >= self.POCKET_MIN)[0]:
+            if label == main:
+                continue
+            rows, columns = np.nonzero(labels == label)
+            self.tunnel(open_cells, self.closest(rows, columns, main_rows, main_columns))
+        return open_cells
+
+    @staticmethod
+    def closest(rows: np.ndarray, columns: np.ndarray, to_rows: np.ndarray,
+                to_columns: np.ndarray) -> List[Tuple[int, int]]:
+        """
+        Returns a pair of cells, one of each set, that are close together: the cell of the second set closest to
+        the first cell of the first set, and the cell of the first set closest to that
+        """
+        distance = np.maximum(np.abs(to_rows - rows[0]), np.abs(to_columns - columns[0]))
+        to = int(np.argmin(distance))
+        distance = np.maximum(np.abs(rows - to_rows[to]), np.abs(columns - to_columns[to]))
+        start = int(np.argmin(distance))
+        return [(int(rows[start]), int(columns[start])), (int(to_rows[to]), int(to_columns[to]))]
+
+    @staticmethod
+    def tunnel(open_cells: np.ndarray, ends: List[Tuple[int, int]]):
+        """
+        Opens an L shaped tunnel between two cells, along the row of the first and then the column of the second
+        """
+        (y1, x1), (y2, x2) = ends
+        open_cells[y1, min(x1, x2):max(x1, x2) + 1] = True
+        open_cells[min(y1, y2):max(y1, y2) + 1, x2] = True
+
+    def kinds(self) -> np.ndarray:
+        """
+        Returns the kind code of every cell of the cave, shape (height, width). Rock next to open cells becomes
+        walls facing each other, and the rest is left Empty.
+        """
+        open_cells = self.open_cells()
+        walls = ~open_cells & (neighbor_count(open_cells) > 0)
+        codes = wall_codes(walls)
+        codes[open_cells] = FLOOR
+        return codes
@@ -0,0 +1,105 @@
+from collections import deque
+from enum import IntFlag
+from typing import Deque, Optional, Set, Tuple
+
+
+class Change(IntFlag):
+    # The kind of tile of a cell or the state of its door
+    TERRAIN = 1
+    # Whether a cell lets light through
+    SIGHT = 2
+    # Who is standing on a cell
+    OCCUPANCY = 4
+    ALL = TERRAIN | SIGHT | OCCUPANCY
+
+
+class ChangeLog:
+
+    # Changes kept in the journal. Asking for the changes since a version older than the journal reaches back
+    # returns None.
+    LENGTH = 1024
+
+    def __init__(self, version: int = 0, terrain: int = 0, sight: int = 0, occupancy: int = 0):
+        """
+        Versions a floor. Every change to a cell bumps the version and is journalled as (version, cell, change),
+        and the version of the last change of each kind is kept, so that anything derived from a floor can store
+        the version it was built at and later ask which cells changed since, rather than rebuild from scratch.
+
+        :param version: Version of the floor. The journal starts empty, as though it had just been emptied.
+
+        :param terrain: Version of the last terrain change
+
+        :param sight: Version of the last sight change
+
+        :param occupancy: Version of the last occupancy change
+        """
+        self.version = version
+        self.terrain = terrain
+        self.sight = sight
+        self.occupancy = occupancy
+        # (version, floor index of the cell, change), oldest first
+        self._journal: Deque[Tuple[int, int, Change]] = deque(maxlen=self.LENGTH)
+
+    def state(self) -> Tuple[int, int, int, int]:
+        """
+        Returns the versions the log was made with, to make an equivalent log with later
+        """
+        return self.version, self.terrain, self.sight, self.occupancy
+
+    def record(self, index: int, change: Change):
+        """
+        :param index: Floor index of the cell that changed, y * width + x
+
+        :param change: What changed about it
+        """
+        self._bump(change)
+        self._journal.append((self.version, index, change))
+
+    def record_area(self, change: Change):
+        """
+        Records a change to more cells than are worth journalling one by one. The journal is emptied, so that
+        whatever was built before it is rebuilt.
+        """
+        self._bump(change)
+        self._journal.clear()
+
+    def _bump(self, change: Change):
+        self.version += 1
+        version = self.version
+        if change & Change.TERRAIN:
+            self.terrain = version
+        if change & Change.SIGHT:
+            self.sight = version
+        if change & Change.OCCUPANCY:
+            self.occupancy = version
+
+    def last(self, change: Change = Change.ALL) -> int:
+        """
+        Returns the version of the last change of the given kinds
+        """
+        last = 0
+        if change & Change.TERRAIN:
+            last = max(last, self.terrain)
+        if change & Change.SIGHT:
+            last = max(last, self.sight)
+        if change & Change.OCCUPANCY:
+            last = max(last, self.occupancy)
+        return last
+
+    def since(self, version: int, change: Change = Change.ALL) -> Optional[Set[int]]:
+        """
+        Returns the floor indices of the cells that had a change of the given kinds after version, or None if
+        the journal no longer reaches back that far and whatever was built at version has to be rebuilt
+        """
+        if self.last(change) <= version:
+            return set()
+        journal = self._journal
+        if not journal or journal[0][0] > version + 1:
+            return None
+        cells = set()
+        for entry_version, index, entry_change in reversed(journal):
+            if entry_version <= version:
+                break
+            if entry_change & change:
+                cells.add(index)
+        return cells
@@ -0,0 +1,65 @@
+from typing import TYPE_CHECKING, Dict, List
+
+from chronotherium.tiles.tile import KINDS, Empty
+
+if TYPE_CHECKING:
+    from chronotherium.entities.entity import Entity
+
+# Whether a cell of each kind is Empty, whether it can ever be open and whether it blocks sight, by kind code
+IS_EMPTY = [kind is Empty for kind, _ in KINDS]
+CAN_OPEN = [kind.OPEN or kind.kind_walkable() for kind, _ in KINDS]
+BLOCKS_SIGHT = [kind.BLOCK_SIGHT for kind, _ in KINDS]
+# The kind codes that are Empty and that can be open, for counting them with bytes.translate
+EMPTY_CODES = bytes(code for code, empty in enumerate(IS_EMPTY) if empty)
+OPEN_CODES = bytes(code for code, can_open in enumerate(CAN_OPEN) if can_open)
+# Maps Empty kind codes to 0 and every other code to 0xFF, for bytes.translate
+NOT_EMPTY = bytes(0 if code < len(IS_EMPTY) and IS_EMPTY[code] else 0xFF for code in range(0, 256))
+
+
+class Chunk:
+
+    # Width and height in cells
+    SIZE = 16
+
+    def __init__(self, x: int, y: int):
+        """
+        A square of SIZE x SIZE cells of a floor, made the first time anything is written to it. A floor that
+        has no chunk for a cell reads it as Empty.
+
+        Along with the kind of each cell it counts its Empty cells and the cells that can be open, so that
+        searches for either skip chunks with none, and holds the entities standing in it, so that finding the
+        entities near a point only looks at the chunks around it.
+
+        :param x: Column of the chunk, in chunks
+
+        :param y: Row of the chunk, in chunks
+        """
+        self.x = x
+        self.y = y
+        # Kind code of every cell, row by row
+        self.kinds = bytearray(self.SIZE * self.SIZE)
+        self.empty_count = self.SIZE * self.SIZE
+        self.open_count = 0
+        # Entities by the floor index of the cell they stand on
+        self.occupants: Dict[int, List['Entity']] = {}
+
+    def set_kind(self, x: int, y: int, code: int):
+        """
+        :param x: Column of the cell within the chunk
+
+        :param y: Row of the cell within the chunk
+
+        :param code: Code of the cell's kind in KINDS
+        """
+        index = y * self.SIZE + x
+        old = self.kinds[index]
+        self.kinds[index] = code
+        self.empty_count += IS_EMPTY[code] - IS_EMPTY[old]
+        self.open_count += CAN_OPEN[code] - CAN_OPEN[old]
+
+    def recount(self):
+        """
+        Counts the Empty cells and the cells that can be open again, after kinds was written to directly
+        """
+        self.empty_count = len(self.kinds) - len(self.kinds.translate(None, EMPTY_CODES))
+        self.open_count = len(self.kinds) - len(self.kinds.translate(None, OPEN_CODES))
@@ -0,0 +1,142 @@
+from typing import TYPE_CHECKING, Optional, Tuple
+
+import numpy as np
+from bearlibterminal import terminal as bearlib
+from clubsandwich.geom import Point, Rect, Size
+
+from chronotherium.changes import Change
+from chronotherium.map import Floor
+from chronotherium.window import FG_COLOR, REMEMBERED_COLOR
+
+if TYPE_CHECKING:
+    from chronotherium.scene import GameScene
+
+
+class FrameComposer:
+
+    def __init__(self, scene: 'GameScene'):
+        """
+        Composes the map view of a frame with array operations instead of drawing tile and entity objects one
+        by one. The glyphs and colours of each floor's terrain are captured once. A frame slices the view out of
+        them, masks the slice with the seen and visible bitmaps, and overlays the visible entities by layer,
+        giving one glyph and one colour per cell of the view. draw then hands that to the terminal in a single
+        pass of row runs.
+
+        The terrain arrays of the current floor are kept up to date from the cells its change log reports, and
+        captured afresh when the player changes floors, so that floors packed away are not held.
+
+        :param scene: Scene whose view is composed
+        """
+        self.scene = scene
+        # (floor, version, glyphs, colours) of the floor last composed
+        self._terrain: Optional[Tuple[Floor, int, np.ndarray, np.ndarray]] = None
+
+    def terrain(self, floor: Floor) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the glyphs and colours of the terrain of a floor, shape (height, width)
+        """
+        cached = self._terrain
+        changed = floor.changes.since(cached[1], Change.TERRAIN) if cached and cached[0] is floor else None
+        if changed is None:
+            self._terrain = (floor, floor.changes.version, floor.terrain_array().astype(np.uint32),
+                             floor.color_array())
+            return self._terrain[2:]
+        _, _, glyphs, colors = cached
+        for index in changed:
+            y, x = divmod(index, floor.width)
+            tile = floor.cell(Point(x, y))
+            glyphs[y, x] = tile.glyph
+            colors[y, x] = tile.color
+        self._terrain = (floor, floor.changes.version, glyphs, colors)
+        return glyphs, colors
+
+    def compose(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the glyph and colour of every cell of the view, shape (view height, view width). Cells with
+        nothing to draw have glyph 0.
+        """
+        scene = self.scene
+        game_map = scene.map
+        floor = game_map.floor
+        player = scene.player
+        view = game_map.view_size
+        # The map point drawn at the top left corner of the view
+        top_left = player.position - game_map.view_center
+
+        glyphs = np.zeros((view.height, view.width), dtype=np.uint32)
+        colors = np.zeros((view.height, view.width), dtype=np.uint32)
+        x0 = max(top_left.x, 0)
+        y0 = max(top_left.y, 0)
+        x1 = min(top_left.x + view.width, floor.size.width)
+        y1 = min(top_left.y + view.height, floor.size.height)
+        if x0 >= x1 or y0 >= y1:
+            return glyphs, colors
+        source = (slice(y0, y1), slice(x0, x1))
+        target = (slice(y0 - top_left.y, y1 - top_left.y), slice(x0 - top_left.x, x1 - top_left.x))
+
+        terrain_glyphs, terrain_colors = self.terrain(floor)
+        seen = floor.seen.array()[source]
+        visible = player.visible_bitmap.array()
+        glyphs[target] = np.where(seen, terrain_glyphs[source], 0)
+        colors[target] = np.where(visible[source], terrain_colors[source], REMEMBERED_COLOR)
+
+        in_view = Rect(Point(x0, y0), Size(x1 - x0, y1 - y0))
+        entities = [entity for entity in floor.entities_in(in_view) if entity is not player] + [player]
+        rows = np.array([entity.position.y for entity in entities], dtype=int)
+        columns = np.array([entity.position.x for entity in entities], dtype=int)
+        layers = np.array([entity.layer for entity in entities], dtype=int)
+        shown = (rows >= y0) & (rows < y1) & (columns >= x0) & (columns < x1)
+        shown[shown] = visible[rows[shown], columns[shown]]
+        # Draw order: by layer, then in list order with the player last. The last entity drawn to a cell wins.
+        order = np.lexsort((np.arange(len(entities)), layers))
+        order = order[shown[order]]
+        cells = (rows[order] - top_left.y) * view.width + (columns[order] - top_left.x)
+        _, last = np.unique(cells[::-1], return_index=True)
+        order = order[len(order) - 1 - last]
+        rows = rows[order] - top_left.y
+        columns = columns[order] - top_left.x
+        glyphs[rows, columns] = [ord(entities[i].glyph) for i in order]
+        colors[rows, columns] = [entities[i].color for i in order]
+        return glyphs, colors
+
+    def draw(self) -> int:
+        """
+        Composes the view and draws it on layer 0, setting each colour once and printing each horizontal run of
+        cells that share a colour as one string.
+
+        :return: Number of calls made into the terminal
+        """
+        glyphs, colors = self.compose()
+        origin = self.scene.map.origin
+
+        filled = glyphs != 0
+        same = colors[:, 1:] == colors[:, :-1]
+        starts = filled.copy()
+        starts[:, 1:] &= ~(filled[:, :-1] & same)
+        ends = filled.copy()
+        ends[:, :-1] &= ~(filled[:, 1:] & same)
+        start_rows, start_columns = np.nonzero(starts)
+        _, end_columns = np.nonzero(ends)
+        run_colors = colors[start_rows, start_columns]
+
+        calls = 2
+        bearlib.composition(bearlib.TK_OFF)
+        bearlib.layer(0)
+        color = None
+        for i in np.argsort(run_colors, kind='stable'):
+            if run_colors[i] != color:
+                color = run_colors[i]
+                bearlib.color(int(color))
+                calls += 1
+            y = int(start_rows[i])
+            x = int(start_columns[i])
+            codes = glyphs[y, x:end_columns[i] + 1].tolist()
+            if len(codes) == 1:
+                bearlib.put(origin.x + x, origin.y + y, codes[0])
+            else:
+                # Brackets start markup in printed strings and have to be doubled
+                text = ''.join(map(chr, codes)).replace('[', '[[').replace(']', ']]')
+                bearlib.print(origin.x + x, origin.y + y, text)
+            calls += 1
+        bearlib.color(FG_COLOR)
+        return calls + 1
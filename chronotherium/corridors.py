@@ -0,0 +1,75 @@
+from typing import Tuple
+
+import numpy as np
+from clubsandwich.geom import Point, Rect
+
+from chronotherium.stamps import DOOR, FLOOR
+from chronotherium.tiles.tile import KINDS, Stairs, Wall
+
+# Whether a cell of each kind is a wall, and whether it is stairs, by kind code
+IS_WALL = np.array([issubclass(kind, Wall) for kind, _ in KINDS] + [False] * (256 - len(KINDS)), dtype=bool)
+IS_STAIRS = np.array([issubclass(kind, Stairs) for kind, _ in KINDS] + [False] * (256 - len(KINDS)), dtype=bool)
+
+
+def l_path(origin: Point, dest: Point) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the columns and rows of the cells of an L shaped path, along the row of origin and then the column of
+    dest, in the order Point.path_L_to yields them
+    """
+    step_x = 1 if dest.x >= origin.x else -1
+    step_y = 1 if dest.y >= origin.y else -1
+    run_x = np.arange(origin.x, dest.x + step_x, step_x)
+    run_y = np.arange(origin.y + step_y, dest.y + step_y, step_y)
+    xs = np.concatenate((run_x, np.full(len(run_y), dest.x)))
+    ys = np.concatenate((np.full(len(run_x), origin.y), run_y))
+    return xs, ys
+
+
+def line_path(origin: Point, dest: Point) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the columns and rows of the cells of a Bresenham line, in the order Point.points_bresenham_to yields
+    them. The steps along the shorter axis are worked out for every cell at once rather than by carrying an error
+    term from cell to cell.
+    """
+    dx, dy = dest.x - origin.x, dest.y - origin.y
+    sign_x = 1 if dx > 0 else -1
+    sign_y = 1 if dy > 0 else -1
+    major, minor = abs(dx), abs(dy)
+    swapped = major <= minor
+    if swapped:
+        major, minor = minor, major
+    steps = np.arange(0, major + 1)
+    if major:
+        # The step along the shorter axis that points_bresenham_to has reached at each cell
+        offsets = np.maximum(0, ((steps + 1) * minor - 1) // major)
+    else:
+        offsets = steps
+    if swapped:
+        return origin.x + offsets * sign_x, origin.y + steps * sign_y
+    return origin.x + steps * sign_x, origin.y + offsets * sign_y
+
+
+def closest_in_rect(point: Point, rect: Rect) -> Point:
+    """
+    Returns the cell of rect closest to point by manhattan distance. It is the only closest cell, so it is the one
+    Point.get_closest_point picks from rect.points.
+    """
+    return Point(min(max(point.x, rect.x), rect.x2), min(max(point.y, rect.y), rect.y2))
+
+
+def corridor_kinds(kinds: np.ndarray, doors: bool = True) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the kind codes a corridor leaves along its path, and whether each cell of the path is written.
+
+    Stairs are left as they are. Walls the corridor passes through become doors, or floor if doors is not set,
+    and everything else becomes floor. The two ends are dug twice, once as the ends and once as part of the path,
+    so a wall at either end becomes floor even when doors is set.
+
+    :param kinds: Kind code of every cell of the path, from one end to the other
+    """
+    carved = np.full(len(kinds), FLOOR, dtype=np.uint8)
+    if doors:
+        walls = IS_WALL[kinds]
+        walls[[0, -1]] = False
+        carved[walls] = DOOR
+    return carved, ~IS_STAIRS[kinds]
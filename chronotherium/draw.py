@@ -0,0 +1,93 @@
+from typing import Dict, Tuple
+
+from bearlibterminal import terminal as bearlib
+from clubsandwich.blt.context import BearLibTerminalContext as Context
+from clubsandwich.geom import Point
+
+from chronotherium.window import FG_COLOR, BG_COLOR
+
+
+class DrawBuffer:
+
+    def __init__(self, context: Context):
+        """
+        Collects the puts of a frame and draws them in one go. It takes the place of the context in draw_tile
+        and draw calls, recording colour and layer changes instead of making them, so drawing a frame only
+        calls into the terminal once per run of cells sharing a row, layer and colours, plus once per change
+        of layer or colour.
+
+        :param context: Context whose translation applies to the puts
+        """
+        self.context = context
+        self._color = FG_COLOR
+        self._bkcolor = BG_COLOR
+        self._layer = 0
+        # (layer, y, x) -> (color, bkcolor, code). A later put to a cell of a layer replaces the earlier one.
+        self._cells: Dict[Tuple[int, int, int], Tuple[int, int, int]] = {}
+
+    def color(self, color: int):
+        self._color = color
+
+    def bkcolor(self, color: int):
+        self._bkcolor = color
+
+    def layer(self, layer: int):
+        self._layer = layer
+
+    def put(self, point: Point, char):
+        point = point + self.context.offset
+        code = ord(char) if isinstance(char, str) else char
+        self._cells[self._layer, point.y, point.x] = (self._color, self._bkcolor, code)
+
+    def flush(self) -> int:
+        """
+        Draws everything put since the last flush, sorted by layer, colour and background so that each state
+        change happens once, with horizontal runs of cells printed as one string.
+
+        :return: Number of calls made into the terminal
+        """
+        commands = sorted((layer, color, bkcolor, y, x, code)
+                          for (layer, y, x), (color, bkcolor, code) in self._cells.items())
+        self._cells = {}
+        calls = 1
+        bearlib.composition(bearlib.TK_OFF)
+
+        state = None
+        run = []
+        run_x = run_y = None
+        for layer, color, bkcolor, y, x, code in commands:
+            if state != (layer, color, bkcolor) or y != run_y or x != run_x + len(run):
+                calls += self._print_run(run_x, run_y, run)
+                run = []
+                run_x = x
+                run_y = y
+            if state != (layer, color, bkcolor):
+                if state is None or state[0] != layer:
+                    bearlib.layer(layer)
+                    calls += 1
+                if state is None or state[1] != color:
+                    bearlib.color(color)
+                    calls += 1
+                if state is None or state[2] != bkcolor:
+                    bearlib.bkcolor(bkcolor)
+                    calls += 1
+                state = (layer, color, bkcolor)
+            run.append(code)
+        calls += self._print_run(run_x, run_y, run)
+
+        bearlib.layer(0)
+        bearlib.color(FG_COLOR)
+        bearlib.bkcolor(BG_COLOR)
+        return calls + 3
+
+    @staticmethod
+    def _print_run(x: int, y: int, run: list) -> int:
+        if not run:
+            return 0
+        if len(run) == 1:
+            bearlib.put(x, y, run[0])
+        else:
+            # Brackets start markup in printed strings and have to be doubled
+            text = ''.join(map(chr, run)).replace('[', '[[').replace(']', ']]')
+            bearlib.print(x, y, text)
+        return 1
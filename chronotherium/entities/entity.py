@@ -1,12 +1,12 @@
 from abc import ABC
 from logging import getLogger
-from typing import Optional, Union, TYPE_CHECKING
-
-from random import random
+from typing import Optional, Tuple, Union, TYPE_CHECKING
 
 from bearlibterminal import terminal as bearlib
 
 from chronotherium.tiles.tile import Stairs, Tile, Door
+from chronotherium.bitmap import Bitmap
+from chronotherium.statehash import entity_key
 from clubsandwich.geom import Point, Rect, Size
 from clubsandwich.line_of_sight import get_visible_points
 from clubsandwich.tilemap import CellOutOfBoundsError
@@ -14,9 +14,8 @@ from clubsandwich.blt.context import BearLibTerminalContext as Context
 
 from enum import Enum
 
-from chronotherium.window import Window, Color
-from chronotherium.time import Time, TimeError
-from chronotherium.rand import d6
+from chronotherium.window import Color, FG_COLOR
+from chronotherium.time import TimeError
 
 if TYPE_CHECKING:
     from chronotherium.scene import GameScene
@@ -56,7 +55,6 @@ class ItemType(Enum):
 
 class Entity(ABC):
 
-    time = Time()
     logger = getLogger()
 
     NAME: str = ""
@@ -68,19 +66,24 @@ class Entity(ABC):
     LAYER: int = 1
 
     def __init__(self, tile: Tile, map: 'Map', scene: 'GameScene'):
+        # Numbers the entities of a game in the order they are made, which is the order floors list them in
+        self.serial = map.new_serial()
         self._pos = tile.point
         self._floor = tile.floor
 
-        self.window = Window()
         self.map = map
         self.scene = scene
+        self.time = map.time
         self.layer = self.LAYER
 
         self.type = self.TYPE
         self._glyph = self.GLYPH
-        self.color = self.COLOR if self.COLOR is not None else self.window.fg_color
+        self.color = self.COLOR if self.COLOR is not None else FG_COLOR
         self.blocking = self.BLOCKING
         self.state = ActorState.ALIVE
+        # Key this entity was last hashed with and the floor whose state hash holds it, see rehash
+        self._hash = 0
+        self._hashed_floor = None
         self.update_block()
 
     @property
@@ -107,6 +110,7 @@ class Entity(ABC):
     @position.setter
     def position(self, value):
         self._pos = value
+        self.rehash()
 
     @property
     def relative_position(self) -> Point:
@@ -116,26 +120,48 @@ class Entity(ABC):
         return self.map.origin - self._pos
 
     def draw(self, context):
-        if bearlib.state(bearlib.TK_COLOR) == int(self.color):
-            context.color(self.window.fg_color)
-        else:
-            context.color(self.color)
+        context.color(self.color)
         context.layer(self.layer)
-        bearlib.composition(bearlib.TK_OFF)
         context.put(self.position, self.glyph)
         context.layer(0)
-        context.color(self.window.fg_color)
+        context.color(FG_COLOR)
 
     def erase(self):
         bearlib.clear(self._pos.x, self._pos.y, 1, 1)
 
     def unblock(self):
-        if self.blocking and self in self.tile.entities:
-            self.tile.entities.remove(self)
+        if self.blocking:
+            self._floor.remove_occupant(self._pos, self)
 
     def update_block(self):
-        if self not in self.tile.entities:
-            self.tile.entities.append(self)
+        self._floor.add_occupant(self._pos, self)
+
+    def hash_state(self) -> Tuple[int, int]:
+        """
+        Returns the HP and TP that go into this entity's key in the state hash
+        """
+        return 0, 0
+
+    def rehash(self):
+        """
+        Swaps this entity's key in the state hash of its floor for one made from its serial and its current kind,
+        position, HP and TP. Its old key is taken out of the floor it was last hashed on, which is a different floor once it
+        has taken the stairs.
+        """
+        if self._hashed_floor is not None:
+            self._hashed_floor.state_hash ^= self._hash
+        self._hash = entity_key(type(self), self._pos.x, self._pos.y, *self.hash_state(), serial=self.serial)
+        self._floor.state_hash ^= self._hash
+        self._hashed_floor = self._floor
+
+    def unhash(self):
+        """
+        Takes this entity's key out of the state hash, once it has left the game
+        """
+        if self._hashed_floor is not None:
+            self._hashed_floor.state_hash ^= self._hash
+        self._hash = 0
+        self._hashed_floor = None
 
 
 class Actor(Entity, ABC):
@@ -144,6 +170,9 @@ class Actor(Entity, ABC):
     BASE_TP = 0
     LAYER = 2
     RANGE = 0
+    BUMP_DAMAGE = 1
+    # A bump hits when a d6 rolls over this
+    BUMP_LIMIT = 2
 
     class State:
 
@@ -161,7 +190,7 @@ class Actor(Entity, ABC):
         self._tp = self.BASE_TP
         self._max_tp = self.BASE_TP
         self._xp = 0
-        self._bump_damage = 1
+        self._bump_damage = self.BUMP_DAMAGE
         self._range = self.RANGE
 
         self.frozen = 0
@@ -174,7 +203,9 @@ class Actor(Entity, ABC):
         self.delta_xp = 0
 
         self._states = {}
-        self._visible_points = get_visible_points(self.position, self.map.get_allows_light, max_distance=self._range)
+        self._visible_bitmap = None
+        self._visible_points = get_visible_points(self.position, self._floor.allows_light, max_distance=self._range)
+        self.rehash()
 
     def actor_move(self, delta: Point):
         try:
@@ -207,16 +238,29 @@ class Actor(Entity, ABC):
         return other.position in self._visible_points
 
     def in_sight(self, tile: Tile) -> bool:
-        return tile in self.visible_tiles
+        return tile.point in self.visible_bitmap
 
     def in_range(self, other):
         range_rect = Rect(self.position - Point(self._range, self._range), Size(self._range * 2, self._range * 2))
         return range_rect.contains(other.position)
 
+    @property
+    def visible_points(self):
+        return self._visible_points
+
+    @property
+    def visible_bitmap(self) -> Bitmap:
+        if self._visible_bitmap is None:
+            self._visible_bitmap = Bitmap.from_points(self.map.floor.size, self._visible_points)
+        return self._visible_bitmap
+
     @property
     def visible_tiles(self):
         return [self.map.floor.cell(point) for point in self._visible_points]
 
+    def hash_state(self) -> Tuple[int, int]:
+        return self._hp, self._tp
+
     @property
     def range(self):
         return self._range
@@ -274,6 +318,7 @@ class Actor(Entity, ABC):
     def update_hp(self):
         if self.delta_hp != 0:
             self._hp += self.delta_hp
+            self.rehash()
         if self.hp <= 0:
             self.state = ActorState.DEAD
         self.delta_hp = 0
@@ -285,17 +330,22 @@ class Actor(Entity, ABC):
             else:
                 self._tp = 0
             self.delta_tp = 0
+            self.rehash()
 
     def update_pos(self):
         self.unblock()
         if self.delta_pos != Point(0, 0):
             self._pos += self.delta_pos
             bearlib.clear(self._pos.x, self._pos.y, 1, 1)
-            self._visible_points = get_visible_points(self.position, self.map.get_allows_light,
-                                                      max_distance=self._range)
+            self.update_fov()
+            self.rehash()
         self.update_block()
         self.delta_pos = Point(0, 0)
 
+    def update_fov(self):
+        self._visible_points = get_visible_points(self.position, self._floor.allows_light, max_distance=self._range)
+        self._visible_bitmap = None
+
     def update_xp(self):
         self._xp += self.delta_xp
         self.delta_xp = 0
@@ -318,9 +368,10 @@ class Actor(Entity, ABC):
             self._tp = state.tp
         if pos:
             if not self._floor.cell(state.pos).open:
-                state.pos = self.tile.closest_open_point(state.pos)
+                state.pos = self.map.closest_open_point(state.pos)
                 self.scene.log(f'You were displaced!')
             self._pos = state.pos
+        self.rehash()
 
     def preview_state(self, tick: int):
         """
@@ -342,13 +393,13 @@ class Actor(Entity, ABC):
         context.layer(1)
         context.put(state.pos, self.glyph)
         context.layer(0)
-        context.color(self.window.fg_color)
+        context.color(FG_COLOR)
 
     def change_floors(self):
         pass
 
     def bump(self, target):
-        if d6():
+        if self.map.rng.combat.d6(limit=self.BUMP_LIMIT):
             target.delta_hp -= self.bump_damage
             player_message = f"You use your regular meat hands to pummel the {target.name}. " \
                              f"({target.hp + target.delta_hp}/{target.max_hp})"
@@ -446,12 +497,13 @@ class Enemy(Actor, ABC):
 
     def drop_item(self):
         if self.drop is not None:
-            if random() <= self._drop_chance:
+            if self.map.rng.loot.random() <= self._drop_chance:
                 item = self.drop(self.tile, self.map, self.scene)
                 item.update_block()
 
     def on_death(self):
         self.unblock()
         self._floor.entities.remove(self)
+        self.unhash()
         self.drop_item()
         self.scene.player.delta_xp += self.xp
@@ -2,7 +2,6 @@ from chronotherium.entities.entity import Enemy, ActorType
 from chronotherium.window import Color
 
 from chronotherium.entities.items import TimePotion
-from chronotherium.rand import d6
 
 
 class Golem(Enemy):
@@ -19,6 +18,9 @@ class Golem(Enemy):
     DROP_CHANCE = .8
     TP_DRAIN_RATE = 6
     TP_DRAIN_COST = 1
+    # A drain succeeds when a d6 rolls over this
+    TP_DRAIN_LIMIT = 3
+    TP_DRAIN_AMOUNT = 2
     DENSITY = .2
 
     def __init__(self, tile, map, scene):
@@ -38,8 +40,8 @@ class Golem(Enemy):
         self._tp_drain_clock += 1
         if self.visible_to(self.scene.player) and self._tp_drain_clock % self.TP_DRAIN_RATE == 0:
             self.delta_tp -= self.TP_DRAIN_COST
-            if d6(limit=3, over=True):
-                self.scene.player.delta_tp -= 2
+            if self.map.rng.combat.d6(limit=self.TP_DRAIN_LIMIT, over=True):
+                self.scene.player.delta_tp -= self.TP_DRAIN_AMOUNT
                 self.scene.player.update_tp()
                 self.scene.log(f'The {self.NAME} drained your mana.')
                 return True
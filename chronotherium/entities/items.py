@@ -11,11 +11,13 @@ class Item(Entity, ABC):
 
     def __init__(self, position, map, scene):
         super().__init__(position, map, scene)
-        self.scene.entities.append(self)
+        self._floor.entities.append(self)
+        self.rehash()
 
     def on_pickup(self):
-        self.tile.entities.remove(self)
-        self.scene.entities.remove(self)
+        self._floor.remove_occupant(self._pos, self)
+        self._floor.entities.remove(self)
+        self.unhash()
 
 
 class Hourglass(Item):
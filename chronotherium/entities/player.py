@@ -65,7 +65,8 @@ class Diagonal(Skill):
 
 class Player(Actor):
 
-    __levels = {
+    # XP needed for each level and the skill learned on reaching it
+    LEVELS = {
         1: {'xp': 8, 'skill': Teleport},
         2: {'xp': 20, 'skill': Push},
         3: {'xp': 32, 'skill': Rewind},
@@ -89,6 +90,8 @@ class Player(Actor):
     DIAGONAL_COST = 5
     DIAGONAL_DAMAGE = 4
     HEAL_RATE = 20
+    HP_PER_LEVEL = 3
+    TP_PER_LEVEL = 1
 
     def __init__(self, tile: Tile, map: 'Map', scene: 'GameScene'):
         super().__init__(tile, map, scene)
@@ -106,6 +109,8 @@ class Player(Actor):
         self._heal_clock = 0
 
         self._level = 0
+        # Copied so that a new game doesn't inherit the skills learned in the last one
+        self._skills = list(self._skills)
 
         self._found_boss = False
 
@@ -124,7 +129,7 @@ class Player(Actor):
         return skill in self._skills
 
     def level_up(self):
-        for lvl, lvl_dict in self.__levels.items():
+        for lvl, lvl_dict in self.LEVELS.items():
             if self._xp > lvl_dict['xp']:
                 if lvl > self._level:
                     self._level = lvl
@@ -147,11 +152,11 @@ class Player(Actor):
 
     @property
     def max_hp(self):
-        return self._max_hp + self.level * 3
+        return self._max_hp + self.level * self.HP_PER_LEVEL
 
     @property
     def max_tp(self):
-        return self._max_tp + self.level
+        return self._max_tp + self.level * self.TP_PER_LEVEL
 
     @property
     def rewind_limit(self):
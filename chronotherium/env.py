@@ -0,0 +1,280 @@
+from collections import deque
+from logging import getLogger
+from multiprocessing import Pipe, Process
+from multiprocessing.connection import Connection
+from traceback import format_exc
+from typing import Dict, List, Optional, Sequence, Tuple
+import os
+
+import numpy as np
+from bearlibterminal import terminal as bearlib
+from clubsandwich.geom import Point
+
+from chronotherium.changes import Change
+from chronotherium.entities.entity import Actor, ActorState
+from chronotherium.journal import Journal, JournalExhausted, KeySource
+from chronotherium.replay import HeadlessDirector
+from chronotherium.scene import GameScene
+
+
+def keys(*codes: int, shift: bool = False) -> Tuple[Tuple[int, bool], ...]:
+    return tuple((code, shift) for code in codes)
+
+
+# Each action is the sequence of keys a player would press for it, including the keys the modal skills wait for
+ACTIONS: List[Tuple[Tuple[int, bool], ...]] = [
+    keys(bearlib.TK_SPACE),
+    keys(bearlib.TK_K),
+    keys(bearlib.TK_J),
+    keys(bearlib.TK_H),
+    keys(bearlib.TK_L),
+    keys(bearlib.TK_U),
+    keys(bearlib.TK_Y),
+    keys(bearlib.TK_N),
+    keys(bearlib.TK_B),
+    keys(bearlib.TK_X),
+    keys(bearlib.TK_S),
+    keys(bearlib.TK_COMMA),
+    keys(bearlib.TK_PERIOD, shift=True),
+    keys(bearlib.TK_COMMA, shift=True),
+    keys(bearlib.TK_T),
+    keys(bearlib.TK_E, bearlib.TK_ENTER),
+]
+for direction in (bearlib.TK_K, bearlib.TK_J, bearlib.TK_H, bearlib.TK_L):
+    ACTIONS.append(keys(bearlib.TK_F, direction, bearlib.TK_ENTER))
+    ACTIONS.append(keys(bearlib.TK_P, direction, bearlib.TK_ENTER))
+for direction in (bearlib.TK_K, bearlib.TK_J, bearlib.TK_H, bearlib.TK_L,
+                  bearlib.TK_U, bearlib.TK_Y, bearlib.TK_N, bearlib.TK_B):
+    ACTIONS.append(keys(bearlib.TK_O, direction))
+for ticks in range(1, 4):
+    ACTIONS.append(keys(bearlib.TK_R, *[bearlib.TK_H] * ticks, bearlib.TK_ENTER))
+
+# Observations list at most this many entities on the current floor, padded with -1
+MAX_ENTITIES = 64
+
+logger = getLogger()
+
+
+class ActionSource(KeySource):
+    """
+    Feeds the keys of queued actions to the game and records the ones it consumes, so that an
+    episode can be replayed from its journal like a game played at the keyboard.
+    """
+
+    def __init__(self, journal: Journal):
+        super().__init__(journal)
+        self.queue = deque()
+
+    def consume(self, key: int):
+        self.journal.record(key, self.shift)
+
+    def next_key(self) -> Optional[int]:
+        if not self.queue:
+            return None
+        key, self.shift = self.queue.popleft()
+        return key
+
+    def read(self) -> int:
+        key = self.next_key()
+        if key is None:
+            raise JournalExhausted("The action ended while a command was waiting for input.")
+        self.consume(key)
+        return key
+
+
+class ChronotheriumEnv:
+
+    def __init__(self):
+        """
+        A game of Chronotherium that is driven programmatically instead of from the terminal.
+        Actions are indices into ACTIONS.
+        """
+        self.scene: Optional[GameScene] = None
+        self.keys: Optional[ActionSource] = None
+        self.director = HeadlessDirector()
+        # (floor, version, glyphs) of the floor last observed
+        self._terrain = None
+
+    @property
+    def action_count(self) -> int:
+        return len(ACTIONS)
+
+    @property
+    def journal(self) -> Journal:
+        return self.keys.journal
+
+    def reset(self, seed: Optional[int] = None) -> Dict[str, np.ndarray]:
+        if seed is None:
+            seed = int.from_bytes(os.urandom(4), 'little')
+        self.keys = ActionSource(Journal(seed))
+        self.scene = GameScene(seed=seed, keys=self.keys, headless=True)
+        self.director = HeadlessDirector()
+        self.scene.director = self.director
+        self._terrain = None
+        return self.observe()
+
+    def step(self, action: int) -> Tuple[Dict[str, np.ndarray], int, bool, dict]:
+        """
+        Presses the keys of one action. A command that fails ends the game, as its state can't be trusted
+        after that, and the error is given in the info dict.
+
+        :return: The observation, the XP gained, whether the game is over and a dict of extra information
+        """
+        player = self.scene.player
+        tick = self.scene.time.time
+        xp = player.xp
+
+        self.keys.queue.clear()
+        self.keys.queue.extend(ACTIONS[action])
+        key = self.keys.next_key()
+        error = None
+        try:
+            self.scene.terminal_read(key)
+        except JournalExhausted:
+            pass
+        except Exception as err:
+            logger.exception(f'Action {action} failed on seed {self.journal.seed}')
+            error = f'{type(err).__name__}: {err}'
+        # Keys a command didn't wait for were never pressed as far as the game and the journal are concerned
+        self.keys.queue.clear()
+
+        done = error is not None or player.state != ActorState.ALIVE or self.director.should_exit
+        info = {
+            'tick': self.scene.time.time,
+            'turn_taken': self.scene.time.time != tick,
+            'state': player.state.value,
+            'floor': self.scene.map.current_floor,
+            'state_hash': self.scene.map.state_hash
+        }
+        if error is not None:
+            info['error'] = error
+        return self.observe(), player.xp - xp, done, info
+
+    def terrain(self) -> np.ndarray:
+        """
+        Returns the glyph of every cell of the current floor, shape (height, width)
+        """
+        floor = self.scene.map.floor
+        cached = self._terrain
+        changed = floor.changes.since(cached[1], Change.TERRAIN) if cached and cached[0] is floor else None
+        if changed is None:
+            terrain = floor.terrain_array()
+        else:
+            terrain = cached[2]
+            for cell in changed:
+                y, x = divmod(cell, floor.width)
+                terrain[y, x] = floor.cell(Point(x, y)).glyph
+        self._terrain = (floor, floor.changes.version, terrain)
+        return terrain.copy()
+
+    def observe(self) -> Dict[str, np.ndarray]:
+        scene = self.scene
+        player = scene.player
+        floor = scene.map.floor
+
+        entities = np.full((MAX_ENTITIES, 5), -1, dtype=np.int16)
+        for i, entity in enumerate(entity for entity in floor.entities if entity is not player):
+            if i >= MAX_ENTITIES:
+                break
+            hp = entity.hp if isinstance(entity, Actor) else 0
+            tp = entity.tp if isinstance(entity, Actor) else 0
+            entities[i] = (entity.type.value, entity.position.x, entity.position.y, hp, tp)
+
+        return {
+            'terrain': self.terrain(),
+            'visible': player.visible_bitmap.array(),
+            'seen': floor.seen.array(),
+            'entities': entities,
+            'player': np.array([player.position.x, player.position.y, player.hp, player.max_hp, player.tp,
+                                player.max_tp, player.xp, player.level, scene.map.current_floor, scene.time.time],
+                               dtype=np.int32)
+        }
+
+
+class WorkerError(Exception):
+    pass
+
+
+def _worker(connection: Connection):
+    # Replies are (error, result). A command that raises sends back its traceback rather than killing the
+    # worker, so the parent isn't left waiting for a reply that never comes.
+    env = ChronotheriumEnv()
+    while True:
+        command, argument = connection.recv()
+        if command == 'close':
+            connection.close()
+            break
+        try:
+            if command == 'reset':
+                result = env.reset(argument)
+            else:
+                observation, reward, done, info = env.step(argument)
+                if done:
+                    info['final_observation'] = observation
+                    info['journal'] = env.journal
+                    observation = env.reset()
+                result = (observation, reward, done, info)
+        except Exception:
+            connection.send((format_exc(), None))
+        else:
+            connection.send((None, result))
+
+
+def _receive(connections: Sequence[Connection]) -> list:
+    # Every reply is read before raising, so that none is left behind to be taken for the reply to the next command
+    replies = [connection.recv() for connection in connections]
+    for error, _ in replies:
+        if error is not None:
+            raise WorkerError(f'A worker failed:\n{error}')
+    return [result for _, result in replies]
+
+
+class VectorEnv:
+
+    def __init__(self, count: int):
+        """
+        Runs count independent games, each in its own worker process, and steps them together.
+        A game that ends is reset with a new seed straight away; its last observation and its journal
+        are returned in the info dict.
+        """
+        self.count = count
+        self._connections = []
+        self._processes = []
+        for i in range(0, count):
+            connection, worker_connection = Pipe()
+            process = Process(target=_worker, args=(worker_connection,), daemon=True)
+            process.start()
+            worker_connection.close()
+            self._connections.append(connection)
+            self._processes.append(process)
+
+    def reset(self, seeds: Optional[Sequence[Optional[int]]] = None) -> Dict[str, np.ndarray]:
+        if seeds is None:
+            seeds = [None] * self.count
+        for connection, seed in zip(self._connections, seeds):
+            connection.send(('reset', seed))
+        return stack(_receive(self._connections))
+
+    def step(self, actions: Sequence[int]) -> Tuple[Dict[str, np.ndarray], np.ndarray, np.ndarray, List[dict]]:
+        for connection, action in zip(self._connections, actions):
+            connection.send(('step', int(action)))
+        results = _receive(self._connections)
+        observations, rewards, dones, infos = zip(*results)
+        return stack(observations), np.array(rewards), np.array(dones), list(infos)
+
+    def close(self):
+        for connection in self._connections:
+            connection.send(('close', None))
+            connection.close()
+        for process in self._processes:
+            process.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def stack(observations: Sequence[Dict[str, np.ndarray]]) -> Dict[str, np.ndarray]:
+    return {key: np.stack([observation[key] for observation in observations]) for key in observations[0]}
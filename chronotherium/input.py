@@ -1,6 +1,5 @@
 from enum import Enum
 from typing import TYPE_CHECKING
-from random import randrange
 
 from bearlibterminal import terminal as bearlib
 
@@ -58,6 +57,8 @@ class Command(Enum):
     LOOK = bearlib.TK_SEMICOLON
     OPEN = bearlib.TK_O
     TELEPORT = bearlib.TK_T
+    EXPLORE = bearlib.TK_X
+    TRAVEL = bearlib.TK_S
 
 
 class ShiftCommand(Enum):
@@ -67,15 +68,19 @@ class ShiftCommand(Enum):
 
 class Input:
 
-    def __init__(self, player: 'Player', context: Context, scene: 'GameScene'):
+    # Upper bound on the number of turns a single auto-explore or travel command may take
+    TRAVEL_LIMIT = 200
+
+    def __init__(self, player: 'Player', context: Context, scene: 'GameScene', time: Time):
         """
         Class to handle player input
         """
         self.player = player
         self.context = context
         self.scene = scene
+        self.keys = scene.keys
         self.window = Window()
-        self.time = Time()
+        self.time = time
 
         self.__command_map = {
             # Command.RANGED: self.ranged,
@@ -90,7 +95,9 @@ class Input:
             Command.PICKUP_G: self.pickup,
             # Command.LOOK: self.look,
             Command.OPEN: self.open,
-            Command.TELEPORT: self.teleport
+            Command.TELEPORT: self.teleport,
+            Command.EXPLORE: self.explore,
+            Command.TRAVEL: self.travel_stairs
         }
 
         self.__shift_command_map = {
@@ -124,7 +131,7 @@ class Input:
             return self.handle_move(Direction(key))
         except ValueError:
             pass
-        if bearlib.check(bearlib.TK_SHIFT):
+        if self.keys.shift:
             try:
                 return self.__shift_command_map[ShiftCommand(key)]()
             except ValueError:
@@ -182,9 +189,10 @@ class Input:
         bearlib.color(Color.ORANGE)
         self.scene.print_stats(right_arrow=right_arrow, left_arrow=left_arrow)
         self.scene.draw_tiles()
+        self.scene.draw_buffer.flush()
         bearlib.refresh()
 
-        key = bearlib.read()
+        key = self.keys.read()
         while key != bearlib.TK_ESCAPE:
             if key == bearlib.TK_ENTER or key == bearlib.TK_SPACE:
                 if state is not None:
@@ -200,27 +208,27 @@ class Input:
             try:
                 direction = Direction(key)
             except ValueError:
-                key = bearlib.read()
+                key = self.keys.read()
                 continue
             if direction in (Direction.W, Direction.VIM_W, Direction.E, Direction.VIM_E):
                 if direction in (Direction.W, Direction.VIM_W):
                     if (current_tick - 1) < limit:
-                        key = bearlib.read()
+                        key = self.keys.read()
                         continue
                     try:
                         state = self.player.preview_state(current_tick - 1)
                     except TimeError:
-                        key = bearlib.read()
+                        key = self.keys.read()
                         continue
                     current_tick -= 1
                 elif direction in (Direction.E, Direction.VIM_E):
                     if (current_tick + 1) > self.time.time:
-                        key = bearlib.read()
+                        key = self.keys.read()
                         continue
                     try:
                         state = self.player.preview_state(current_tick + 1)
                     except TimeError:
-                        key = bearlib.read()
+                        key = self.keys.read()
                         continue
                     current_tick += 1
 
@@ -243,10 +251,11 @@ class Input:
                     bearlib.color(self.window.fg_color)
                     self.scene.draw_tiles()
                     self.scene.draw_entities()
+                    self.scene.draw_buffer.flush()
                     self.scene.print_log()
                     bearlib.refresh()
 
-            key = bearlib.read()
+            key = self.keys.read()
 
         return False
 
@@ -259,15 +268,20 @@ class Input:
             return False
 
         target_square = self.scene.map.find_in_bounds_orthogonal(self.player.position)
+        target_tile = self.scene.map.floor.cell(target_square)
         bearlib.bkcolor(Color.BLUE)
-        self.scene.map.floor.cell(target_square).draw_tile(self.context)
+        target_tile.draw_tile(self.context)
         bearlib.bkcolor(self.window.bg_color)
         bearlib.refresh()
 
-        key = bearlib.read()
+        key = self.keys.read()
         while key != bearlib.TK_ESCAPE:
             if key == bearlib.TK_ENTER or key == bearlib.TK_SPACE:
-                target_tile = self.scene.map.floor.cell(target_square)
+                try:
+                    target_tile = self.scene.map.floor.cell(target_square)
+                except CellOutOfBoundsError:
+                    key = self.keys.read()
+                    continue
                 enemy = None
                 for entity in target_tile.entities:
                     if entity.type == EntityType.ENEMY:
@@ -275,7 +289,7 @@ class Input:
                         break
                 if enemy is not None:
                     self.player.delta_tp -= self.player.freeze_cost
-                    turns = randrange(1, 3)
+                    turns = self.scene.map.rng.skills.randrange(1, 3)
                     # +1 -- Account for this current turn
                     enemy.freeze(turns + 2)
                     enemy.delta_hp -= self.player.freeze_damage
@@ -288,17 +302,20 @@ class Input:
             try:
                 direction = Direction(key)
             except ValueError:
-                key = bearlib.read()
+                key = self.keys.read()
                 continue
 
             # Clears background from previous tile.
-            target_tile = self.scene.map.floor.cell(target_square)
             bearlib.bkcolor(self.window.bg_color)
             target_tile.draw_tile(self.context)
 
             delta = self.__delta_map[direction]
             target_square = self.player.position + delta
-            target_tile = self.scene.map.floor.cell(target_square)
+            try:
+                target_tile = self.scene.map.floor.cell(target_square)
+            except CellOutOfBoundsError:
+                key = self.keys.read()
+                continue
             bearlib.bkcolor(Color.BLUE)
             target_tile.draw_tile(self.context)
             for entity in target_tile.entities:
@@ -306,7 +323,7 @@ class Input:
             bearlib.bkcolor(self.window.bg_color)
             bearlib.refresh()
 
-            key = bearlib.read()
+            key = self.keys.read()
 
     def push(self):
         if not self.player.has_skill(Push):
@@ -327,13 +344,13 @@ class Input:
 
         direction = Direction.WAIT
 
-        key = bearlib.read()
+        key = self.keys.read()
         while key != bearlib.TK_ESCAPE:
             if key == bearlib.TK_ENTER or key == bearlib.TK_SPACE:
                 try:
                     target_tile = self.scene.map.floor.cell(target_square)
                 except CellOutOfBoundsError:
-                    key = bearlib.read()
+                    key = self.keys.read()
                     continue
                 enemy = None
                 for entity in target_tile.entities:
@@ -365,7 +382,7 @@ class Input:
             try:
                 direction = Direction(key)
             except ValueError:
-                key = bearlib.read()
+                key = self.keys.read()
                 continue
 
             # Clears background from previous tile.
@@ -377,7 +394,7 @@ class Input:
             try:
                 target_tile = self.scene.map.floor.cell(target_square)
             except CellOutOfBoundsError:
-                key = bearlib.read()
+                key = self.keys.read()
                 continue
             self.context.bkcolor(Color.MAGENTA)
             target_tile.draw_tile(self.context)
@@ -386,7 +403,7 @@ class Input:
             bearlib.bkcolor(self.window.bg_color)
             bearlib.refresh()
 
-            key = bearlib.read()
+            key = self.keys.read()
 
     def diagonal(self):
         if not self.player.has_skill(Diagonal):
@@ -403,7 +420,7 @@ class Input:
         bearlib.bkcolor(self.window.bg_color)
         bearlib.refresh()
 
-        key = bearlib.read()
+        key = self.keys.read()
         while key != bearlib.TK_ESCAPE:
             if key == bearlib.TK_ENTER or key == bearlib.TK_SPACE:
                 enemies = []
@@ -420,7 +437,7 @@ class Input:
                     enemy.update_hp()
                 self.scene.log(f'You conjure a swarm of ephemeral black holes.')
                 return True
-            key = bearlib.read()
+            key = self.keys.read()
 
     def teleport(self):
         if not self.player.has_skill(Teleport):
@@ -431,7 +448,7 @@ class Input:
             return False
 
         self.player.delta_tp -= self.player.teleport_cost
-        dest = self.scene.map.floor.find_open_point()
+        dest = self.scene.map.floor.find_open_point(rng=self.scene.map.rng.skills)
         self.player.delta_pos = dest - self.player.position
         return True
 
@@ -446,19 +463,22 @@ class Input:
         pass
 
     def open(self):
-        key = bearlib.read()
+        key = self.keys.read()
 
         while True:
             try:
                 direction = Direction(key)
             except ValueError:
-                key = bearlib.read()
+                key = self.keys.read()
                 self.scene.log("Open what?")
                 continue
 
             delta = self.__delta_map[direction]
             target_square = self.player.position + delta
-            target_tile = self.scene.map.floor.cell(target_square)
+            try:
+                target_tile = self.scene.map.floor.cell(target_square)
+            except CellOutOfBoundsError:
+                target_tile = None
 
             if not isinstance(target_tile, Door):
                 self.scene.log("There's no door there.")
@@ -474,17 +494,83 @@ class Input:
                     self.scene.log("There's something blocking the doorway.")
                 return True
 
+    def explore(self):
+        # The frontier moves with nearly every step, so rather than rebuilding the map whenever it does, the player
+        # walks on to the frontier point they were heading for and the map is rebuilt once they get there
+        return self.travel('explore', lambda floor: None, lambda floor: floor.frontier(),
+                           "There's nothing left to explore here.",
+                           lambda floor, distance_map: distance_map.distance(self.player.position) > 0)
+
+    def travel_stairs(self):
+        return self.travel('stairs', lambda floor: None,
+                           lambda floor: [stairs.point for stairs in (floor.stairs_up, floor.stairs_down) if stairs],
+                           "You're already standing on the stairs.")
+
+    def travel(self, key, stamp, goals, done_message, valid=None):
+        """
+        Walks the player down a cached distance map, running a full turn per step, until a goal is reached
+        or something interrupts the walk. The scene only redraws once the walk is over.
+
+        :param key: Name the floor caches the distance map under
+
+        :param stamp: Callable taking the floor and returning the value the cached map must have been built from
+
+        :param goals: Callable taking the floor and returning the points to walk towards
+
+        :param done_message: Message logged if the player has nowhere left to go
+
+        :param valid: Callable taking the floor and the cached map and returning whether the map can still be
+        walked, checked before every step. The map is only checked against the stamp if not given.
+
+        :return: False, since every step has already taken its turn
+        """
+        if self.scene.enemies_in_view():
+            self.scene.log("You can't do that with enemies in sight.")
+            return False
+
+        log_length = self.scene.message_log.count
+        stalled = False
+        for steps in range(0, self.TRAVEL_LIMIT):
+            floor = self.scene.map.floor
+            check = (lambda cached: valid(floor, cached)) if valid is not None else None
+            distance_map = floor.distance_map(key, stamp(floor), lambda: goals(floor), check)
+            step = distance_map.step_from(self.player.position)
+            if step is None:
+                if steps == 0:
+                    self.scene.log(done_message)
+                break
+
+            position = self.player.position
+            self.player.actor_move(step - position)
+            self.scene.run_turn()
+
+            if self.player.position == position and not isinstance(floor.cell(step), Door):
+                # Something we can't see in the distance map is in the way
+                if stalled:
+                    break
+                stalled = True
+                floor.invalidate_distance_maps()
+            else:
+                stalled = False
+
+            if self.scene.message_log.count != log_length or self.scene.enemies_in_view():
+                break
+            if any(entity.type == EntityType.ITEM for entity in self.player.tile.entities):
+                break
+        return False
+
     def stairs(self):
         target_tile = self.scene.map.floor.cell(self.player.position)
         if not isinstance(target_tile, Stairs):
             self.scene.log("There are no stairs there.")
             return False
         else:
-            dest_tile = target_tile.interact()
+            dest_tile = self.scene.map.follow_stairs(target_tile)
             if dest_tile:
                 self.scene.map.move_floors(dest_tile.floor)
                 self.player._floor = dest_tile.floor
                 self.player.clear_states()
                 self.player.position = dest_tile.point
+                self.player.update_fov()
                 self.scene.log(f"You {'ascend' if isinstance(target_tile, StairsUp) else 'descend'} the stairs.")
                 return True
@@ -0,0 +1,259 @@
+from array import array
+from struct import Struct
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+import sys
+
+from bearlibterminal import terminal as bearlib
+
+
+JOURNAL_PATH = 'chronotherium.journal'
+
+
+class JournalError(Exception):
+    pass
+
+
+class JournalExhausted(Exception):
+    pass
+
+
+class JournalDiverged(Exception):
+    pass
+
+
+class Journal:
+    """
+    Every key the game consumed, in order, together with the seed the game was generated from and the state
+    hash of the game after every turn, to tell where a replay stops matching the game it replays.
+
+    On disk a journal is a fixed header followed by one little-endian 16 bit word per key, with the state hash
+    of each turn written after the key that played it as a HASH word and the hash as four more words. The header
+    carries no length, so a journal that was being appended to when the game crashed is still readable.
+    """
+
+    MAGIC = b'CHRJ'
+    # Version 1 journals were played on the random module and replay differently on the random streams. Version
+    # 2 journals have no state hashes but replay the same.
+    VERSION = 3
+    VERSIONS = (2, 3)
+    HEADER = Struct('<4sHQ')
+    # BearLibTerminal key codes fit in the low byte, leaving the top bit free for the shift state
+    SHIFT = 0x8000
+    # Word starting a state hash, which no key with or without shift can be
+    HASH = 0x7F00
+    HASH_WORDS = 4
+
+    def __init__(self, seed: int):
+        self.seed = seed
+        self.keys = array('H')
+        # State hashes of the turns played, by the number of keys consumed when each turn ended, in turn order
+        self.hashes: Dict[int, List[int]] = {}
+        self._file = None
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __iter__(self) -> Iterator[Tuple[int, bool]]:
+        for word in self.keys:
+            yield word & ~self.SHIFT, bool(word & self.SHIFT)
+
+    def record(self, key: int, shift: bool = False):
+        word = key | self.SHIFT if shift else key
+        self.keys.append(word)
+        if self._file is not None:
+            self._file.write(word.to_bytes(2, 'little'))
+            self._file.flush()
+
+    def record_hash(self, state_hash: int):
+        """
+        Records the state hash of the game at the end of a turn, after the key that played it
+        """
+        self.hashes.setdefault(len(self.keys), []).append(state_hash)
+        if self._file is not None:
+            self._file.write(self._pack_hash(state_hash))
+            self._file.flush()
+
+    def expected_hash(self, position: int, turn: int) -> Optional[int]:
+        """
+        Returns the state hash recorded for a turn, None if none was
+
+        :param position: Number of keys consumed when the turn ended
+
+        :param turn: Which of the turns that ended after that many keys, from 0
+        """
+        hashes = self.hashes.get(position, ())
+        return hashes[turn] if turn < len(hashes) else None
+
+    def open(self, path: str = JOURNAL_PATH):
+        """
+        Writes the journal so far to path and appends every key recorded from now on as it happens.
+        """
+        self.close()
+        self._file = open(path, 'wb')
+        self._file.write(self.HEADER.pack(self.MAGIC, self.VERSION, self.seed))
+        self._file.write(self._pack())
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def save(self, path: str):
+        with open(path, 'wb') as file:
+            file.write(self.HEADER.pack(self.MAGIC, self.VERSION, self.seed))
+            file.write(self._pack())
+
+    def _pack(self) -> bytes:
+        keys = array('H', self.keys)
+        if sys.byteorder != 'little':
+            keys.byteswap()
+        data = keys.tobytes()
+        if not self.hashes:
+            return data
+        parts = []
+        start = 0
+        for position in sorted(self.hashes):
+            if position > len(self.keys):
+                break
+            parts.append(data[start * 2:position * 2])
+            parts.extend(self._pack_hash(state_hash) for state_hash in self.hashes[position])
+            start = position
+        parts.append(data[start * 2:])
+        return b''.join(parts)
+
+    def _pack_hash(self, state_hash: int) -> bytes:
+        return self.HASH.to_bytes(2, 'little') + state_hash.to_bytes(self.HASH_WORDS * 2, 'little')
+
+    @classmethod
+    def load(cls, path: str) -> 'Journal':
+        with open(path, 'rb') as file:
+            return cls.read(file)
+
+    @classmethod
+    def read(cls, file: BinaryIO) -> 'Journal':
+        header = file.read(cls.HEADER.size)
+        if len(header) < cls.HEADER.size:
+            raise JournalError("Journal is truncated.")
+        magic, version, seed = cls.HEADER.unpack(header)
+        if magic != cls.MAGIC:
+            raise JournalError("Not a Chronotherium journal.")
+        if version not in cls.VERSIONS:
+            raise JournalError(f"Unsupported journal version {version}.")
+
+        journal = cls(seed)
+        data = file.read()
+        words = array('H')
+        # Drop a half-written trailing key
+        words.frombytes(data[:len(data) - len(data) % 2])
+        if sys.byteorder != 'little':
+            words.byteswap()
+        if cls.HASH not in words:
+            journal.keys = words
+            return journal
+        index = 0
+        while index < len(words):
+            word = words[index]
+            if word != cls.HASH:
+                journal.keys.append(word)
+                index += 1
+                continue
+            hash_words = words[index + 1:index + 1 + cls.HASH_WORDS]
+            if len(hash_words) < cls.HASH_WORDS:
+                # Drop a half-written trailing hash
+                break
+            state_hash = sum(hash_word << (16 * i) for i, hash_word in enumerate(hash_words))
+            journal.hashes.setdefault(len(journal.keys), []).append(state_hash)
+            index += 1 + cls.HASH_WORDS
+        return journal
+
+
+class KeySource:
+    """
+    Where the game scene and the input handler get their keys from. consume is called with each key the
+    director hands the scene, read fetches an extra key while a command is waiting for one, and shift is
+    the shift state that went with the last key.
+    """
+
+    def __init__(self, journal: Journal):
+        self.journal = journal
+        self.shift = False
+
+    def consume(self, key: int):
+        raise NotImplementedError('consume must be implemented by child class.')
+
+    def read(self) -> int:
+        raise NotImplementedError('read must be implemented by child class.')
+
+    def turn(self, tick: int, state_hash: int):
+        """
+        Called at the end of every turn with the state hash of the game, which is recorded in the journal
+
+        :param tick: Tick the turn ended on
+        """
+        self.journal.record_hash(state_hash)
+
+
+class KeyboardSource(KeySource):
+    """
+    Reads keys from the terminal and records each of them in the journal.
+    """
+
+    def consume(self, key: int):
+        self.shift = bool(bearlib.check(bearlib.TK_SHIFT))
+        self.journal.record(key, self.shift)
+
+    def read(self) -> int:
+        key = bearlib.read()
+        self.consume(key)
+        return key
+
+
+class JournalSource(KeySource):
+    """
+    Plays back the keys of a recorded journal.
+    """
+
+    def __init__(self, journal: Journal):
+        super().__init__(journal)
+        self._keys = iter(journal)
+        self.position = 0
+        # Key position of the last turn played, and how many turns have ended there
+        self._turn_position = 0
+        self._turns = 0
+
+    def consume(self, key: int):
+        # Keys handed to the scene during a replay were already taken from the journal by next_key
+        pass
+
+    def turn(self, tick: int, state_hash: int):
+        """
+        Checks the state hash of the turn against the one the journal recorded for it
+
+        :raises JournalDiverged: If the replay's state differs from the recorded game's
+        """
+        if self.position != self._turn_position:
+            self._turn_position = self.position
+            self._turns = 0
+        expected = self.journal.expected_hash(self.position, self._turns)
+        self._turns += 1
+        if expected is not None and expected != state_hash:
+            raise JournalDiverged(f"The replay diverged from the journal at tick {tick}, after {self.position} "
+                                  f"keys: state hash {state_hash:#018x}, expected {expected:#018x}.")
+
+    def next_key(self) -> Optional[int]:
+        """
+        Returns the next key of the journal, or None once it has been played back completely.
+        """
+        try:
+            key, self.shift = next(self._keys)
+        except StopIteration:
+            return None
+        self.position += 1
+        return key
+
+    def read(self) -> int:
+        key = self.next_key()
+        if key is None:
+            raise JournalExhausted("The journal ended while a command was waiting for input.")
+        return key
@@ -1,14 +1,53 @@
+from argparse import ArgumentParser
+import sys
+
 from chronotherium.scene import StartScene
+from chronotherium.autosave import Autosave
+from chronotherium.messages import MessageLog
 from chronotherium.window import Window
 from clubsandwich.director import DirectorLoop
 
-window = Window()
-
 
 class SceneLoop(DirectorLoop):
+    def terminal_init(self):
+        Window().start()
+        super().terminal_init()
+
     def get_initial_scene(self):
         return StartScene()
 
 
+def parse_args():
+    parser = ArgumentParser(description='Chronotherium - 2020 7DRL')
+    parser.add_argument('--replay', metavar='JOURNAL', help='Replay a recorded journal headless and exit')
+    parser.add_argument('--until', metavar='TICK', type=int, help='Stop the replay at this tick')
+    parser.add_argument('--timings', action='store_true', help='Print how long each phase of a turn took')
+    parser.add_argument('--autosave', metavar='TURNS', type=int, default=Autosave.INTERVAL,
+                        help=f'Turns between autosaves, 0 to turn autosaving off (default {Autosave.INTERVAL})')
+    parser.add_argument('--history', metavar='FILE',
+                        help='Append every message of the log to this file, indexed in FILE.idx')
+    return parser.parse_args()
+
+
 if __name__ == '__main__':
-    SceneLoop().run()
+    args = parse_args()
+    if args.replay:
+        from chronotherium.journal import Journal, JournalDiverged
+        from chronotherium.replay import replay
+
+        journal = Journal.load(args.replay)
+        try:
+            scene = replay(journal, until=args.until)
+        except JournalDiverged as err:
+            sys.exit(str(err))
+        player = scene.player
+        print(f'Replayed {scene.keys.position}/{len(journal)} keys (seed {journal.seed}): '
+              f'tick {scene.time.time}, floor {scene.map.current_floor}, {player.state.value}, '
+              f'HP {player.hp}/{player.max_hp}, MP {player.tp}/{player.max_tp}, XP {player.xp}')
+        if args.timings:
+            for line in scene.timer.report():
+                print(line)
+    else:
+        Autosave.INTERVAL = args.autosave
+        MessageLog.HISTORY_PATH = args.history
+        SceneLoop().run()
@@ -1,6 +1,6 @@
-from typing import TYPE_CHECKING, List
-from random import randint, randrange
+from typing import TYPE_CHECKING, Callable, Dict, Iterator, List, Optional, Sequence, Set
 from logging import getLogger
+from time import perf_counter
 
 from chronotherium.entities.chronotherium import Chronotherium
 from chronotherium.entities.golem import Golem
@@ -9,12 +9,24 @@ from chronotherium.entities.knight import Knight
 from chronotherium.entities.player import Player
 from clubsandwich.geom import Point, Size, Rect
 from clubsandwich.tilemap import TileMap, CellOutOfBoundsError
-from clubsandwich.generators import RandomBSPTree, BSPNode
 
-from chronotherium.tiles.tile import Tile, Empty, FloorTile, Wall, Orientation, StairsUp, StairsDown, Door
-from chronotherium.window import MAP_SIZE, VIEW_SIZE, MAP_ORIGIN
+from chronotherium.tiles.tile import Tile, Empty, Stairs, StairsUp, StairsDown, Terrain, KINDS
+from chronotherium.changes import Change, ChangeLog
+from chronotherium.chunk import Chunk, BLOCKS_SIGHT, CAN_OPEN, IS_EMPTY, NOT_EMPTY
+from chronotherium.pathing import DistanceMap
+from chronotherium.rand import RNG, Stream
+from chronotherium.stamps import room_stamp, vault_library
+from chronotherium.statehash import cell_key, cells_key, current_key, door_key, floor_key
+from chronotherium.bitmap import Bitmap
+from chronotherium.bsp import BSP
+from chronotherium.window import MAP_SIZE, VIEW_SIZE, MAP_ORIGIN, FG_COLOR
+from chronotherium.time import Time
 
 if TYPE_CHECKING:
+    import numpy as np
+
+    from chronotherium.entities.entity import Entity
+    from chronotherium.save import PackedFloor
     from chronotherium.scene import GameScene
 
 logger = getLogger()
@@ -25,10 +37,32 @@ class Floor(TileMap):
     LEAF_MIN = 6
     ROOM_MIN = 5
     ROOM_MAX = 7
-
-    def __init__(self, origin: Point, size: Size):
-        super().__init__(size, cell_class=Empty)
+    # Chance of a leaf getting a vault instead of a room, when one fits in it
+    VAULT_CHANCE = 0.2
+    # Layouts: BSP rooms joined by hallways, or a cellular automata cave
+    ROOMS = 'rooms'
+    CAVES = 'caves'
+
+    def __init__(self, origin: Point, size: Size, rng: Stream, generate: bool = True, layout: str = ROOMS):
+        """
+        :param layout: How the floor is laid out when it is generated, ROOMS or CAVES
+        """
+        # Cells are stored in chunks as the code of their kind of tile rather than as tiles, see Chunk and Tile
         self.size = size
+        self.points_of_interest = {}
+        self.width = size.width
+        self.height = size.height
+        self.chunks_wide = -(-self.width // Chunk.SIZE)
+        self._chunks: Dict[int, Chunk] = {}
+        # Sparse state of the cells that have any, by floor index (y * width + x)
+        self._features: Dict[int, Tile] = {}
+        self._open_doors: Set[int] = set()
+        # Versions of the floor and the cells changed lately, for whatever caches something derived from it
+        self.changes = ChangeLog()
+        # Keys of every cell, open door and entity of the floor XORed together, kept up to date change by change
+        self.state_hash = 0
+
+        self.rng = rng
         self.entities = []
         self.room_min = self.ROOM_MIN
         self.room_max = self.ROOM_MAX
@@ -37,174 +71,603 @@ class Floor(TileMap):
         self.stairs_up = None
         self.stairs_down = None
 
-        self.bsp_tree = RandomBSPTree(self.size, self.leaf_min)
+        self.seen = Bitmap(size)
+        self._walkable = None
+        self._distance_maps = {}
+
+        self.layout = layout
+        self.bsp_tree = None
+        # Seconds spent generating the floor, and the number of open tiles it had when enemies were placed on it
+        self.generate_time = 0.0
+        self.open_count = None
 
         self.bounds = Rect(origin, size)
         self.area = self.bounds.with_inset(1)
-        self.generate()
+        if generate and layout == self.CAVES:
+            start = perf_counter()
+            self.generate_caves()
+            self.generate_time = perf_counter() - start
+        elif generate:
+            start = perf_counter()
+            self.bsp_tree = BSP(self.size, self.leaf_min, self.rng)
+            self.generate()
+            self.generate_time = perf_counter() - start
+
+    def chunk_at(self, x: int, y: int, make: bool = False) -> Optional[Chunk]:
+        """
+        Returns the chunk holding the cell (x, y), None if nothing was ever written to it unless make is set
+        """
+        key = (y // Chunk.SIZE) * self.chunks_wide + x // Chunk.SIZE
+        chunk = self._chunks.get(key)
+        if chunk is None and make:
+            chunk = Chunk(x // Chunk.SIZE, y // Chunk.SIZE)
+            self._chunks[key] = chunk
+        return chunk
+
+    def chunks_in(self, rect: Optional[Rect] = None) -> Iterator[Chunk]:
+        """
+        Yields the chunks made so far that overlap rect, or the whole floor
+        """
+        if rect is None:
+            yield from self._chunks.values()
+            return
+        for cy in range(max(rect.y, 0) // Chunk.SIZE, min(rect.y2, self.height - 1) // Chunk.SIZE + 1):
+            for cx in range(max(rect.x, 0) // Chunk.SIZE, min(rect.x2, self.width - 1) // Chunk.SIZE + 1):
+                chunk = self._chunks.get(cy * self.chunks_wide + cx)
+                if chunk is not None:
+                    yield chunk
+
+    def cell(self, point: Point) -> Tile:
+        x = point.x
+        y = point.y
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            raise CellOutOfBoundsError(f"Cell index out of range: {point!r}")
+        chunk = self._chunks.get((y // Chunk.SIZE) * self.chunks_wide + x // Chunk.SIZE)
+        code = chunk.kinds[(y % Chunk.SIZE) * Chunk.SIZE + x % Chunk.SIZE] if chunk is not None else 0
+        return self._tile(code, point)
+
+    def _tile(self, code: int, point: Point) -> Tile:
+        kind, terrain = KINDS[code]
+        if kind.FEATURE:
+            return self._features[point.y * self.width + point.x]
+        tile = kind.__new__(kind)
+        tile.point = point
+        tile.terrain = terrain
+        tile._floor = self
+        return tile
+
+    def _scan(self, rect: Optional[Rect] = None, skip: Optional[Callable[[Optional[Chunk]], bool]] = None,
+              kinds: Optional[Sequence[bool]] = None) -> Iterator[Tile]:
+        """
+        Yields the cells of rect, or of the whole floor, column by column in the order TileMap does.
+
+        :param skip: Leaves out the cells of the chunks it returns True for. Chunks that were never made are passed
+        to it as None
+
+        :param kinds: Whether to yield cells of each kind, by kind code. All cells are yielded if not given
+        """
+        size = Chunk.SIZE
+        if rect is None:
+            x1, y1, x2, y2 = 0, 0, self.width - 1, self.height - 1
+        else:
+            x1, y1 = max(rect.x, 0), max(rect.y, 0)
+            x2, y2 = min(rect.x2, self.width - 1), min(rect.y2, self.height - 1)
+        for x in range(x1, x2 + 1):
+            for cy in range(y1 // size, y2 // size + 1):
+                chunk = self._chunks.get(cy * self.chunks_wide + x // size)
+                if skip is not None and skip(chunk):
+                    continue
+                for y in range(max(y1, cy * size), min(y2, cy * size + size - 1) + 1):
+                    code = chunk.kinds[(y % size) * size + x % size] if chunk is not None else 0
+                    if kinds is None or kinds[code]:
+                        yield self._tile(code, Point(x, y))
+
+    @property
+    def cells(self) -> Iterator[Tile]:
+        return self._scan()
 
     def set_cell(self, tile: Tile):
-        try:
-            self._cells[tile.point.x][tile.point.y] = tile
-            tile.floor = self
-        except IndexError:
+        x = tile.point.x
+        y = tile.point.y
+        if not self.contains_point(tile.point):
             logger.info("Setting cell out of bounds!")
             return False
+        index = y * self.width + x
+        code = tile.kind
+        chunk = self.chunk_at(x, y, make=True)
+        old = chunk.kinds[(y % Chunk.SIZE) * Chunk.SIZE + x % Chunk.SIZE]
+        # An open door lets light through whatever its kind says
+        blocked_sight = BLOCKS_SIGHT[old] and index not in self._open_doors
+        chunk.set_kind(x % Chunk.SIZE, y % Chunk.SIZE, code)
+        self._features.pop(index, None)
+        if index in self._open_doors:
+            self._open_doors.discard(index)
+            self.state_hash ^= door_key(index)
+        self.state_hash ^= cell_key(index, old) ^ cell_key(index, code)
+        if tile.FEATURE:
+            self._features[index] = tile
+        tile.floor = self
+        self._walkable = None
+        change = Change.TERRAIN | Change.SIGHT if blocked_sight != BLOCKS_SIGHT[code] else Change.TERRAIN
+        self.changes.record(index, change)
+
+    def blit(self, origin: Point, width: int, kinds: bytes, mask: Optional[bytes] = None):
+        """
+        Writes a block of cells by slice assignment into the chunks, rather than one tile at a time. Cells that
+        fall off the floor are left out.
+
+        :param origin: Point of the top left cell of the block
+
+        :param width: Width of the block. Its height is len(kinds) // width.
+
+        :param kinds: Kind code of every cell of the block, row by row. Kinds whose tiles have state of their own,
+        like stairs, can't be written this way.
+
+        :param mask: 0xFF for every cell of the block to write and 0 for every cell to leave as it is, row by row.
+        Every cell is written if not given.
+        """
+        size = Chunk.SIZE
+        height = len(kinds) // width
+        x1, y1 = max(origin.x, 0), max(origin.y, 0)
+        x2, y2 = min(origin.x + width, self.width) - 1, min(origin.y + height, self.height) - 1
+        if x1 > x2 or y1 > y2:
+            return
+        block = Rect(Point(x1, y1), Size(x2 - x1 + 1, y2 - y1 + 1))
+        before = self.kind_array(block)
+        for cy in range(y1 // size, y2 // size + 1):
+            for cx in range(x1 // size, x2 // size + 1):
+                chunk = self.chunk_at(cx * size, cy * size, make=True)
+                left, right = max(x1, cx * size), min(x2, cx * size + size - 1)
+                count = right - left + 1
+                for y in range(max(y1, cy * size), min(y2, cy * size + size - 1) + 1):
+                    source = (y - origin.y) * width + left - origin.x
+                    target = (y % size) * size + left % size
+                    row = kinds[source:source + count]
+                    if mask is not None:
+                        # Mask bytes are all ones or all zeros, so whole rows can be merged as integers
+                        bits = int.from_bytes(mask[source:source + count], 'big')
+                        old = int.from_bytes(chunk.kinds[target:target + count], 'big')
+                        row = (old & ~bits | int.from_bytes(row, 'big') & bits).to_bytes(count, 'big')
+                    chunk.kinds[target:target + count] = row
+                chunk.recount()
+
+        self.state_hash ^= self._block_key(block, before) ^ self._block_key(block, self.kind_array(block))
+        for index in [index for index in self._features if self._in_block(index, origin, width, height, mask)]:
+            del self._features[index]
+        for index in [index for index in self._open_doors if self._in_block(index, origin, width, height, mask)]:
+            self._open_doors.discard(index)
+            self.state_hash ^= door_key(index)
+        self._walkable = None
+        self.changes.record_area(Change.TERRAIN | Change.SIGHT)
+
+    def can_blit(self, origin: Point, width: int, height: int, mask: Optional[bytes] = None) -> bool:
+        """
+        Returns whether a block would fit on the floor without overwriting anything but Empty cells
+
+        :param mask: As for blit
+        """
+        if origin.x < 0 or origin.y < 0 or origin.x + width > self.width or origin.y + height > self.height:
+            return False
+        size = Chunk.SIZE
+        for cy in range(origin.y // size, (origin.y + height - 1) // size + 1):
+            for cx in range(origin.x // size, (origin.x + width - 1) // size + 1):
+                chunk = self._chunks.get(cy * self.chunks_wide + cx)
+                if chunk is None or chunk.empty_count == size * size:
+                    continue
+                left, right = max(origin.x, cx * size), min(origin.x + width - 1, cx * size + size - 1)
+                count = right - left + 1
+                for y in range(max(origin.y, cy * size), min(origin.y + height - 1, cy * size + size - 1) + 1):
+                    target = (y % size) * size + left % size
+                    # Empty cells read as 0 and every other cell as 0xFF
+                    filled = chunk.kinds[target:target + count].translate(NOT_EMPTY)
+                    if mask is not None:
+                        source = (y - origin.y) * width + left - origin.x
+                        if int.from_bytes(filled, 'big') & int.from_bytes(mask[source:source + count], 'big'):
+                            return False
+                    elif filled.count(0) != count:
+                        return False
+        return True
+
+    def _block_key(self, block: Rect, kinds: 'np.ndarray') -> int:
+        import numpy as np
+
+        rows, columns = np.indices(kinds.shape)
+        return cells_key((rows + block.y) * self.width + columns + block.x, kinds)
+
+    def _in_block(self, index: int, origin: Point, width: int, height: int, mask: Optional[bytes]) -> bool:
+        y, x = divmod(index, self.width)
+        x -= origin.x
+        y -= origin.y
+        if not (0 <= x < width and 0 <= y < height):
+            return False
+        return mask is None or mask[y * width + x] != 0
+
+    def occupants_at(self, point: Point) -> Sequence['Entity']:
+        chunk = self.chunk_at(point.x, point.y)
+        if chunk is None:
+            return ()
+        return chunk.occupants.get(point.y * self.width + point.x, ())
+
+    def add_occupant(self, point: Point, entity: 'Entity'):
+        chunk = self.chunk_at(point.x, point.y, make=True)
+        index = point.y * self.width + point.x
+        occupants = chunk.occupants.setdefault(index, [])
+        if entity not in occupants:
+            occupants.append(entity)
+            self.changes.record(index, Change.OCCUPANCY)
+
+    def remove_occupant(self, point: Point, entity: 'Entity'):
+        chunk = self.chunk_at(point.x, point.y)
+        if chunk is None:
+            return
+        index = point.y * self.width + point.x
+        occupants = chunk.occupants.get(index)
+        if occupants is not None and entity in occupants:
+            occupants.remove(entity)
+            if not occupants:
+                del chunk.occupants[index]
+            self.changes.record(index, Change.OCCUPANCY)
+
+    def entities_in(self, rect: Rect) -> List['Entity']:
+        """
+        Returns the entities standing in rect, in the order they were added to the floor. Only the chunks
+        overlapping rect are looked at.
+        """
+        found = []
+        for chunk in self.chunks_in(rect):
+            for occupants in chunk.occupants.values():
+                found.extend(entity for entity in occupants if rect.contains(entity.position))
+        return sorted(set(found), key=lambda entity: entity.serial)
+
+    def allows_light(self, point: Point) -> bool:
+        try:
+            return not self.cell(point).block_sight
+        except CellOutOfBoundsError:
+            return False
 
-    def get_empty_tiles(self, rect: Rect = None):
-        empty_tiles = []
-        if rect is not None:
-            for point in rect.points:
-                if isinstance(self.cell(point), Empty):
-                    empty_tiles.append(self.cell(point))
-        else:
-            for cell in self.cells:
-                if isinstance(cell, Empty):
-                    empty_tiles.append(cell)
-
-        return empty_tiles
+    def door_open(self, point: Point) -> bool:
+        return point.y * self.width + point.x in self._open_doors
 
-    def get_open_tiles(self, rect: Rect = None):
-        open_tiles = []
-        if rect is not None:
-            for point in rect.points:
-                if self.cell(point).open:
-                    open_tiles.append(self.cell(point))
+    def set_door_open(self, point: Point, door_open: bool):
+        index = point.y * self.width + point.x
+        if door_open == (index in self._open_doors):
+            return
+        if door_open:
+            self._open_doors.add(index)
         else:
-            for cell in self.cells:
-                if cell.open:
-                    open_tiles.append(cell)
+            self._open_doors.discard(index)
+        self.state_hash ^= door_key(index)
+        self.changes.record(index, Change.TERRAIN | Change.SIGHT)
 
-        return open_tiles
+    def get_empty_tiles(self, rect: Rect = None):
+        return self._tiles(self.empty_indices(rect))
 
-    def find_empty_point(self, rect: Rect = None) -> Point:
-        empty_tiles = self.get_empty_tiles(rect=rect)
-        return empty_tiles[randrange(0, len(empty_tiles))].point
+    def get_open_tiles(self, rect: Rect = None):
+        return self._tiles(self.open_indices(rect))
+
+    def find_empty_point(self, rect: Rect = None, rng: Optional[Stream] = None) -> Point:
+        y, x = divmod(int((rng or self.rng).choice(self.empty_indices(rect))), self.width)
+        return Point(x, y)
+
+    def find_open_point(self, rect: Rect = None, rng: Optional[Stream] = None) -> Point:
+        y, x = divmod(int((rng or self.rng).choice(self.open_indices(rect))), self.width)
+        return Point(x, y)
+
+    def empty_indices(self, rect: Optional[Rect] = None) -> 'np.ndarray':
+        """
+        Returns the index, y * width + x, of every Empty cell of rect, or of the whole floor, column by column in
+        the order get_empty_tiles lists them
+        """
+        import numpy as np
+
+        rect = self._clip(rect)
+        if rect is None:
+            return np.zeros(0, dtype=np.int64)
+        table = np.array(IS_EMPTY + [False] * (256 - len(IS_EMPTY)))
+        return self._column_order(table[self.kind_array(rect)], rect)
+
+    def open_indices(self, rect: Optional[Rect] = None) -> 'np.ndarray':
+        """
+        Returns the index, y * width + x, of every open cell of rect, or of the whole floor, column by column in
+        the order get_open_tiles lists them
+        """
+        import numpy as np
+
+        rect = self._clip(rect)
+        if rect is None:
+            return np.zeros(0, dtype=np.int64)
+        return self._column_order(self.open_array(rect), rect)
+
+    def _clip(self, rect: Optional[Rect]) -> Optional[Rect]:
+        """
+        Returns the part of rect on the floor, the whole floor if rect is None, or None if rect is off the floor
+        """
+        if rect is None:
+            return Rect(Point(0, 0), self.size)
+        x1, y1 = max(rect.x, 0), max(rect.y, 0)
+        x2, y2 = min(rect.x2, self.width - 1), min(rect.y2, self.height - 1)
+        if x1 > x2 or y1 > y2:
+            return None
+        return Rect(Point(x1, y1), Size(x2 - x1 + 1, y2 - y1 + 1))
+
+    def _column_order(self, cells: 'np.ndarray', rect: Rect) -> 'np.ndarray':
+        # Down each column in turn, the order TileMap and _scan visit cells in
+        import numpy as np
+
+        xs, ys = np.divmod(np.flatnonzero(cells.T), rect.height)
+        return (ys + rect.y) * self.width + xs + rect.x
+
+    def _tiles(self, indices: 'np.ndarray') -> List[Tile]:
+        tiles = []
+        for index in indices.tolist():
+            y, x = divmod(index, self.width)
+            tiles.append(self.cell(Point(x, y)))
+        return tiles
+
+    def kind_array(self, rect: Optional[Rect] = None) -> 'np.ndarray':
+        """
+        Returns the kind code of every cell of rect, or of the whole floor, shape (height, width)
+        """
+        import numpy as np
+
+        if rect is None:
+            rect = Rect(Point(0, 0), self.size)
+        size = Chunk.SIZE
+        codes = np.zeros((rect.height, rect.width), dtype=np.uint8)
+        for chunk in self.chunks_in(rect):
+            x1, y1 = max(rect.x, chunk.x * size), max(rect.y, chunk.y * size)
+            x2, y2 = min(rect.x2, chunk.x * size + size - 1), min(rect.y2, chunk.y * size + size - 1)
+            kinds = np.frombuffer(chunk.kinds, dtype=np.uint8).reshape(size, size)
+            codes[y1 - rect.y:y2 - rect.y + 1, x1 - rect.x:x2 - rect.x + 1] = \
+                kinds[y1 - chunk.y * size:y2 - chunk.y * size + 1, x1 - chunk.x * size:x2 - chunk.x * size + 1]
+        return codes
+
+    def terrain_array(self, rect: Optional[Rect] = None) -> 'np.ndarray':
+        """
+        Returns the glyph of every cell of rect, or of the whole floor, shape (height, width)
+        """
+        import numpy as np
+
+        if rect is None:
+            rect = Rect(Point(0, 0), self.size)
+        glyphs = np.array([terrain.value for _, terrain in KINDS], dtype='<u2')
+        terrain = glyphs[self.kind_array(rect)]
+        for index in self._open_doors:
+            y, x = divmod(index, self.width)
+            if rect.contains(Point(x, y)):
+                terrain[y - rect.y, x - rect.x] = Terrain.DOOR_OPEN.value
+        return terrain
+
+    def color_array(self, rect: Optional[Rect] = None) -> 'np.ndarray':
+        """
+        Returns the colour of every cell of rect, or of the whole floor, shape (height, width)
+        """
+        import numpy as np
+
+        colors = np.array([kind.COLOR if kind.COLOR is not None else FG_COLOR for kind, _ in KINDS], dtype='<u4')
+        return colors[self.kind_array(rect)]
+
+    def open_array(self, rect: Optional[Rect] = None) -> 'np.ndarray':
+        """
+        Returns whether every cell of rect, or of the whole floor, is open, as get_open_tiles finds them,
+        shape (height, width)
+        """
+        import numpy as np
+
+        if rect is None:
+            rect = Rect(Point(0, 0), self.size)
+        # Kinds that are open unless something blocking stands on them, for those that aren't always open. Doors
+        # are only open while they are.
+        table = np.array([kind.OPEN or not kind.BLOCK for kind, _ in KINDS] + [False] * (256 - len(KINDS)))
+        kinds = self.kind_array(rect)
+        open_cells = table[kinds]
+        for index in self._open_doors:
+            y, x = divmod(index, self.width)
+            if rect.contains(Point(x, y)):
+                open_cells[y - rect.y, x - rect.x] = True
+        for chunk in self.chunks_in(rect):
+            for index, occupants in chunk.occupants.items():
+                y, x = divmod(index, self.width)
+                if rect.contains(Point(x, y)) and not KINDS[kinds[y - rect.y, x - rect.x]][0].OPEN and \
+                        any(entity.blocking for entity in occupants):
+                    open_cells[y - rect.y, x - rect.x] = False
+        return open_cells
 
-    def find_open_point(self, rect: Rect = None) -> Point:
-        open_tiles = self.get_open_tiles(rect=rect)
-        return open_tiles[randrange(0, len(open_tiles))].point
+    @property
+    def walkable(self) -> Bitmap:
+        if self._walkable is None:
+            # Maps each kind code to '1' if walkable, so a row of codes reads as a binary number once reversed
+            table = bytes(ord('1') if kind.kind_walkable() else ord('0') for kind, _ in KINDS).ljust(256, b'0')
+            size = Chunk.SIZE
+            bits = 0
+            for chunk in self._chunks.values():
+                x = chunk.x * size
+                width = min(size, self.width - x)
+                for row in range(0, min(size, self.height - chunk.y * size)):
+                    line = chunk.kinds[row * size:row * size + width].translate(table)[::-1]
+                    bits |= int(line, 2) << ((chunk.y * size + row) * self.width + x)
+            self._walkable = Bitmap(self.size, bits)
+        return self._walkable
+
+    def explore(self, visible: Bitmap):
+        """
+        Marks everything in the visibility bitmap as seen
+        """
+        self.seen |= visible
+
+    def frontier(self) -> List[Point]:
+        """
+        Returns the seen walkable points that border at least one unseen point
+        """
+        return list((self.seen & self.walkable & (~self.seen).dilate()).points())
+
+    def distance_map(self, key: str, stamp, goals, valid: Optional[Callable[[DistanceMap], bool]] = None) \
+            -> DistanceMap:
+        """
+        Returns the cached distance map stored under key, recomputing it if it was built from a different stamp
+        or before the terrain last changed.
+
+        :param key: Name of the distance map, e.g. 'explore'
+
+        :param stamp: Value describing the state the map should reflect
+
+        :param goals: Callable returning the goal points, only called when the map is rebuilt
+
+        :param valid: Callable taking the cached map and returning whether it can still be used, for goals that
+        come and go without the stamp changing
+        """
+        stamp = (self.changes.terrain, stamp)
+        distance_map = self._distance_maps.get(key)
+        if distance_map is None or distance_map.stamp != stamp or (valid is not None and not valid(distance_map)):
+            distance_map = DistanceMap(self, goals(), stamp=stamp)
+            self._distance_maps[key] = distance_map
+        return distance_map
+
+    def invalidate_distance_maps(self):
+        self._distance_maps = {}
 
     def connect_tiles(self, tile1: Tile, tile2: Tile, doors: bool = True, manhattan: bool = False):
-        origin = tile1.point
-        dest = origin.get_closest_point([neighbor for neighbor in tile2.point.neighbors])
-        self.hallway_tile(origin, doors)
-        if manhattan:
-            for point in origin.path_L_to(dest):
-                self.hallway_tile(point, doors)
-        else:
-            for point in origin.points_bresenham_to(dest):
-                self.hallway_tile(point, doors)
-        self.hallway_tile(dest, doors)
-
-    def hallway_tile(self, point, doors=True):
-        if isinstance(self.cell(point), Wall):
-            if doors:
-                if any([neighbor for neighbor in point.neighbors if isinstance(neighbor, Door)]):
-                    return
-                else:
-                    tile = Door(point)
-            else:
-                if isinstance(self.cell(point), Door):
-                    return
-                else:
-                    tile = FloorTile(point)
-        else:
-            tile = FloorTile(point)
-        self.set_cell(tile)
-
-    def connect_nodes(self, node1: BSPNode, node2: BSPNode, connect_parents: bool = False):
-        if not node1.data.get('connected_to_sibling') or not node2.data.get('connected_to_sibling'):
-            room1 = node1.data.get('room')
-            room2 = node2.data.get('room')
+        """
+        Digs a hallway from tile1 to the closest cell next to tile2, as an L shaped path if manhattan is set or
+        a straight line otherwise
+
+        :param doors: Whether walls the hallway passes through become doors rather than floor
+        """
+        self.connect_points(tile1.point, tile2.point, doors, manhattan)
+
+    def connect_points(self, origin: Point, target: Point, doors: bool = True, manhattan: bool = False):
+        """
+        Digs a hallway from origin to the closest cell next to target, as connect_tiles does
+        """
+        from chronotherium.corridors import l_path, line_path
+
+        dest = origin.get_closest_point([neighbor for neighbor in target.neighbors])
+        xs, ys = l_path(origin, dest) if manhattan else line_path(origin, dest)
+        self.carve(xs, ys, doors)
+
+    def carve(self, xs: 'np.ndarray', ys: 'np.ndarray', doors: bool = True):
+        """
+        Digs a hallway along a path in one write: the cells of the path are read as a block of kind codes, the
+        hallway's kinds are worked out for the whole path at once and the block is written back through a mask
+        of the path's cells.
+
+        :param xs: Column of every cell of the path, from one end to the other
+
+        :param ys: Row of every cell of the path
+        """
+        import numpy as np
+
+        from chronotherium.corridors import corridor_kinds
+        from chronotherium.stamps import WRITE
+
+        x1, y1, x2, y2 = int(xs.min()), int(ys.min()), int(xs.max()), int(ys.max())
+        if x1 < 0 or y1 < 0 or x2 >= self.width or y2 >= self.height:
+            raise CellOutOfBoundsError(f"Hallway out of range: ({x1}, {y1}) to ({x2}, {y2})")
+        block = Rect(Point(x1, y1), Size(x2 - x1 + 1, y2 - y1 + 1))
+        kinds = self.kind_array(block)
+        rows, columns = ys - y1, xs - x1
+        carved, write = corridor_kinds(kinds[rows, columns], doors)
+        kinds[rows[write], columns[write]] = carved[write]
+        mask = np.zeros(kinds.shape, dtype=np.uint8)
+        mask[rows[write], columns[write]] = WRITE
+        self.blit(block.origin, block.width, kinds.tobytes(), mask.tobytes())
+
+    def connect_nodes(self, node1: int, node2: int, connect_parents: bool = False):
+        tree = self.bsp_tree
+        if not tree.connected[node1] or not tree.connected[node2]:
+            room1 = tree.rooms[node1]
+            room2 = tree.rooms[node2]
             if room1 and room2:
-                self.create_hallway(room1, room2, horiz=node1.is_horz)
+                self.create_hallway(room1, room2, horiz=bool(tree.horizontal[node1]))
             else:
-                halls = randint(2, 4)
+                # The ends are drawn from the open cells of each node's kind codes, without making any tiles
+                halls = self.rng.randint(2, 4)
+                rect1 = tree.rect(node1).with_inset(1)
+                rect2 = tree.rect(node2).with_inset(1)
                 for i in range(0, halls):
-                    tile1 = self.cell(self.find_open_point(rect=node1.rect.with_inset(1)))
-                    tile2 = self.cell(self.find_open_point(rect=node2.rect.with_inset(1)))
-                    self.connect_tiles(tile1, tile2)
-            node1.data['connected_to_sibling'] = True
-            node2.data['connected_to_sibling'] = True
+                    self.connect_points(self.find_open_point(rect=rect1), self.find_open_point(rect=rect2))
+            tree.connected[node1] = True
+            tree.connected[node2] = True
         if connect_parents:
-            parent1 = node1.parent_weakref()
-            parent2 = node2.parent_weakref()
-            if parent1 and parent2:
+            parent1 = tree.parent[node1]
+            parent2 = tree.parent[node2]
+            if parent1 != BSP.NONE and parent2 != BSP.NONE:
                 self.connect_nodes(parent1, parent2)
 
     def generate(self):
-        rooms = []
-        for leaf in self.bsp_tree.root.leaves:
-            room = leaf.rect.get_random_rect(min_size=Size(self.room_min, self.room_min))
-            leaf.data['room'] = room
-            leaf.data['connected_to_sibling'] = False
-            rooms.append(room)
-        for room in rooms:
-            self.place_room(room)
-
-        for siblings in self.bsp_tree.root.sibling_pairs:
+        tree = self.bsp_tree
+        for leaf in tree.leaves:
+            tree.rooms[leaf] = tree.random_rect(leaf, self.room_min)
+        for leaf in tree.leaves:
+            vault = self.place_vault(tree.rect(leaf))
+            if vault is not None:
+                tree.rooms[leaf] = vault
+            else:
+                self.place_room(tree.rooms[leaf])
+
+        for siblings in tree.sibling_pairs():
             self.connect_nodes(*siblings)
 
-        for leaf in self.bsp_tree.root.leaves:
-            self.connect_nodes(leaf, next(self.bsp_tree.root.leaves), connect_parents=True)
+        first = tree.leaves[0]
+        for leaf in tree.leaves:
+            self.connect_nodes(leaf, first, connect_parents=True)
+
+    def generate_caves(self):
+        from chronotherium.caves import Caves
+
+        kinds = Caves(self.size, self.rng.randrange(0, 2 ** 32)).kinds()
+        self.blit(Point(0, 0), self.width, kinds.tobytes())
 
     def create_hallway(self, room1: Rect, room2: Rect, horiz=False) -> None:
 
-        halls = randint(2, 3)
+        from chronotherium.corridors import closest_in_rect
+
+        halls = self.rng.randint(2, 3)
+        inner = room2.with_inset(1)
         for i in range(0, halls):
+            # Edge points are rolled by their offset along the edge, the same roll as choosing from its points
             if not horiz:
-                top = [point for point in room1.points_top]
-                edge_point = top[randrange(0, len(top))]
-                closest_point = edge_point.get_closest_point([p for p in room2.points])
-                if room2.with_inset(1).contains(next(edge_point.path_L_to(closest_point))):
-                    bottom = [point for point in room1.points_bottom]
-                    edge_point = bottom[randrange(0, len(bottom))]
-                    closest_point = edge_point.get_closest_point([p for p in room2.points])
-                edge_tile = self.cell(edge_point)
-                closest_tile = self.cell(closest_point)
-                self.connect_tiles(edge_tile, closest_tile, manhattan=True)
+                edge_point = Point(room1.x + 1 + self.rng.randrange(0, room1.width - 2), room1.y)
+                if inner.contains(edge_point):
+                    edge_point = Point(room1.x + 1 + self.rng.randrange(0, room1.width - 2), room1.y2)
             else:
-                right = [point for point in room1.points_right]
-                edge_point = right[randrange(0, len(right))]
-                closest_point = edge_point.get_closest_point([p for p in room2.points])
-                if room2.with_inset(1).contains(next(edge_point.path_L_to(closest_point))):
-                    left = [point for point in room1.points_left]
-                    edge_point = left[randrange(0, len(left))]
-                    closest_point = edge_point.get_closest_point([p for p in room2.points])
-                edge_tile = self.cell(edge_point)
-                closest_tile = self.cell(closest_point)
-                self.connect_tiles(edge_tile, closest_tile, manhattan=True)
+                edge_point = Point(room1.x2, room1.y + 1 + self.rng.randrange(0, room1.height - 2))
+                if inner.contains(edge_point):
+                    edge_point = Point(room1.x, room1.y + 1 + self.rng.randrange(0, room1.height - 2))
+            closest_point = closest_in_rect(edge_point, room2)
+            self.connect_tiles(self.cell(edge_point), self.cell(closest_point), manhattan=True)
 
     def get_rect(self) -> Rect:
-        width = randint(self.room_min, self.room_max)
-        height = randint(self.room_min, self.room_max)
+        width = self.rng.randint(self.room_min, self.room_max)
+        height = self.rng.randint(self.room_min, self.room_max)
         origin = self.find_empty_point()
         return Rect(origin, Size(width, height))
 
     def place_room(self, room: Rect, no_floor: bool = False):
-        if not no_floor:
-            for point in room.with_inset(1).points:
-                self.set_cell(FloorTile(point))
-
-        for point in room.points_top:
-            self.set_cell(Wall(point, Orientation.HORIZONTAL))
-        for point in room.points_bottom:
-            self.set_cell(Wall(point, Orientation.HORIZONTAL))
-        for point in room.points_left:
-            self.set_cell(Wall(point, Orientation.VERTICAL))
-        for point in room.points_right:
-            self.set_cell(Wall(point, Orientation.VERTICAL))
-        self.set_cell(Wall(room.origin, Orientation.TOP_LEFT))
-        self.set_cell(Wall(room.point_top_right, Orientation.TOP_RIGHT))
-        self.set_cell(Wall(room.point_bottom_right, Orientation.BOTTOM_RIGHT))
-        self.set_cell(Wall(room.point_bottom_left, Orientation.BOTTOM_LEFT))
+        kinds, mask = room_stamp(room.width, room.height, floor=not no_floor)
+        self.blit(room.origin, room.width, kinds, mask)
+
+    def place_vault(self, rect: Rect) -> Optional[Rect]:
+        """
+        Rolls for a vault from the vault library to put somewhere in rect, and stamps it if one fits there
+
+        :return: The area of the vault, or None if there isn't one
+        """
+        if self.VAULT_CHANCE <= 0 or self.rng.random() >= self.VAULT_CHANCE:
+            return None
+        fitting = [vault for vault in vault_library() if vault.width <= rect.width and vault.height <= rect.height]
+        if not fitting:
+            return None
+        vault = self.rng.choice(fitting)
+        origin = Point(self.rng.randint(rect.x, rect.x + rect.width - vault.width),
+                       self.rng.randint(rect.y, rect.y + rect.height - vault.height))
+        if not self.can_blit(origin, vault.width, vault.height, vault.mask):
+            return None
+        self.blit(origin, vault.width, vault.kinds, vault.mask)
+        return Rect(origin, vault.size)
 
     def bounds_room(self):
-        for point in self.area.points:
-            self.set_cell(FloorTile(point))
-
-        self.place_room(self.bounds, no_floor=True)
+        self.place_room(self.bounds)
 
 
 class Map:
@@ -214,14 +677,40 @@ class Map:
     VIEW_SIZE = VIEW_SIZE
     ORIGIN = MAP_ORIGIN
     ENEMY_DENSITY = 30
+    # Floors laid out as caves rather than rooms
+    CAVE_FLOORS = frozenset({2, 4})
+    # Turns a floor is kept in memory after the player leaves it, 0 to keep every floor in memory
+    EVICT_AFTER = 100
+    # Kinds of enemy placed on every floor, in the order they are placed
+    ENEMIES = [Golem, Sentry, Knight]
+
+    def __init__(self, scene: 'GameScene', time: Time, rng: RNG, generate: bool = True,
+                 floor_size: Optional[Size] = None):
+        """
+        Only the floor the player is on and the floors they left less than EVICT_AFTER turns ago are kept in
+        memory. The others are packed into the compact form a save file stores them in, see PackedFloor, and
+        unpacked when the player takes the stairs to them or stands on stairs leading to them.
+
+        :param scene: Scene the map is played in
+
+        :param time: Clock of the game
 
-    __enemies = [Golem, Sentry, Knight]
+        :param rng: Random streams of the game
 
-    def __init__(self, scene: 'GameScene'):
+        :param generate: Generate and populate the floors. If False the map is left without floors, to be filled
+        in from a save with store
 
-        self.__floors = {}
+        :param floor_size: Size of every floor, FLOOR_SIZE if not given
+        """
 
-        self._floor_size = self.FLOOR_SIZE
+        self.__floors: Dict[int, Floor] = {}
+        self.__packed: Dict[int, 'PackedFloor'] = {}
+        # Tick the player last left each floor on
+        self._left: Dict[int, int] = {}
+        self.time = time
+        self.rng = rng
+
+        self._floor_size = floor_size if floor_size is not None else self.FLOOR_SIZE
         self._origin = self.ORIGIN
         self._center = Point(int(self._floor_size.width / 2), int(self._floor_size.height / 2))
 
@@ -232,37 +721,85 @@ class Map:
         self._current_floor = 0
 
         self.scene = scene
+        self.player = None
+        # Serial of the next entity made, see Entity.serial
+        self.serials = 0
 
-        for i in range(0, self.FLOORS):
-            self.__floors[i] = Floor(self._origin, self._floor_size)
-            self.populate_floor(self.__floors[i])
-
-        for index in self.__floors:
-            floor = self.__floors.get(index + 1)
-            if floor:
-                self.place_stairs(index, index + 1)
+        if not generate:
+            return
 
-        for floor in self.__floors.values():
+        # Each floor only rolls on its own stream, so the floors can be finished and packed away one at a time.
+        # A floor is populated once its stairs are in, so that nothing spawns on or next to them.
+        player_start = None
+        for i in range(0, self.FLOORS):
+            self.__floors[i] = Floor(self._origin, self._floor_size, rng.floor(i), layout=self.layout(i))
+            if i == 0:
+                continue
+            self.place_stairs(i - 1, i)
+            floor = self.__floors[i - 1]
             if floor.stairs_down and floor.stairs_up:
-                floor.connect_tiles(floor.stairs_down, floor.stairs_up)
+                # Caves are tunnelled through rather than given doors in their walls
+                floor.connect_tiles(floor.stairs_down, floor.stairs_up, doors=floor.layout != Floor.CAVES)
+            if i - 1 == self._current_floor:
+                player_start = floor.stairs_up.point.get_farthest_point([tile.point for tile in floor.get_open_tiles()])
+                floor.connect_tiles(floor.cell(player_start), floor.stairs_up)
+                self.populate_floor(floor, exclude=[player_start])
+            else:
+                self.populate_floor(floor)
+            if i - 1 != self._current_floor and self.EVICT_AFTER > 0:
+                self.evict(i - 1)
 
-        player_start_tile = self.floor.cell(self.floor.stairs_up.point.
-                                            get_farthest_point([tile.point for tile in self.floor.get_open_tiles()]))
-        self.player = Player(player_start_tile, self, self.scene)
-        self.floor.connect_tiles(player_start_tile, self.floor.stairs_up)
+        self.player = Player(self.floor.cell(player_start), self, self.scene)
 
         last_floor = self.get_floor(self.FLOORS - 1)
-        chronotherium_start_tile = last_floor.cell(last_floor.find_open_point())
-        Chronotherium(chronotherium_start_tile, self, self.scene)
-        last_floor.connect_tiles(chronotherium_start_tile, last_floor.stairs_down)
-
-    def populate_floor(self, floor):
-        total_enemies = int(len(floor.get_open_tiles()) / self.ENEMY_DENSITY)
-        for enemy in self.__enemies:
-            specific_density = enemy.DENSITY
-            for i in range(0, int(total_enemies * specific_density)):
-                tile = floor.cell(floor.find_open_point())
-                enemy(tile, self, self.scene)
+        chronotherium = self.populate_floor(last_floor, boss=True)[0]
+        last_floor.connect_tiles(chronotherium.tile, last_floor.stairs_down)
+        if self.FLOORS - 1 != self._current_floor and self.EVICT_AFTER > 0:
+            self.evict(self.FLOORS - 1)
+
+    def new_serial(self) -> int:
+        serial = self.serials
+        self.serials += 1
+        return serial
+
+    @classmethod
+    def layout(cls, index: int) -> str:
+        """
+        Returns how the floor at index is laid out
+        """
+        return Floor.CAVES if index in cls.CAVE_FLOORS else Floor.ROOMS
+
+    @classmethod
+    def enemy_counts(cls, open_count: int) -> Dict[type, int]:
+        """
+        Returns how many enemies of each kind are placed on a floor with open_count open tiles
+        """
+        total_enemies = int(open_count / cls.ENEMY_DENSITY)
+        return {enemy: int(total_enemies * enemy.DENSITY) for enemy in cls.ENEMIES}
+
+    def populate_floor(self, floor: Floor, exclude: Sequence[Point] = (), boss: bool = False) -> List['Entity']:
+        """
+        Places the enemies of a floor, all from one sample of its open cells, so that no two share a cell and
+        none are near the stairs
+
+        :param exclude: Other points to keep enemies away from, like the player's start
+
+        :param boss: Whether to place the Chronotherium too, before the enemies
+
+        :return: The entities placed
+        """
+        from chronotherium.spawns import Spawns
+
+        spawns = Spawns(floor, floor.rng.randrange(0, 2 ** 32))
+        floor.open_count = spawns.open_count
+        kinds = [Chronotherium] if boss else []
+        for enemy, count in self.enemy_counts(floor.open_count).items():
+            kinds += [enemy] * count
+        stairs = [stairs.point for stairs in (floor.stairs_up, floor.stairs_down) if stairs is not None]
+        points = spawns.sample(len(kinds), [*stairs, *exclude])
+        if len(points) < len(kinds):
+            logger.info(f"Only room for {len(points)} of {len(kinds)} spawns")
+        return [kind(floor.cell(point), self, self.scene) for kind, point in zip(kinds, points)]
 
     def place_stairs(self, floor_index, dest_floor_index):
         floor = self.__floors[floor_index]
@@ -300,24 +837,32 @@ class Map:
             except CellOutOfBoundsError:
                 pass
         if len(neighbors) > 0:
-            return neighbors[randrange(0, len(neighbors))]
+            return self.rng.wander.choice(neighbors)
         else:
             return point
 
-    def closest_open_point(self, point: Point) -> Point:
-        neighbors = [neighbor for neighbor in point.neighbors]
-        neighbors.extend([neighbor for neighbor in point.diagonal_neighbors])
-
-        found = None
-        for neighbor in neighbors:
-            if self.floor.cell(neighbor).open:
-                found = neighbor
-        if found is None:
-            for neighbor in neighbors:
-                found = self.closest_open_point(neighbor)
-                if found is not None:
-                    return found
-        return found
+    def closest_open_point(self, point: Point) -> Optional[Point]:
+        """
+        Returns an open point as few steps from point as possible, searching outwards a ring of neighbours
+        at a time, or None if the floor has no open point
+        """
+        visited = {point}
+        ring = [point]
+        while ring:
+            found = None
+            next_ring = []
+            for current in ring:
+                for neighbor in list(current.neighbors) + list(current.diagonal_neighbors):
+                    if neighbor in visited or not self.floor.contains_point(neighbor):
+                        continue
+                    visited.add(neighbor)
+                    next_ring.append(neighbor)
+                    if self.floor.cell(neighbor).open:
+                        found = neighbor
+            if found is not None:
+                return found
+            ring = next_ring
+        return None
 
     def find_in_bounds_orthogonal(self, point: Point, delta: int = 1) -> Point:
         if delta == 1:
@@ -354,20 +899,136 @@ class Map:
 
     def move_floors(self, floor: Floor):
         for index, check_floor in self.__floors.items():
-            if floor is check_floor:
+            if floor is check_floor and index != self._current_floor:
+                self._left[self._current_floor] = self.time.time
                 self._current_floor = index
 
     def get_floor(self, index):
-        if 0 <= index <= self.FLOORS:
-            return self.__floors[index]
-        else:
+        """
+        Returns a floor, unpacking it first if it was evicted
+        """
+        if not 0 <= index < self.FLOORS:
             raise IndexError("Attempted to get a floor that doesn't exist!")
+        floor = self.__floors.get(index)
+        if floor is None:
+            floor = self.rehydrate(index)
+        return floor
+
+    def resident(self, index: int) -> Optional[Floor]:
+        """
+        Returns a floor if it is in memory, None if it is packed away
+        """
+        return self.__floors.get(index)
+
+    def packed(self, index: int) -> Optional['PackedFloor']:
+        """
+        Returns the packed form of a floor that was evicted, None if it is in memory
+        """
+        return self.__packed.get(index)
+
+    def terrain_version(self, index: int) -> int:
+        """
+        Returns the version of the last terrain change of a floor, without unpacking it
+        """
+        floor = self.__floors.get(index)
+        if floor is not None:
+            return floor.changes.terrain
+        return self.__packed[index].terrain_version
+
+    @property
+    def state_hash(self) -> int:
+        """
+        Returns a 64 bit hash of the state of the game world: the terrain and doors of every floor, the entities on
+        them and their HP and TP, and the floor the player is on. Each floor keeps its own hash up to date by XOR
+        as its cells and entities change, and packed floors carry theirs, so this only combines one hash per floor.
+        Two games in the same state hash the same, whichever floors they have in memory.
+        """
+        value = current_key(self._current_floor)
+        for index in range(0, self.FLOORS):
+            floor = self.__floors.get(index)
+            value ^= floor_key(index, floor.state_hash if floor is not None else self.__packed[index].state_hash)
+        return value
+
+    def store(self, index: int, packed: 'PackedFloor'):
+        """
+        Adds a floor in packed form, to be unpacked once it is needed
+        """
+        self.__floors.pop(index, None)
+        self.__packed[index] = packed
+
+    def evict(self, index: int):
+        """
+        Packs a floor away, dropping it and everything on it from memory until it is next needed
+        """
+        from chronotherium.save import PackedFloor
+
+        floor = self.__floors.pop(index)
+        self.__packed[index] = PackedFloor.pack(floor, index)
+        for neighbor in (self.__floors.get(index - 1), self.__floors.get(index + 1)):
+            if neighbor is None:
+                continue
+            for stairs in (neighbor.stairs_up, neighbor.stairs_down):
+                if stairs is not None and stairs.dest_tile is not None and stairs.dest_tile.floor is floor:
+                    stairs.dest_tile = None
+
+    def rehydrate(self, index: int) -> Floor:
+        """
+        Unpacks an evicted floor and links its stairs to the floors around it that are in memory
+        """
+        packed = self.__packed.pop(index)
+        floor = Floor(self._origin, self._floor_size, self.rng.floor(index), generate=False,
+                      layout=self.layout(index))
+        packed.restore_terrain(floor)
+        self.__floors[index] = floor
+        packed.restore_entities(floor, self)
+        # Carry the versions on, so that what was derived from the floor before it was packed is still valid
+        floor.changes = ChangeLog(*packed.versions)
+
+        below = self.__floors.get(index - 1)
+        if below is not None and below.stairs_up is not None and floor.stairs_down is not None:
+            below.stairs_up.set_destination(floor.stairs_down, index - 1, index, link=True)
+        above = self.__floors.get(index + 1)
+        if above is not None and above.stairs_down is not None and floor.stairs_up is not None:
+            floor.stairs_up.set_destination(above.stairs_down, index, index + 1, link=True)
+        return floor
+
+    def stairs_destination(self, stairs: Stairs) -> int:
+        """
+        Returns the index of the floor the stairs on the current floor lead to
+        """
+        return self._current_floor + (1 if isinstance(stairs, StairsUp) else -1)
+
+    def follow_stairs(self, stairs: Stairs) -> Optional[Stairs]:
+        """
+        Returns the stairs that the stairs on the current floor lead to, unpacking their floor if need be
+        """
+        destination = self.stairs_destination(stairs)
+        if 0 <= destination < self.FLOORS:
+            self.get_floor(destination)
+        return stairs.interact()
+
+    def update(self):
+        """
+        Called after every turn. Evicts the floors the player left EVICT_AFTER turns ago, and unpacks the floor
+        the stairs the player stands on lead to ahead of them being taken.
+        """
+        if self.EVICT_AFTER <= 0:
+            return
+        prefetch = None
+        if self.player is not None:
+            tile = self.floor.cell(self.player.position)
+            if isinstance(tile, Stairs) and 0 <= self.stairs_destination(tile) < self.FLOORS:
+                prefetch = self.stairs_destination(tile)
+        for index in list(self.__floors):
+            if index in (self._current_floor, prefetch):
+                continue
+            if self.time.time - self._left.get(index, 0) >= self.EVICT_AFTER:
+                self.evict(index)
+        if prefetch is not None:
+            self.get_floor(prefetch)
 
     def get_allows_light(self, point):
-        try:
-            return not self.floor.cell(point).block_sight
-        except CellOutOfBoundsError:
-            return False
+        return self.floor.allows_light(point)
 
     @property
     def floor(self):
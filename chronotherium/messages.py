@@ -0,0 +1,148 @@
+from array import array
+from collections import deque
+from struct import Struct
+from typing import List, Optional
+import sys
+
+
+class MessageLog:
+
+    # Number of messages kept in memory for display
+    CAPACITY = 64
+    # File every message is appended to, None to keep no history
+    HISTORY_PATH = None
+    # Offset of a message in the history file, as stored in the index next to it
+    OFFSET = Struct('<Q')
+
+    def __init__(self, width: int, capacity: int = CAPACITY):
+        """
+        The messages shown at the top of the screen. Only the last capacity messages are kept in memory, and a
+        message repeating the one before it is coalesced into it as "message x2", "message x3" and so on.
+        Messages are wrapped when they are displayed, so logging one is cheap.
+
+        The history of every message can be appended to a file with open. Where each message starts in the file
+        is appended to an index file next to it, path + '.idx', as fixed-width offsets, so old messages can be
+        read back by position without scanning the history or keeping their offsets in memory.
+
+        :param width: Width in cells of the log. Text is printed at half a cell per character
+
+        :param capacity: Number of messages kept in memory
+        """
+        self.cutoff = width * 2
+        # Each entry is [message, repeats, wrapped lines or None]
+        self.entries = deque(maxlen=capacity)
+        # Every message logged, repeats included
+        self.count = 0
+
+        self.path = None
+        # Messages written to the history since it was opened, and the number already in its index before that
+        self.written = 0
+        self._base = 0
+        self._file = None
+        self._index = None
+        self._pending = None
+
+    def add(self, msg: str):
+        self.count += 1
+        if self.entries and self.entries[-1][0] == msg:
+            entry = self.entries[-1]
+            entry[1] += 1
+            entry[2] = None
+            if self._file is not None and self._pending is None:
+                # The message before the history was opened repeated
+                self._pending = entry
+            return
+        self._write()
+        entry = [msg, 1, None]
+        self.entries.append(entry)
+        if self._file is not None:
+            self._pending = entry
+
+    def wrap(self, msg: str) -> List[str]:
+        lines = []
+        while len(msg) > self.cutoff:
+            if ' ' in msg[:self.cutoff]:
+                sub_msg, trailing = msg[:self.cutoff].rsplit(' ', 1)
+            else:
+                sub_msg, trailing = msg[:self.cutoff], ''
+            lines.append(sub_msg)
+            msg = trailing + msg[self.cutoff:]
+        lines.append(msg)
+        return lines
+
+    @staticmethod
+    def text(entry: list) -> str:
+        msg, repeats, _ = entry
+        return f'{msg} x{repeats}' if repeats > 1 else msg
+
+    def tail(self, count: int) -> List[str]:
+        """
+        Returns the last count lines of the log, wrapped
+        """
+        lines = []
+        for entry in reversed(self.entries):
+            if entry[2] is None:
+                entry[2] = self.wrap(self.text(entry))
+            lines[:0] = entry[2]
+            if len(lines) >= count:
+                break
+        return lines[-count:] if count > 0 else []
+
+    def open(self, path: str):
+        """
+        Appends every message from now on to the history file at path
+        """
+        self.close()
+        self.path = path
+        self._file = open(path, 'ab')
+        self._index = open(self.index_path, 'ab')
+        self._base = self._index.tell() // self.OFFSET.size
+        self.written = 0
+
+    @property
+    def index_path(self) -> Optional[str]:
+        return self.path + '.idx' if self.path is not None else None
+
+    def _write(self):
+        """
+        Appends the newest message to the history once no more repeats can be coalesced into it
+        """
+        if self._file is None:
+            return
+        if self._pending is not None:
+            self._index.write(self.OFFSET.pack(self._file.tell()))
+            self._file.write(self.text(self._pending).replace('\n', ' ').encode('utf-8') + b'\n')
+            self._file.flush()
+            self._index.flush()
+            self.written += 1
+        self._pending = None
+
+    def close(self):
+        if self._file is not None:
+            self._write()
+            self._file.close()
+            self._index.close()
+            self._file = None
+            self._index = None
+
+    def history(self, start: int = 0, stop: Optional[int] = None) -> List[str]:
+        """
+        Reads the messages with indices start to stop written to the history file since it was opened
+        """
+        if self.path is None:
+            return []
+        indices = range(0, self.written)[start:stop]
+        if not indices:
+            return []
+        offsets = array('Q')
+        with open(self.index_path, 'rb') as index:
+            index.seek((self._base + indices.start) * self.OFFSET.size)
+            offsets.frombytes(index.read(len(indices) * self.OFFSET.size))
+        if sys.byteorder != 'little':
+            offsets.byteswap()
+        messages = []
+        with open(self.path, 'rb') as file:
+            for offset in offsets:
+                file.seek(offset)
+                messages.append(file.readline().rstrip(b'\n').decode('utf-8'))
+        return messages
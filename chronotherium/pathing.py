@@ -0,0 +1,86 @@
+from collections import deque
+from typing import TYPE_CHECKING, Iterable, Optional
+
+from clubsandwich.geom import Point
+
+if TYPE_CHECKING:
+    from chronotherium.map import Floor
+
+
+NEIGHBORS = [Point(0, -1), Point(1, 0), Point(0, 1), Point(-1, 0),
+             Point(1, -1), Point(1, 1), Point(-1, 1), Point(-1, -1)]
+
+
+class DistanceMap:
+
+    UNREACHABLE = -1
+
+    def __init__(self, floor: 'Floor', goals: Iterable[Point], stamp=None):
+        """
+        Breadth-first distance field over the walkable cells of a floor, measured in moves from the
+        nearest goal. Following it downhill from any point walks the shortest path to a goal.
+
+        :param floor: Floor to compute distances over
+
+        :param goals: Points the distances are measured from
+
+        :param stamp: Arbitrary value describing the state the map was computed from, used to decide
+        whether a cached map is still valid
+        """
+        self.floor = floor
+        self.stamp = stamp
+        self.width = floor.size.width
+        self.height = floor.size.height
+        self.distances = [self.UNREACHABLE] * (self.width * self.height)
+        self.compute(goals)
+
+    def compute(self, goals: Iterable[Point]):
+        width = self.width
+        height = self.height
+        distances = self.distances
+        # Eight cells per byte, read a bit at a time rather than making a tile per cell
+        walkable = self.floor.walkable.to_bytes()
+        deltas = [(delta.x, delta.y, delta.y * width + delta.x) for delta in NEIGHBORS]
+        queue = deque()
+        for goal in goals:
+            index = goal.y * width + goal.x
+            if distances[index] == self.UNREACHABLE:
+                distances[index] = 0
+                queue.append(index)
+
+        # Cells are queued as indices, so no Point is made per cell visited
+        while queue:
+            index = queue.popleft()
+            y, x = divmod(index, width)
+            distance = distances[index] + 1
+            for dx, dy, offset in deltas:
+                if not (0 <= x + dx < width and 0 <= y + dy < height):
+                    continue
+                neighbor = index + offset
+                if distances[neighbor] != self.UNREACHABLE:
+                    continue
+                if not walkable[neighbor >> 3] >> (neighbor & 7) & 1:
+                    continue
+                distances[neighbor] = distance
+                queue.append(neighbor)
+
+    def distance(self, point: Point) -> int:
+        if not self.floor.contains_point(point):
+            return self.UNREACHABLE
+        return self.distances[point.y * self.width + point.x]
+
+    def step_from(self, point: Point) -> Optional[Point]:
+        """
+        Returns the neighbor of point that is closest to a goal, or None if point is a goal or cannot
+        reach one.
+        """
+        best = self.distance(point)
+        if best <= 0:
+            return None
+        step = None
+        for delta in NEIGHBORS:
+            distance = self.distance(point + delta)
+            if distance != self.UNREACHABLE and distance < best:
+                best = distance
+                step = point + delta
+        return step
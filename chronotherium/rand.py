@@ -1,9 +1,142 @@
-from random import randrange
+from typing import Dict, Iterable, List, Sequence, Tuple, TypeVar
+import zlib
 
+T = TypeVar('T')
 
-def d6(limit=2, over=True):
-    roll = randrange(1, 7)
-    if over:
-        return roll > limit
-    else:
-        return roll < limit
+
+class Stream:
+
+    # Number of rolls generated at once
+    BLOCK = 1024
+
+    def __init__(self, seed: int, name: str, drawn: int = 0):
+        """
+        An independently seeded source of random numbers. Rolls are taken from blocks of uniform floats
+        that NumPy generates BLOCK at a time, so a roll is a list lookup rather than a call into the
+        random module.
+
+        :param seed: Seed of the game
+
+        :param name: Name of the stream. Streams with different names never share rolls
+
+        :param drawn: Number of rolls already taken, to resume a stream from a save
+        """
+        self.seed = seed
+        self.name = name
+        self._generator = None
+        self._block: List[float] = []
+        self._index = 0
+        self._start = drawn
+
+    @property
+    def drawn(self) -> int:
+        """
+        Number of rolls taken from the stream so far
+        """
+        return self._start + self._index
+
+    def _refill(self):
+        import numpy as np
+
+        if self._generator is None:
+            sequence = np.random.SeedSequence(self.seed, spawn_key=(zlib.crc32(self.name.encode()),))
+            bit_generator = np.random.PCG64(sequence)
+            # Each float takes one step of the generator, so a resumed stream can skip the blocks it used up
+            skipped = self._start - self._start % self.BLOCK
+            bit_generator.advance(skipped)
+            self._generator = np.random.Generator(bit_generator)
+            self._block = self._generator.random(self.BLOCK).tolist()
+            self._index = self._start - skipped
+            self._start = skipped
+        else:
+            self._start += len(self._block)
+            self._block = self._generator.random(self.BLOCK).tolist()
+            self._index = 0
+
+    def random(self) -> float:
+        """
+        Returns a float in [0, 1)
+        """
+        if self._index >= len(self._block):
+            self._refill()
+        roll = self._block[self._index]
+        self._index += 1
+        return roll
+
+    def randrange(self, start: int, stop: int) -> int:
+        return start + int(self.random() * (stop - start))
+
+    def randint(self, low: int, high: int) -> int:
+        return self.randrange(low, high + 1)
+
+    def choice(self, sequence: Sequence[T]) -> T:
+        return sequence[self.randrange(0, len(sequence))]
+
+    def d6(self, limit: int = 2, over: bool = True) -> bool:
+        roll = self.randrange(1, 7)
+        if over:
+            return roll > limit
+        else:
+            return roll < limit
+
+
+class RNG:
+
+    COMBAT = 'combat'
+    WANDER = 'wander'
+    LOOT = 'loot'
+    SKILLS = 'skills'
+
+    def __init__(self, seed: int):
+        """
+        The named random streams of one game. Each subsystem rolls on its own stream and each floor is
+        generated from its own, so a change to how often one of them rolls leaves every other outcome of
+        a seed, and every recorded journal, as it was.
+
+        :param seed: Seed of the game
+        """
+        self.seed = seed
+        self._streams: Dict[str, Stream] = {}
+
+    def stream(self, name: str) -> Stream:
+        stream = self._streams.get(name)
+        if stream is None:
+            stream = Stream(self.seed, name)
+            self._streams[name] = stream
+        return stream
+
+    def floor(self, index: int) -> Stream:
+        """
+        Returns the stream floor index is generated from
+        """
+        return self.stream(f'floor{index}')
+
+    @property
+    def combat(self) -> Stream:
+        return self.stream(self.COMBAT)
+
+    @property
+    def wander(self) -> Stream:
+        return self.stream(self.WANDER)
+
+    @property
+    def loot(self) -> Stream:
+        return self.stream(self.LOOT)
+
+    @property
+    def skills(self) -> Stream:
+        return self.stream(self.SKILLS)
+
+    def state(self) -> List[Tuple[str, int]]:
+        """
+        Returns the name of every stream used so far and the number of rolls taken from it
+        """
+        return [(name, stream.drawn) for name, stream in self._streams.items()]
+
+    def set_state(self, state: Iterable[Tuple[str, int]]):
+        """
+        Resumes the streams from a state returned by state. Streams not in it start from the beginning.
+        """
+        self._streams = {}
+        for name, drawn in state:
+            self._streams[name] = Stream(self.seed, name, drawn)
@@ -0,0 +1,48 @@
+from typing import Optional
+
+from chronotherium.entities.entity import ActorState
+from chronotherium.journal import Journal, JournalSource, JournalExhausted
+from chronotherium.scene import GameScene
+
+
+class HeadlessDirector:
+    """
+    Stands in for the DirectorLoop while a game runs without a terminal.
+    """
+
+    def __init__(self):
+        self.should_exit = False
+
+    def quit(self):
+        self.should_exit = True
+
+
+def replay(journal: Journal, until: Optional[int] = None) -> GameScene:
+    """
+    Re-runs a recorded game as fast as possible with drawing disabled.
+
+    :param journal: Journal of the game to replay
+
+    :param until: Stop once the game clock reaches this tick
+
+    :return: The game scene in the state the replay stopped in
+
+    :raises JournalDiverged: At the first turn whose state hash differs from the one the journal recorded
+    """
+    keys = JournalSource(journal)
+    scene = GameScene(seed=journal.seed, keys=keys, headless=True)
+    # Scenes only hold a weak reference to their director
+    director = HeadlessDirector()
+    scene.director = director
+
+    while not director.should_exit and scene.player.state == ActorState.ALIVE:
+        if until is not None and scene.time.time >= until:
+            break
+        key = keys.next_key()
+        if key is None:
+            break
+        try:
+            scene.terminal_read(key)
+        except JournalExhausted:
+            break
+    return scene
@@ -0,0 +1,495 @@
+from array import array
+from functools import lru_cache
+from struct import Struct
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+import os
+import sys
+import zlib
+
+from clubsandwich.geom import Point, Size
+
+from chronotherium.bitmap import Bitmap
+from chronotherium.entities.chronotherium import Chronotherium
+from chronotherium.entities.entity import Actor, Enemy, EnemyMode
+from chronotherium.entities.golem import Golem
+from chronotherium.entities.items import HealthPotion, TimePotion, Hourglass
+from chronotherium.entities.knight import Knight
+from chronotherium.entities.player import Player, Freeze, Teleport, Rewind, Push, Diagonal
+from chronotherium.entities.sentry import Sentry
+from chronotherium.map import Floor, Map
+from chronotherium.rand import RNG
+from chronotherium.statehash import cells_key, door_key, entity_key
+from chronotherium.tiles.tile import Terrain, Empty, Door, StairsUp, StairsDown, KINDS, KIND_CODES
+from chronotherium.time import Time
+
+if TYPE_CHECKING:
+    import numpy as np
+
+    from chronotherium.scene import GameScene
+
+
+SAVE_PATH = 'chronotherium.sav'
+
+# Entity and skill classes are stored as their index in these lists, so only ever append to them
+ENTITY_KINDS = [Player, Golem, Sentry, Knight, Chronotherium, HealthPotion, TimePotion, Hourglass]
+SKILLS = [Freeze, Teleport, Rewind, Push, Diagonal]
+ENEMY_MODES = [EnemyMode.WANDER, EnemyMode.ATTACK, EnemyMode.STUNNED]
+
+NO_POINT = -1
+# Kind code of glyphs that are no kind of tile
+UNKNOWN = 0xFF
+
+
+class SaveError(Exception):
+    pass
+
+
+@lru_cache(maxsize=None)
+def glyph_codes() -> 'np.ndarray':
+    """
+    Returns the kind code of every 16 bit glyph, UNKNOWN where a glyph is no kind of tile. Open doors have the
+    code of doors, as whether a door is open is kept by the floor.
+    """
+    import numpy as np
+
+    codes = np.full(0x10000, UNKNOWN, dtype=np.uint8)
+    for code, (_, terrain) in enumerate(KINDS):
+        codes[terrain.value] = code
+    codes[Terrain.DOOR_OPEN.value] = KIND_CODES[Door, Door.TERRAIN]
+    return codes
+
+
+class SavedGame:
+    """
+    A game read back from a save file.
+
+    A save file is laid out as follows, all little-endian:
+
+    - HEADER, giving the sizes of the sections that follow, the offset of the terrain and the serial of the next
+      entity to be made
+    - one STREAM record per random stream, giving the number of rolls taken from it and the length of its name,
+      followed by its name in ASCII
+    - the stairs of every floor as (up x, up y, down x, down y), NO_POINT where a floor has none
+    - the seen bitmap of every floor
+    - one ENTITY record per entity, the player first, then every floor's entities in order
+    - the player's level and the indices of its skills in the order they were learned
+    - one HISTORY record per state the player remembers, for rewinding
+    - the journal of keys played so far
+    - the terrain of every floor as (floors, height, width) 16 bit glyphs
+
+    Doors are stored as their open or closed glyph, so the terrain also carries their state.
+    """
+
+    MAGIC = b'CHRS'
+    VERSION = 4
+    HEADER = Struct('<4sHQIBBHHIIIBBII')
+    STREAM = Struct('<QB')
+    STAIRS = Struct('<hhhh')
+    ENTITY = Struct('<BBhhhhhhhhBhI')
+    PLAYER = Struct('<BB')
+    HISTORY = Struct('<ihhhh')
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as file:
+            header = file.read(self.HEADER.size)
+            if len(header) < self.HEADER.size:
+                raise SaveError("Save file is truncated.")
+            (magic, version, self.seed, self.tick, self.floor_count, self.current_floor, self.width, self.height,
+             entity_count, history_count, key_count, skill_count, stream_count, terrain_offset,
+             self.serials) = self.HEADER.unpack(header)
+            if magic != self.MAGIC:
+                raise SaveError("Not a Chronotherium save file.")
+            if version != self.VERSION:
+                raise SaveError(f"Unsupported save version {version}.")
+            data = file.read(terrain_offset - self.HEADER.size)
+            terrain_size = self.floor_count * self.height * self.width * 2
+            terrain = file.read(terrain_size)
+        if len(data) < terrain_offset - self.HEADER.size or len(terrain) < terrain_size:
+            raise SaveError("Save file is truncated.")
+
+        offset = 0
+        self.streams = []
+        for i in range(0, stream_count):
+            drawn, length = self.STREAM.unpack_from(data, offset)
+            offset += self.STREAM.size
+            self.streams.append((data[offset:offset + length].decode('ascii'), drawn))
+            offset += length
+
+        self.stairs = []
+        for i in range(0, self.floor_count):
+            self.stairs.append(self.STAIRS.unpack_from(data, offset))
+            offset += self.STAIRS.size
+
+        bitmap_size = (self.width * self.height + 7) // 8
+        self.seen = []
+        for i in range(0, self.floor_count):
+            self.seen.append(int.from_bytes(data[offset:offset + bitmap_size], 'little'))
+            offset += bitmap_size
+
+        self.entities = []
+        for i in range(0, entity_count):
+            self.entities.append(self.ENTITY.unpack_from(data, offset))
+            offset += self.ENTITY.size
+
+        self.level, learned = self.PLAYER.unpack_from(data, offset)
+        offset += self.PLAYER.size
+        self.skills = [SKILLS[index] for index in data[offset:offset + learned]]
+        offset += skill_count
+
+        self.history = []
+        for i in range(0, history_count):
+            self.history.append(self.HISTORY.unpack_from(data, offset))
+            offset += self.HISTORY.size
+
+        self.keys = array('H')
+        self.keys.frombytes(data[offset:offset + key_count * 2])
+        if sys.byteorder != 'little':
+            self.keys.byteswap()
+
+        import numpy as np
+
+        self.terrain = np.frombuffer(terrain, dtype='<u2').reshape(self.floor_count, self.height, self.width)
+
+    def restore_map(self, scene: 'GameScene', time: Time, rng: RNG) -> Map:
+        """
+        Builds the map as it was saved. The floor the player is on is restored with everything on it, and the
+        others are handed to the map packed, to be restored when they are needed. The random streams are resumed
+        where they were left off.
+        """
+        import numpy as np
+
+        rng.set_state(self.streams)
+        if Map.FLOORS != self.floor_count:
+            raise SaveError("Save file was made with a different number of floors.")
+        game_map = Map(scene, time, rng, generate=False, floor_size=Size(self.width, self.height))
+
+        records = [[] for _ in range(0, self.floor_count)]
+        player = None
+        for record in self.entities:
+            if ENTITY_KINDS[record[0]] is Player:
+                player = record
+            else:
+                records[record[1]].append(record)
+        if player is None:
+            raise SaveError("Save file has no player.")
+
+        bitmap_size = (self.width * self.height + 7) // 8
+        for index, (up_x, up_y, down_x, down_y) in enumerate(self.stairs):
+            terrain = self.terrain[index]
+            unknown = np.argwhere(glyph_codes()[terrain] == UNKNOWN)
+            if len(unknown):
+                y, x = unknown[0]
+                raise SaveError(f"Unknown terrain {int(terrain[y, x]):#x} at {Point(int(x), int(y))}.")
+            for x, y, glyph in ((up_x, up_y, Terrain.STAIRS_UP), (down_x, down_y, Terrain.STAIRS_DOWN)):
+                if x != NO_POINT and terrain[y, x] != glyph.value:
+                    raise SaveError(f"Floor {index} has no stairs at {Point(x, y)}.")
+            game_map.store(index, PackedFloor(self.STAIRS.pack(up_x, up_y, down_x, down_y),
+                                              self.seen[index].to_bytes(bitmap_size, 'little'),
+                                              b''.join(self.ENTITY.pack(*record) for record in records[index]),
+                                              PackedFloor.compress(terrain.tobytes())))
+        if Map.EVICT_AFTER <= 0:
+            for index in range(0, self.floor_count):
+                game_map.get_floor(index)
+
+        game_map.move_floors(game_map.get_floor(self.current_floor))
+        game_map.player = self.restore_player(player, game_map, scene)
+        game_map.serials = self.serials
+        return game_map
+
+    @staticmethod
+    def restore_terrain(floor, terrain: 'np.ndarray'):
+        """
+        Writes the glyphs of a floor onto it in one blit. Stairs are set afterwards, as blit can't write them.
+        """
+        import numpy as np
+
+        codes = glyph_codes()[terrain]
+        unknown = np.argwhere(codes == UNKNOWN)
+        if len(unknown):
+            y, x = unknown[0]
+            raise SaveError(f"Unknown terrain {int(terrain[y, x]):#x} at {Point(int(x), int(y))}.")
+        stairs = (terrain == Terrain.STAIRS_UP.value) | (terrain == Terrain.STAIRS_DOWN.value)
+        codes[stairs] = KIND_CODES[Empty, Terrain.EMPTY]
+        floor.blit(Point(0, 0), floor.size.width, codes.tobytes())
+        for y, x in np.argwhere(stairs).tolist():
+            point = Point(x, y)
+            floor.set_cell(StairsUp(point) if terrain[y, x] == Terrain.STAIRS_UP.value else StairsDown(point))
+        for y, x in np.argwhere(terrain == Terrain.DOOR_OPEN.value).tolist():
+            floor.set_door_open(Point(x, y), True)
+
+    def restore_player(self, record: Tuple, game_map: Map, scene: 'GameScene') -> Player:
+        player = restore_entity(record, game_map.get_floor(record[1]), game_map, scene)
+        player._heal_clock = record[11]
+        player._level = self.level
+        player._skills = list(self.skills)
+        for tick, hp, tp, x, y in self.history:
+            state = Actor.State(player)
+            state.hp = hp
+            state.tp = tp
+            state.pos = Point(x, y)
+            player.states[tick] = state
+        return player
+
+
+def restore_entity(record: Tuple, floor: Floor, game_map: Map, scene: 'GameScene'):
+    kind, _, x, y, hp, max_hp, tp, max_tp, xp, frozen, mode, clock, serial = record
+    # The entity keeps the serial it was saved with, so making it takes none from the map
+    serials = game_map.serials
+    entity = ENTITY_KINDS[kind](floor.cell(Point(x, y)), game_map, scene)
+    game_map.serials = serials
+    entity.serial = serial
+    if not isinstance(entity, Actor):
+        entity.rehash()
+        return entity
+
+    entity._hp = hp
+    entity._max_hp = max_hp
+    entity._tp = tp
+    entity._max_tp = max_tp
+    entity._xp = xp
+    entity.frozen = frozen
+    if isinstance(entity, Enemy):
+        entity.mode = ENEMY_MODES[mode]
+    if isinstance(entity, Golem):
+        entity._tp_drain_clock = clock
+    entity.rehash()
+    return entity
+
+
+class PackedFloor:
+
+    def __init__(self, stairs: bytes, seen: bytes, entities: bytes, terrain: bytes, open_count: Optional[int] = None,
+                 generate_time: float = 0.0, versions: Tuple[int, int, int, int] = (0, 0, 0, 0),
+                 state_hash: Optional[int] = None):
+        """
+        A floor evicted from memory, held as the sections a save file stores for it: its stairs, seen bitmap and
+        entity records packed as in a save, and its terrain as compressed 16 bit glyphs. Open doors are stored
+        as their glyph, so the terrain carries their state.
+
+        :param open_count: Floor.open_count of the floor
+
+        :param generate_time: Floor.generate_time of the floor
+
+        :param versions: State of the change log of the floor, see ChangeLog.state
+
+        :param state_hash: Floor.state_hash of the floor. Worked out from the sections the first time it is asked
+        for if not given, as for floors read from a save file.
+        """
+        self.stairs = stairs
+        self.seen = seen
+        self.entities = entities
+        self.terrain = terrain
+        self.open_count = open_count
+        self.generate_time = generate_time
+        self.versions = versions
+        self._state_hash = state_hash
+
+    @staticmethod
+    def compress(terrain: bytes) -> bytes:
+        return zlib.compress(terrain, 1)
+
+    @classmethod
+    def pack(cls, floor: Floor, index: int) -> 'PackedFloor':
+        up = floor.stairs_up.point if floor.stairs_up is not None else Point(NO_POINT, NO_POINT)
+        down = floor.stairs_down.point if floor.stairs_down is not None else Point(NO_POINT, NO_POINT)
+        return cls(SavedGame.STAIRS.pack(up.x, up.y, down.x, down.y), floor.seen.to_bytes(),
+                   b''.join(pack_entity(index, entity) for entity in floor.entities),
+                   cls.compress(floor.terrain_array().tobytes()), floor.open_count, floor.generate_time,
+                   floor.changes.state(), floor.state_hash)
+
+    @property
+    def entity_count(self) -> int:
+        return len(self.entities) // SavedGame.ENTITY.size
+
+    @property
+    def terrain_version(self) -> int:
+        return self.versions[1]
+
+    @property
+    def state_hash(self) -> int:
+        if self._state_hash is None:
+            self._state_hash = self.hash_sections()
+        return self._state_hash
+
+    def terrain_bytes(self) -> bytes:
+        return zlib.decompress(self.terrain)
+
+    def hash_sections(self) -> int:
+        """
+        Returns the state hash the floor would have once unpacked, from its terrain and entity records
+        """
+        import numpy as np
+
+        terrain = np.frombuffer(self.terrain_bytes(), dtype='<u2')
+        value = cells_key(np.arange(0, len(terrain)), glyph_codes()[terrain])
+        for index in np.flatnonzero(terrain == Terrain.DOOR_OPEN.value).tolist():
+            value ^= door_key(index)
+        for kind, _, x, y, hp, _, tp, *_, serial in SavedGame.ENTITY.iter_unpack(self.entities):
+            value ^= entity_key(ENTITY_KINDS[kind], x, y, hp, tp, serial)
+        return value
+
+    def restore_terrain(self, floor: Floor):
+        """
+        Restores the terrain, doors, stairs and seen bitmap of the floor. Its stairs are left unlinked.
+        """
+        import numpy as np
+
+        terrain = np.frombuffer(self.terrain_bytes(), dtype='<u2').reshape(floor.size.height, floor.size.width)
+        SavedGame.restore_terrain(floor, terrain)
+        floor.seen = Bitmap(floor.size, int.from_bytes(self.seen, 'little'))
+        up_x, up_y, down_x, down_y = SavedGame.STAIRS.unpack(self.stairs)
+        if up_x != NO_POINT:
+            floor.stairs_up = floor.cell(Point(up_x, up_y))
+        if down_x != NO_POINT:
+            floor.stairs_down = floor.cell(Point(down_x, down_y))
+        floor.open_count = self.open_count
+        floor.generate_time = self.generate_time
+
+    def restore_entities(self, floor: Floor, game_map: Map):
+        for record in SavedGame.ENTITY.iter_unpack(self.entities):
+            restore_entity(record, floor, game_map, game_map.scene)
+
+
+class Snapshot:
+
+    def __init__(self, header: bytes, body: bytes, terrain: List[bytes]):
+        """
+        A save file captured in memory as immutable bytes, so that it can be written out later or on another
+        thread while the game carries on.
+
+        :param header: Packed header
+
+        :param body: Every section between the header and the terrain
+
+        :param terrain: Packed terrain of each floor
+        """
+        self.header = header
+        self.body = body
+        self.terrain = terrain
+
+    def write(self, path: str = SAVE_PATH, sync: bool = False):
+        """
+        Writes the save next to path and then moves it over path, so an interrupted save never leaves a broken
+        file behind.
+
+        :param sync: Flush the file to disk before moving it into place
+        """
+        temp_path = path + '.tmp'
+        with open(temp_path, 'wb') as file:
+            file.write(self.header)
+            file.write(self.body)
+            for terrain in self.terrain:
+                file.write(terrain)
+            if sync:
+                file.flush()
+                os.fsync(file.fileno())
+        os.replace(temp_path, path)
+
+
+def snapshot(scene: 'GameScene', terrain: Optional[Dict[int, bytes]] = None) -> Snapshot:
+    """
+    Captures everything a save file holds about the game the scene is playing.
+
+    :param terrain: Packed terrain of floors known not to have changed since it was captured, by floor index.
+    Floors missing from it are packed again.
+    """
+    game_map = scene.map
+    player = scene.player
+    # Floors that were evicted are copied from their packed form rather than unpacked
+    floors = [game_map.resident(index) or game_map.packed(index) for index in range(0, game_map.FLOORS)]
+    size = game_map.floor_size
+    terrain = terrain if terrain is not None else {}
+
+    streams = game_map.rng.state()
+    body = []
+    for name, drawn in streams:
+        try:
+            encoded = name.encode('ascii')
+        except UnicodeEncodeError:
+            raise SaveError(f"Random stream name {name!r} is not ASCII.") from None
+        if len(encoded) > 0xFF:
+            raise SaveError(f"Random stream name {name!r} is longer than 255 bytes.")
+        body.append(SavedGame.STREAM.pack(drawn, len(encoded)))
+        body.append(encoded)
+
+    for floor in floors:
+        if isinstance(floor, PackedFloor):
+            body.append(floor.stairs)
+            continue
+        up = floor.stairs_up.point if floor.stairs_up is not None else Point(NO_POINT, NO_POINT)
+        down = floor.stairs_down.point if floor.stairs_down is not None else Point(NO_POINT, NO_POINT)
+        body.append(SavedGame.STAIRS.pack(up.x, up.y, down.x, down.y))
+
+    for floor in floors:
+        body.append(floor.seen if isinstance(floor, PackedFloor) else floor.seen.to_bytes())
+
+    entity_count = 1
+    body.append(pack_entity(game_map.current_floor, player))
+    for index, floor in enumerate(floors):
+        if isinstance(floor, PackedFloor):
+            body.append(floor.entities)
+            entity_count += floor.entity_count
+            continue
+        for entity in floor.entities:
+            if entity is not player:
+                body.append(pack_entity(index, entity))
+                entity_count += 1
+
+    body.append(SavedGame.PLAYER.pack(player.level, len(player.skills)))
+    body.append(bytes(SKILLS.index(skill) for skill in player.skills))
+
+    history = sorted(player.states.items())
+    for tick, state in history:
+        body.append(SavedGame.HISTORY.pack(tick, state.hp, state.tp, state.pos.x, state.pos.y))
+
+    keys = array('H', scene.keys.journal.keys)
+    if sys.byteorder != 'little':
+        keys.byteswap()
+    body.append(keys.tobytes())
+
+    body = b''.join(body)
+    terrain_offset = SavedGame.HEADER.size + len(body)
+
+    header = SavedGame.HEADER.pack(SavedGame.MAGIC, SavedGame.VERSION, scene.seed, scene.time.time, len(floors),
+                                   game_map.current_floor, size.width, size.height, entity_count, len(history),
+                                   len(keys), len(player.skills), len(streams), terrain_offset, game_map.serials)
+
+    packed = []
+    for index, floor in enumerate(floors):
+        if index not in terrain:
+            terrain[index] = floor.terrain_bytes() if isinstance(floor, PackedFloor) else floor.terrain_array().tobytes()
+        packed.append(terrain[index])
+
+    return Snapshot(header, body, packed)
+
+
+def write_save(scene: 'GameScene', path: str = SAVE_PATH):
+    """
+    Saves the game the scene is playing
+    """
+    snapshot(scene).write(path, sync=True)
+
+
+def pack_entity(floor_index: int, entity) -> bytes:
+    kind = ENTITY_KINDS.index(type(entity))
+    if not isinstance(entity, Actor):
+        return SavedGame.ENTITY.pack(kind, floor_index, entity.position.x, entity.position.y, 0, 0, 0, 0, 0, 0, 0, 0,
+                                     entity.serial)
+
+    mode = ENEMY_MODES.index(entity.mode) if isinstance(entity, Enemy) else 0
+    if isinstance(entity, Golem):
+        clock = entity._tp_drain_clock
+    elif isinstance(entity, Player):
+        clock = entity._heal_clock
+    else:
+        clock = 0
+    return SavedGame.ENTITY.pack(kind, floor_index, entity.position.x, entity.position.y, entity.hp, entity._max_hp,
+                                 entity.tp, entity._max_tp, entity.xp, entity.frozen, mode, clock, entity.serial)
+
+
+def remove_save(path: str = SAVE_PATH):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -1,4 +1,6 @@
 from typing import List, Optional
+from logging import getLogger
+import os
 
 from bearlibterminal import terminal as bearlib
 
@@ -6,18 +8,29 @@ from clubsandwich.geom import Rect, Point, Size
 from clubsandwich.blt.context import BearLibTerminalContext as Context
 from clubsandwich.director import Scene
 
-from chronotherium.window import Window, Color, LOG_HEIGHT, MAP_SIZE, MAP_ORIGIN
+from chronotherium.window import Window, Color, LOG_HEIGHT, MAP_SIZE, MAP_ORIGIN, REMEMBERED_COLOR
 from chronotherium.map import Map
+from chronotherium.bitmap import Bitmap
 from chronotherium.entities.entity import Actor, ActorState, EntityType
 from chronotherium.input import Input
 from chronotherium.time import Time
+from chronotherium.rand import RNG
+from chronotherium.journal import Journal, KeySource, KeyboardSource
+from chronotherium.save import SavedGame, SaveError, SAVE_PATH, write_save, remove_save
+from chronotherium.autosave import Autosave
+from chronotherium.timing import PhaseTimer
+from chronotherium.draw import DrawBuffer
+from chronotherium.text import TextCache
+from chronotherium.messages import MessageLog
+
+logger = getLogger()
 
 
 class PrintScene(Scene):
 
     def __init__(self):
         self.window = Window()
-        self.message_log = []
+        self.message_log = MessageLog(self.window.width - 3)
         self.gutter = []
         self.gutter_size = Size(self.window.width - MAP_SIZE.width + MAP_ORIGIN.x,
                                 self.window.height - MAP_ORIGIN.y)
@@ -25,33 +38,20 @@ class PrintScene(Scene):
                                       self.window.height - self.gutter_size.height),
                                 self.gutter_size)
         self.log_height = LOG_HEIGHT
+        self.text = TextCache(self.window)
         super().__init__()
 
     def pprint(self, x: int, y: int, string: str):
         """
-        Pretty prints a string starting at (x,y).
+        Pretty prints a string starting at (x,y) in the current colour. Nothing is drawn if the same string is
+        already there in the same colour.
         :param x: x coordinate
 
         :param y: y coordinate
 
         :param string: String to print to screen
         """
-        bearlib.layer(1)
-        bearlib.composition(bearlib.TK_ON)
-        pos = x
-        cell_size, _ = self.window.cell_size.split('x')
-        cell_width = int(cell_size)
-        for c in string:
-            if pos >= self.window.width - x - 1:
-                pos = pos + 1
-                offset = (pos - x) * (cell_width / 2)
-                bearlib.put_ext(x, y, int(offset), 0, c)
-            else:
-                pos = pos + 1
-                offset = 0 - pos * (cell_width / 2)
-                bearlib.put_ext(pos, y, int(offset), 0, c)
-        bearlib.layer(0)
-        bearlib.composition(bearlib.TK_OFF)
+        self.text.draw(x, y, string, bearlib.state(bearlib.TK_COLOR))
 
     def pprint_center(self, text: List[str]):
         """
@@ -61,11 +61,11 @@ class PrintScene(Scene):
         """
         height = self.window.height
         width = self.window.width
-        cellsize, _ = self.window.cell_size.split('x')
-        cell_width = int(cellsize)
+        cell_width = self.window.cell_width
         center = int(width / 2)
 
         bearlib.clear()
+        self.text.invalidate()
         bearlib.layer(1)
         bearlib.composition("TK_ON")
         y = int(height / 2 - len(text) / 2)
@@ -83,15 +83,10 @@ class PrintScene(Scene):
         bearlib.refresh()
 
     def log(self, msg):
-        cutoff = self.window.width - 3
-        while len(msg) > cutoff * 2:
-            sub_msg, trailing = msg[:cutoff * 2].rsplit(' ', 1)
-            self.message_log.append(sub_msg)
-            msg = trailing + msg[cutoff * 2:]
-        self.message_log.append(msg)
+        self.message_log.add(msg)
 
     def print_log(self):
-        for i, msg in enumerate(self.message_log[-self.log_height:]):
+        for i, msg in enumerate(self.message_log.tail(self.log_height)):
             self.pprint(0, i, msg)
 
 
@@ -101,6 +96,7 @@ class StartScene(PrintScene):
 
         self.__input_map = {
             bearlib.TK_SPACE: self.next_scene,
+            bearlib.TK_C: self.continue_game,
             bearlib.TK_Q: self.quit,
             bearlib.TK_ESCAPE: self.quit
         }
@@ -108,7 +104,10 @@ class StartScene(PrintScene):
         super().__init__()
 
     def terminal_update(self, is_active: bool = False):
-        self.pprint_center(["Chronotherium", "A 2020 7DRL", "by wurthers", "", "Space - Start", "Esc, Q - Quit"])
+        options = ["Space - Start", "Esc, Q - Quit"]
+        if os.path.exists(SAVE_PATH):
+            options.insert(1, "C - Continue")
+        self.pprint_center(["Chronotherium", "A 2020 7DRL", "by wurthers", ""] + options)
 
     def terminal_read(self, val):
         try:
@@ -122,6 +121,16 @@ class StartScene(PrintScene):
     def next_scene(self):
         self.director.push_scene(FlavorScene())
 
+    def continue_game(self):
+        if not os.path.exists(SAVE_PATH):
+            return
+        try:
+            scene = GameScene(save=SavedGame(SAVE_PATH))
+        except SaveError as err:
+            logger.warning(f"Couldn't continue the saved game: {err}")
+            return
+        self.director.push_scene(scene)
+
 
 class FlavorScene(PrintScene):
 
@@ -161,12 +170,36 @@ class FlavorScene(PrintScene):
 
 class GameScene(PrintScene):
 
-    time = Time()
+    def __init__(self, seed: Optional[int] = None, keys: Optional[KeySource] = None, headless: bool = False,
+                 save: Optional[SavedGame] = None):
+        """
+        :param seed: Seed for the random streams, picked at random if not given
 
-    def __init__(self):
+        :param keys: Where keys come from. Defaults to the keyboard, recording every key to the journal file
+
+        :param headless: Skip all drawing, for replays and simulations
+
+        :param save: Saved game to continue instead of generating a new one
+        """
         super().__init__()
 
-        self.pprint_center(["Generating..."])
+        if save is not None:
+            seed = save.seed
+        self.seed = seed if seed is not None else int.from_bytes(os.urandom(4), 'little')
+        self.rng = RNG(self.seed)
+        if keys is None:
+            journal = Journal(self.seed)
+            if save is not None:
+                journal.keys.extend(save.keys)
+            keys = KeyboardSource(journal)
+            keys.journal.open()
+        self.keys = keys
+        self.headless = headless
+        self.time = Time(save.tick if save is not None else 0)
+        self.timer = PhaseTimer()
+
+        if not self.headless:
+            self.pprint_center(["Generating..."])
 
         self.__input_map = {
             bearlib.TK_Q: self.quit,
@@ -174,15 +207,21 @@ class GameScene(PrintScene):
         }
 
         self.context = Context()
-        try:
-            self.map = Map(self)
-        except Exception as err:
-            # This is here for debugging purposes
-            pass
+        self.draw_buffer = DrawBuffer(self.context)
+        # Created on the first frame drawn, so that headless games never import numpy
+        self.composer = None
+        if save is not None:
+            self.map = save.restore_map(self, self.time, self.rng)
+        else:
+            self.map = Map(self, self.time, self.rng)
 
         self.player = self.map.player
-        self.input = Input(self.player, self.context, self)
+        self.map.floor.explore(self.player.visible_bitmap)
+        self.input = Input(self.player, self.context, self, self.time)
         self.update_skills()
+        self.autosave = Autosave(self, self.timer, interval=0 if self.headless else None)
+        if MessageLog.HISTORY_PATH is not None and not self.headless:
+            self.message_log.open(MessageLog.HISTORY_PATH)
 
     @property
     def entities(self):
@@ -196,28 +235,75 @@ class GameScene(PrintScene):
     def bounds(self) -> Rect:
         return Rect(self.map.origin, self.map.view_size)
 
+    @property
+    def view(self) -> Rect:
+        """
+        Returns the part of the floor in view, in floor coordinates
+        """
+        return Rect(self.player.position - self.map.view_center, self.map.view_size)
+
     def quit(self):
+        # The key that opened this prompt is already in the journal
+        journal_length = len(self.keys.journal) - 1
         self.context.clear()
         self.pprint_center(["Are you sure you", "want to quit?", "", "Space - Yes ", "Esc - No"])
         self.context.refresh()
         while True:
-            key = bearlib.read()
+            key = self.keys.read()
             if key == bearlib.TK_SPACE:
+                self.autosave.close()
+                if not self.headless:
+                    self.save(journal_length)
                 self.director.quit()
                 break
             elif key == bearlib.TK_ESCAPE:
                 break
 
+    def save(self, journal_length: Optional[int] = None):
+        """
+        Saves the game so that it can be continued from the start screen.
+
+        :param journal_length: Only save this many keys of the journal, dropping the keys of the quit prompt so
+        that the saved journal still replays
+        """
+        if journal_length is not None:
+            del self.keys.journal.keys[journal_length:]
+        write_save(self, SAVE_PATH)
+
     def draw_tiles(self):
-        for cell in self.map.floor.cells:
-            if self.bounds.contains(cell.point + self.relative_pos):
-                if not cell.occupied and self.player.in_sight(cell):
-                    cell.draw_tile(self.context)
+        """
+        Draws the tiles in view, and the remembered tiles out of view dimmed, into the draw buffer.
+        """
+        floor = self.map.floor
+        visible = self.player.visible_bitmap
+        for point in (floor.seen & Bitmap.from_rect(floor.size, self.view)).points():
+            cell = floor.cell(point)
+            if point in visible:
+                if not cell.occupied:
+                    cell.draw_tile(self.draw_buffer)
+            else:
+                cell.draw_tile(self.draw_buffer, color=REMEMBERED_COLOR)
+
+    def clear_view(self):
+        """
+        Clears the map view on the layers tiles and entities are drawn on, leaving the text around it
+        """
+        view = self.bounds
+        for layer in range(0, Actor.LAYER + 1):
+            bearlib.layer(layer)
+            bearlib.clear_area(view.x, view.y, view.width, view.height)
+        bearlib.layer(0)
+
+    def enemies_in_view(self) -> bool:
+        for entity in self.entities:
+            if entity.type == EntityType.ENEMY and self.player.visible_to(entity):
+                return True
+        return False
 
     def draw_entities(self):
         for entity in self.entities:
             if self.player.visible_to(entity):
-                entity.draw(self.context)
+                entity.draw(self.draw_buffer)
 
     def print_stats(self, hp: int = None, tp: int = None, tick: int = None, left_arrow: bool = False,
                     right_arrow: bool = False):
@@ -263,38 +349,66 @@ class GameScene(PrintScene):
             self.pprint(self.gutter_rect.x, self.gutter_rect.y + i, string)
 
     def terminal_read(self, val) -> None:
+        self.keys.consume(val)
         if val in self.__input_map:
             self.__input_map[val]()
         with self.context.translate(self.relative_pos):
             if self.input.handle_key(val):
-                self.player.turn()
-                for entity in self.entities:
-                    if self.bounds.contains(entity.position + self.relative_pos):
-                        if entity.type == EntityType.ENEMY:
-                            entity.ai_behavior()
-                self.time.tick()
+                self.run_turn()
+        self.autosave.update()
+
+    def run_turn(self) -> None:
+        """
+        Resolves the player's pending action, lets the enemies in view act and advances the clock.
+        """
+        with self.timer.phase('player'):
+            self.player.turn()
+        with self.timer.phase('enemies'):
+            for entity in self.map.floor.entities_in(self.view):
+                if entity.type == EntityType.ENEMY:
+                    entity.ai_behavior()
+        self.time.tick()
+        self.map.update()
+        self.map.floor.explore(self.player.visible_bitmap)
+        self.keys.turn(self.time.time, self.map.state_hash)
+
+    def exit(self):
+        self.autosave.close()
+        self.keys.journal.close()
+        self.message_log.close()
+        for line in self.timer.report():
+            logger.debug(line)
+        super().exit()
 
     def terminal_update(self, is_active: bool = False) -> None:
+        if self.headless:
+            return
         if self.player.state == ActorState.DEAD:
+            self.autosave.close()
+            remove_save(SAVE_PATH)
             self.director.replace_scene(DeathScene())
         elif self.player.state == ActorState.VICTORIOUS:
+            self.autosave.close()
+            remove_save(SAVE_PATH)
             self.director.replace_scene(VictoryScene())
-        bearlib.clear()
-        with self.context.translate(self.relative_pos):
-            self.draw_tiles()
-            for entity in self.entities:
-                if isinstance(entity, Actor):
-                    if entity.state == ActorState.DEAD:
-                        self.entities.remove(entity)
-                        continue
-                if self.bounds.contains(entity.position + self.relative_pos):
-                    if self.player.visible_to(entity):
-                        entity.draw(self.context)
-            self.player.draw(self.context)
-            self.print_stats()
-            self.print_log()
-            self.print_gutter()
-            bearlib.refresh()
+        with self.timer.phase('draw'):
+            if self.text.stale:
+                bearlib.clear()
+                self.text.stale = False
+            else:
+                self.clear_view()
+            for entity in list(self.entities):
+                if isinstance(entity, Actor) and entity.state == ActorState.DEAD:
+                    self.entities.remove(entity)
+            if self.composer is None:
+                from chronotherium.compose import FrameComposer
+                self.composer = FrameComposer(self)
+            self.composer.draw()
+            with self.context.translate(self.relative_pos):
+                self.print_stats()
+                self.print_log()
+                self.print_gutter()
+                bearlib.refresh()
 
 
 class DeathScene(PrintScene):
@@ -0,0 +1,45 @@
+from typing import TYPE_CHECKING, List, Sequence
+
+import numpy as np
+from clubsandwich.geom import Point
+
+if TYPE_CHECKING:
+    from chronotherium.map import Floor
+
+
+class Spawns:
+
+    # Nothing spawns within this many cells of an excluded point, across or diagonally
+    CLEARANCE = 3
+
+    def __init__(self, floor: 'Floor', seed: int):
+        """
+        Picks spawn points on a floor. The open cells are found in one pass over the floor, and every spawn
+        point is drawn from them in one sample without replacement, so no two spawns share a cell and placing
+        a floor's worth of entities costs a pass over its cells rather than one per entity.
+
+        :param floor: Floor to spawn on
+
+        :param seed: Seed of the sample
+        """
+        self.floor = floor
+        self.open_cells = floor.open_array()
+        # Number of open cells, as Floor.get_open_tiles would count them
+        self.open_count = int(np.count_nonzero(self.open_cells))
+        self.generator = np.random.default_rng(seed)
+
+    def sample(self, count: int, exclude: Sequence[Point] = ()) -> List[Point]:
+        """
+        Returns count distinct open points in a random order, or every one there is if there are fewer
+
+        :param exclude: Points to keep CLEARANCE cells clear around, like stairs and the player's start
+        """
+        candidates = self.open_cells.copy()
+        clearance = self.CLEARANCE
+        for point in exclude:
+            candidates[max(point.y - clearance, 0):point.y + clearance + 1,
+                       max(point.x - clearance, 0):point.x + clearance + 1] = False
+        indices = np.flatnonzero(candidates)
+        chosen = self.generator.choice(indices, size=min(count, len(indices)), replace=False)
+        ys, xs = np.divmod(chosen, self.floor.width)
+        return [Point(x, y) for x, y in zip(xs.tolist(), ys.tolist())]
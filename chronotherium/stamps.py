@@ -0,0 +1,140 @@
+from functools import lru_cache
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+import os
+
+from clubsandwich.geom import Size
+
+from chronotherium.tiles.tile import KIND_CODES, Door, FloorTile, Orientation, Wall
+from chronotherium.window import RESOURCE_PATH, resource_path
+
+if TYPE_CHECKING:
+    import numpy as np
+
+VAULT_PATH = resource_path(os.path.join(RESOURCE_PATH, 'vaults.txt'))
+
+FLOOR = KIND_CODES[FloorTile, FloorTile.TERRAIN]
+DOOR = KIND_CODES[Door, Door.TERRAIN]
+WALLS = {orientation: KIND_CODES[Wall, orientation] for orientation in Orientation}
+
+# Kind code of each character of a vault file, None for a wall that faces the walls around it
+LEGEND: Dict[str, Optional[int]] = {'.': FLOOR, '+': DOOR, '#': None}
+LEGEND.update({chr(orientation.value): code for orientation, code in WALLS.items()})
+
+# Mask byte of a cell that is written, and of one that is left as it is
+WRITE = 0xFF
+KEEP = 0x00
+
+
+@lru_cache(maxsize=None)
+def room_stamp(width: int, height: int, floor: bool = True) -> Tuple[bytes, Optional[bytes]]:
+    """
+    Returns the kind codes and mask of a walled room, row by row, to be written with Floor.blit
+
+    :param floor: Whether the room has a floor. If not, only its walls are written.
+    """
+    inner = width - 2
+    top = bytes([WALLS[Orientation.TOP_LEFT]]) + bytes([WALLS[Orientation.HORIZONTAL]]) * inner + \
+        bytes([WALLS[Orientation.TOP_RIGHT]])
+    middle = bytes([WALLS[Orientation.VERTICAL]]) + bytes([FLOOR]) * inner + bytes([WALLS[Orientation.VERTICAL]])
+    bottom = bytes([WALLS[Orientation.BOTTOM_LEFT]]) + bytes([WALLS[Orientation.HORIZONTAL]]) * inner + \
+        bytes([WALLS[Orientation.BOTTOM_RIGHT]])
+    kinds = top + middle * (height - 2) + bottom
+    if floor:
+        return kinds, None
+    edge = bytes([WRITE]) * width
+    mask = edge + (bytes([WRITE]) + bytes([KEEP]) * inner + bytes([WRITE])) * (height - 2) + edge
+    return kinds, mask
+
+
+class Vault:
+
+    def __init__(self, name: str, rows: List[str]):
+        """
+        A prefab room, compiled from its rows in a vault file into the kind codes and mask Floor.blit writes
+
+        :param name: Name of the vault in the file
+
+        :param rows: The characters of the vault, row by row. Short rows are padded with spaces.
+        """
+        self.name = name
+        self.width = max(len(row) for row in rows)
+        self.height = len(rows)
+        self.size = Size(self.width, self.height)
+        rows = [row.ljust(self.width) for row in rows]
+
+        kinds = bytearray(self.width * self.height)
+        mask = bytearray(self.width * self.height)
+        walls = []
+        for y, row in enumerate(rows):
+            for x, char in enumerate(row):
+                if char == ' ':
+                    continue
+                if char not in LEGEND:
+                    raise ValueError(f"Vault {name} has an unknown character {char!r} at ({x}, {y})")
+                if LEGEND[char] is None:
+                    walls.append(y * self.width + x)
+                else:
+                    kinds[y * self.width + x] = LEGEND[char]
+                mask[y * self.width + x] = WRITE
+        if walls:
+            # Walls join up with the walls and doors next to them
+            import numpy as np
+
+            joins = np.array([char != ' ' and LEGEND[char] != FLOOR for row in rows for char in row], dtype=bool)
+            codes = wall_codes(joins.reshape(self.height, self.width)).ravel()
+            for index in walls:
+                kinds[index] = codes[index]
+        self.kinds = bytes(kinds)
+        self.mask = bytes(mask) if KEEP in mask else None
+
+
+def wall_codes(walls: 'np.ndarray') -> 'np.ndarray':
+    """
+    Returns the kind code of a wall at every set cell, facing the set cells next to it, and 0 at every other cell
+
+    :param walls: Whether each cell is a wall or something walls join up with, like a door, shape (height, width)
+    """
+    import numpy as np
+
+    padded = np.zeros((walls.shape[0] + 2, walls.shape[1] + 2), dtype=bool)
+    padded[1:-1, 1:-1] = walls
+    north, south = padded[:-2, 1:-1], padded[2:, 1:-1]
+    west, east = padded[1:-1, :-2], padded[1:-1, 2:]
+    vertical = north | south
+    orientation = np.select(
+        [east & west, vertical & east & south, vertical & east, vertical & west & south, vertical & west,
+         vertical, east | west],
+        [WALLS[Orientation.HORIZONTAL], WALLS[Orientation.TOP_LEFT], WALLS[Orientation.BOTTOM_LEFT],
+         WALLS[Orientation.TOP_RIGHT], WALLS[Orientation.BOTTOM_RIGHT], WALLS[Orientation.VERTICAL],
+         WALLS[Orientation.HORIZONTAL]],
+        WALLS[Orientation.VERTICAL])
+    return np.where(walls, orientation, 0).astype(np.uint8)
+
+
+def load_vaults(path: str = VAULT_PATH) -> List[Vault]:
+    vaults = []
+    name = None
+    rows = []
+    with open(path, encoding='utf-8') as file:
+        for line in file:
+            line = line.rstrip('\n')
+            if line.startswith(';'):
+                continue
+            if line.startswith('='):
+                if name is not None and rows:
+                    vaults.append(Vault(name, rows))
+                name = line[1:].strip()
+                rows = []
+            elif name is not None and line.strip():
+                rows.append(line.rstrip())
+    if name is not None and rows:
+        vaults.append(Vault(name, rows))
+    return vaults
+
+
+@lru_cache(maxsize=None)
+def vault_library() -> Tuple[Vault, ...]:
+    """
+    Returns the vaults of the vault file, loaded the first time they are asked for
+    """
+    return tuple(load_vaults())
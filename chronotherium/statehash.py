@@ -0,0 +1,103 @@
+"""
+Zobrist style hashing of the game state. Every cell, open door and entity has a 64 bit key made from what it
+is and where, and a floor's hash is the XOR of the keys of everything on it. A change swaps one key for another
+with two XORs, so the hash is kept up to date as the game is played rather than worked out from scratch.
+"""
+from functools import lru_cache
+from typing import TYPE_CHECKING
+import zlib
+
+if TYPE_CHECKING:
+    import numpy as np
+
+MASK = (1 << 64) - 1
+# Salts keeping the keys of each kind of state apart
+TERRAIN = 0x5D2E1A6B3C4F7089
+DOOR = 0x1F83D9ABFB41BD6B
+ENTITY = 0x6A09E667F3BCC908
+FLOOR = 0x3C6EF372FE94F82B
+CURRENT = 0x510E527FADE682D1
+
+
+def mix(value: int) -> int:
+    """
+    Scrambles a 64 bit value with the splitmix64 finaliser, so that keys made from nearby values share no bits
+    """
+    value = (value + 0x9E3779B97F4A7C15) & MASK
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & MASK
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & MASK
+    return value ^ (value >> 31)
+
+
+def mix_array(values: 'np.ndarray') -> 'np.ndarray':
+    """
+    Scrambles every value of an array of 64 bit values the same way mix does
+    """
+    import numpy as np
+
+    values = values.astype(np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+    values = (values ^ (values >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    values = (values ^ (values >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return values ^ (values >> np.uint64(31))
+
+
+def cell_key(index: int, code: int) -> int:
+    """
+    Returns the key of a cell holding a kind of tile. Empty cells have no key, so a floor starts out hashing to 0.
+
+    :param index: Floor index of the cell, y * width + x
+
+    :param code: Kind code of the tile
+    """
+    return mix(TERRAIN ^ (index << 8 | code)) if code else 0
+
+
+def cells_key(indices: 'np.ndarray', codes: 'np.ndarray') -> int:
+    """
+    Returns the keys of many cells at once, folded together
+
+    :param indices: Floor index of every cell
+
+    :param codes: Kind code of every cell
+    """
+    import numpy as np
+
+    filled = codes != 0
+    keys = mix_array(np.uint64(TERRAIN) ^ (indices[filled].astype(np.uint64) << np.uint64(8) |
+                                           codes[filled].astype(np.uint64)))
+    return int(np.bitwise_xor.reduce(keys)) if len(keys) else 0
+
+
+def door_key(index: int) -> int:
+    """
+    Returns the key of an open door
+    """
+    return mix(DOOR ^ index)
+
+
+@lru_cache(maxsize=None)
+def kind_id(kind: type) -> int:
+    return zlib.crc32(kind.__name__.encode('ascii'))
+
+
+def entity_key(kind: type, x: int, y: int, hp: int = 0, tp: int = 0, serial: int = 0) -> int:
+    """
+    Returns the key of an entity of a kind standing at (x, y) with the given HP and TP. The entity's serial goes
+    into the key too, so that two entities alike in everything else don't cancel each other out.
+    """
+    state = x & 0xFFFF | (y & 0xFFFF) << 16 | (hp & 0xFFFF) << 32 | (tp & 0xFFFF) << 48
+    return mix(mix(mix(ENTITY ^ kind_id(kind)) ^ serial) ^ state)
+
+
+def floor_key(index: int, floor_hash: int) -> int:
+    """
+    Returns the key of a whole floor, so that two floors with the same cells and entities don't cancel out
+    """
+    return mix(mix(FLOOR ^ index) ^ floor_hash)
+
+
+def current_key(index: int) -> int:
+    """
+    Returns the key of the player being on a floor
+    """
+    return mix(CURRENT ^ index)
@@ -0,0 +1,80 @@
+from typing import Dict, Tuple
+
+from bearlibterminal import terminal as bearlib
+
+from chronotherium.window import Window
+
+# A laid out string: the cell, pixel offset and character code of each of its characters
+Run = Tuple[Tuple[int, int, int], ...]
+
+
+class TextCache:
+
+    # Number of laid out strings kept
+    SIZE = 512
+
+    def __init__(self, window: Window):
+        """
+        Lays out the strings PrintScene.pprint draws once, and remembers which string was last drawn at each
+        position in which colour, so that redrawing a line that hasn't changed costs nothing.
+
+        :param window: Window the text is drawn in
+        """
+        self.width = window.width
+        self.cell_width = window.cell_width
+        self._runs: Dict[Tuple[int, str], Run] = {}
+        self._lines: Dict[Tuple[int, int], Tuple[str, int, Run]] = {}
+        # Whether the screen holds something other than the lines drawn since the last invalidate
+        self.stale = True
+
+    def run(self, x: int, string: str) -> Run:
+        """
+        Returns the layout of string printed from column x: characters are half a cell wide, and those that
+        would run past the right edge are drawn from x with a positive offset instead.
+        """
+        key = (x, string)
+        run = self._runs.get(key)
+        if run is None:
+            glyphs = []
+            pos = x
+            for c in string:
+                if pos >= self.width - x - 1:
+                    pos = pos + 1
+                    glyphs.append((x, int((pos - x) * (self.cell_width / 2)), ord(c)))
+                else:
+                    pos = pos + 1
+                    glyphs.append((pos, int(0 - pos * (self.cell_width / 2)), ord(c)))
+            run = tuple(glyphs)
+            if len(self._runs) >= self.SIZE:
+                del self._runs[next(iter(self._runs))]
+            self._runs[key] = run
+        return run
+
+    def draw(self, x: int, y: int, string: str, color: int):
+        """
+        Draws string at (x, y) on layer 1 unless it is already there in the same colour, clearing the line it
+        replaces first.
+        """
+        drawn = self._lines.get((x, y))
+        if drawn is not None and drawn[0] == string and drawn[1] == color:
+            return
+        run = self.run(x, string)
+
+        bearlib.layer(1)
+        if drawn is not None and drawn[2]:
+            right = max(cell for cell, _, _ in drawn[2])
+            bearlib.clear_area(x, y, right - x + 1, 1)
+        bearlib.composition(bearlib.TK_ON)
+        put_ext = bearlib.put_ext
+        for cell, offset, code in run:
+            put_ext(cell, y, offset, 0, code)
+        bearlib.layer(0)
+        bearlib.composition(bearlib.TK_OFF)
+        self._lines[x, y] = (string, color, run)
+
+    def invalidate(self):
+        """
+        Forgets what is on screen, after it was cleared or drawn over
+        """
+        self._lines = {}
+        self.stale = True
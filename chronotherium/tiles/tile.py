@@ -2,13 +2,14 @@ from clubsandwich.tilemap import Cell
 from clubsandwich.geom import Point
 from clubsandwich.blt.context import BearLibTerminalContext as Context
 
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Dict, List, Sequence, Tuple
 from enum import Enum
 from abc import ABC
 
-from chronotherium.window import Window, Color
+from chronotherium.window import Color, FG_COLOR
 
 if TYPE_CHECKING:
+    from chronotherium.entities.entity import Entity
     from chronotherium.map import Floor
 
 
@@ -31,29 +32,37 @@ class Orientation(Enum):
 
 
 class Tile(Cell, ABC):
+    """
+    A cell of a floor. Tiles are flyweights: everything about a kind of tile is a class constant and an instance
+    only knows its point and floor. Floors store the kind of every cell as a code into KINDS and make a tile when
+    one is asked for. What changes during play, like who is standing on a cell or whether a door is open, is kept
+    by the floor for only the cells that have any.
+    """
+    __slots__ = ('point', '_floor', 'terrain')
+
     COLOR = None
     OPEN = True
     BLOCK_SIGHT = False
     BLOCK = False
     TERRAIN = None
-
-    window = Window()
+    # Whether every tile of this kind has state of its own, so that the floor keeps the tile itself
+    FEATURE = False
 
     def __init__(self, point: Point):
-        super().__init__(point)
-        self._block = self.BLOCK
-        self._block_sight = self.BLOCK_SIGHT
-        self.color = self.COLOR if self.COLOR is not None else self.window.fg_color
-        self._open = self.OPEN
+        self.point = point
         self.terrain = self.TERRAIN
         self._floor = None
 
-        self.entities = []
+    def __eq__(self, other):
+        return type(other) is type(self) and other.point == self.point and other._floor is self._floor
+
+    def __hash__(self):
+        return hash(self.point)
 
-    def draw_tile(self, context: Context):
-        context.color(self.color)
+    def draw_tile(self, context: Context, color: int = None):
+        context.color(color if color is not None else self.color)
         context.put(self.point, self.glyph)
-        context.color(self.window.fg_color)
+        context.color(FG_COLOR)
 
     @property
     def floor(self):
@@ -63,31 +72,61 @@ class Tile(Cell, ABC):
     def floor(self, value: 'Floor'):
         self._floor = value
 
+    @property
+    def kind(self) -> int:
+        return KIND_CODES[type(self), self.terrain]
+
+    @property
+    def color(self):
+        return self.COLOR if self.COLOR is not None else FG_COLOR
+
     @property
     def glyph(self):
         return self.terrain.value
 
+    @property
+    def entities(self) -> Sequence['Entity']:
+        """
+        The entities standing on this tile. Read only, entities join and leave a tile through its floor.
+        """
+        if self._floor is None:
+            return ()
+        return self._floor.occupants_at(self.point)
+
     @property
     def block(self):
-        return self._block or any(entity.blocking for entity in self.entities)
+        return self.BLOCK or any(entity.blocking for entity in self.entities)
 
     @property
     def block_sight(self):
-        return self._block_sight
+        return self.BLOCK_SIGHT
 
     @property
     def occupied(self):
         return len(self.entities) > 0
 
+    @property
+    def walkable(self):
+        """
+        Whether actors can ever path through this tile, ignoring whoever is standing on it
+        """
+        return self.kind_walkable()
+
+    @classmethod
+    def kind_walkable(cls) -> bool:
+        return not cls.BLOCK
+
     @property
     def open(self):
-        return self._open or not self.block
+        return self.OPEN or not self.block
 
     def interact(self):
         pass
 
 
 class Empty(Tile):
+    __slots__ = ()
+
     OPEN = False
     BLOCK = True
     BLOCK_SIGHT = True
@@ -95,11 +134,16 @@ class Empty(Tile):
 
 
 class FloorTile(Tile):
+    __slots__ = ()
+
     TERRAIN = Terrain.FLOOR
 
 
 class Stairs(Tile, ABC):
+    __slots__ = ('dest_tile', '_dest_floor_index', '_floor_index')
+
     OPEN = False
+    FEATURE = True
 
     def __init__(self, point: Point):
         super().__init__(point)
@@ -124,14 +168,20 @@ class Stairs(Tile, ABC):
 
 
 class StairsUp(Stairs):
+    __slots__ = ()
+
     TERRAIN = Terrain.STAIRS_UP
 
 
 class StairsDown(Stairs):
+    __slots__ = ()
+
     TERRAIN = Terrain.STAIRS_DOWN
 
 
 class Wall(Tile):
+    __slots__ = ()
+
     COLOR = Color.CYAN
     OPEN = False
     BLOCK = True
@@ -143,35 +193,45 @@ class Wall(Tile):
 
 
 class Door(Tile):
+    __slots__ = ()
+
     COLOR = Color.CYAN
     OPEN = False
     BLOCK = True
     BLOCK_SIGHT = True
     TERRAIN = Terrain.DOOR
 
-    def __init__(self, point):
-        super().__init__(point)
-        self._door_open = False
-
     def interact(self):
         if not self.occupied:
-            self._door_open = False if self._door_open else True
-            self._block = False if self._door_open else True
+            self._floor.set_door_open(self.point, not self.door_open)
             return True
         return False
 
     @property
     def glyph(self):
-        return Terrain.DOOR_OPEN.value if self._door_open else Terrain.DOOR.value
+        return Terrain.DOOR_OPEN.value if self.door_open else Terrain.DOOR.value
 
     @property
     def block(self):
-        return self._block or any(entity.blocking for entity in self.entities)
+        return not self.door_open or any(entity.blocking for entity in self.entities)
 
     @property
     def block_sight(self):
-        return self._block
+        return not self.door_open
+
+    @classmethod
+    def kind_walkable(cls) -> bool:
+        # Closed doors are opened by walking into them
+        return True
 
     @property
     def door_open(self):
-        return self._door_open
+        return self._floor is not None and self._floor.door_open(self.point)
+
+
+# Every kind of tile, by the code floors store for it. Code 0 is the Empty a new floor is filled with. Codes
+# are kept in saves and generator tables, so only ever append to this list.
+KINDS: List[Tuple[type, Enum]] = [(Empty, Terrain.EMPTY), (FloorTile, Terrain.FLOOR), (StairsUp, Terrain.STAIRS_UP),
+                                  (StairsDown, Terrain.STAIRS_DOWN), (Door, Terrain.DOOR)] + \
+                                 [(Wall, orientation) for orientation in Orientation]
+KIND_CODES: Dict[Tuple[type, Enum], int] = {kind: code for code, kind in enumerate(KINDS)}
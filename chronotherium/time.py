@@ -2,17 +2,13 @@ class Time:
 
     MAX_RECORD = 10
 
-    __instance = None
+    def __init__(self, tick: int = 0):
+        """
+        The clock of a single game. Each game scene owns one and hands it to its map, entities and input handler.
 
-    def __new__(cls):
-        if cls.__instance is None:
-            new_window = super().__new__(cls)
-            new_window.__init()
-            cls.__instance = new_window
-        return cls.__instance
-
-    def __init(self):
-        self._time = 0
+        :param tick: Tick to start counting from
+        """
+        self._time = tick
 
     @property
     def time(self):
@@ -0,0 +1,48 @@
+from contextlib import contextmanager
+from threading import Lock
+from time import perf_counter
+from typing import Dict, List
+
+
+class PhaseStats:
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+
+class PhaseTimer:
+
+    def __init__(self):
+        """
+        Accumulates how much wall time each phase of a turn takes. Phases may be timed from any thread.
+        """
+        self.phases: Dict[str, PhaseStats] = {}
+        self._lock = Lock()
+
+    @contextmanager
+    def phase(self, name: str):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, perf_counter() - start)
+
+    def record(self, name: str, seconds: float):
+        with self._lock:
+            stats = self.phases.get(name)
+            if stats is None:
+                stats = self.phases[name] = PhaseStats()
+            stats.count += 1
+            stats.total += seconds
+            stats.max = max(stats.max, seconds)
+
+    def report(self) -> List[str]:
+        with self._lock:
+            return [f'{name}: {stats.count} x {stats.mean * 1000:.3f} ms (max {stats.max * 1000:.3f} ms, '
+                    f'total {stats.total:.3f} s)' for name, stats in self.phases.items()]
@@ -0,0 +1,201 @@
+"""
+Seed sweep. Generates the whole map of every seed in a range across a pool of worker processes and checks
+that each of them can be played through. Run it with
+
+    python -m chronotherium.validate [--seeds START:STOP] [--workers N] [--size WIDTHxHEIGHT]
+
+A map passes when
+- every floor has the stairs it needs and they are in the same walkable component, as is the player start
+- the Chronotherium can be reached from the stairs down to its floor
+- Map.closest_open_point finds a point next to every staircase, where rewinding may displace the player
+- every floor has the number of enemies of each kind Map.enemy_counts gives for its open tiles
+- a game saved after taking the stairs up to a floor past the first loads back in the same state. The floor is
+  picked by the seed, so a range of seeds covers every floor. Only checked at the default floor size.
+
+It prints the seeds that fail with the reason, percentiles of the time each floor took to generate, and
+exits with a non-zero status if any seed failed.
+"""
+from argparse import ArgumentParser
+from collections import Counter
+from functools import partial
+from multiprocessing import Pool
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from typing import List, Optional, Tuple
+import os
+import sys
+
+from clubsandwich.geom import Point, Size
+from clubsandwich.tilemap import CellOutOfBoundsError
+
+from chronotherium.entities.chronotherium import Chronotherium
+from chronotherium.entities.entity import Enemy
+from chronotherium.map import Floor, Map
+from chronotherium.pathing import DistanceMap
+from chronotherium.rand import RNG
+from chronotherium.time import Time
+
+
+PERCENTILES = [50, 90, 99, 100]
+# Failures listed per check, the rest are only counted
+SHOWN = 10
+
+
+def reachable(floor: Floor, start: Point, goal: Point) -> bool:
+    return DistanceMap(floor, [goal]).distance(start) != DistanceMap.UNREACHABLE
+
+
+def check(seed: int, floor_size: Optional[Size] = None) -> Tuple[int, List[Tuple[str, str]], List[float]]:
+    """
+    Generates the map of seed and checks it.
+
+    :param floor_size: Size of the floors, Map.FLOOR_SIZE if not given
+
+    :return: The seed, the (check, reason) of every failure and the time each floor took to generate
+    """
+    try:
+        game_map = Map(None, Time(), RNG(seed), floor_size=floor_size)
+    except Exception as err:
+        return seed, [('generation', f'{type(err).__name__}: {err}')], []
+
+    failures = []
+    floors = [game_map.get_floor(index) for index in range(0, game_map.FLOORS)]
+    last = len(floors) - 1
+    for index, floor in enumerate(floors):
+        if index < last and floor.stairs_up is None:
+            failures.append(('stairs', f'floor {index} has no stairs up'))
+        if index > 0 and floor.stairs_down is None:
+            failures.append(('stairs', f'floor {index} has no stairs down'))
+    if failures:
+        return seed, failures, [floor.generate_time for floor in floors]
+
+    player = game_map.player.position
+    if not reachable(floors[0], player, floors[0].stairs_up.point):
+        failures.append(('stairs', f'floor 0: player start {player} cannot reach the stairs up'))
+    for index in range(1, last):
+        floor = floors[index]
+        if not reachable(floor, floor.stairs_down.point, floor.stairs_up.point):
+            failures.append(('stairs', f'floor {index}: stairs down cannot reach the stairs up'))
+
+    boss = next((entity for entity in floors[last].entities if isinstance(entity, Chronotherium)), None)
+    if boss is None:
+        failures.append(('chronotherium', f'floor {last} has no Chronotherium'))
+    elif not reachable(floors[last], floors[last].stairs_down.point, boss.position):
+        failures.append(('chronotherium', f'the Chronotherium at {boss.position} cannot be reached'))
+
+    for index, floor in enumerate(floors):
+        game_map.move_floors(floor)
+        for stairs in (floor.stairs_up, floor.stairs_down):
+            if stairs is None:
+                continue
+            try:
+                found = game_map.closest_open_point(stairs.point)
+            except (RecursionError, CellOutOfBoundsError) as err:
+                failures.append(('closest_open_point', f'floor {index}, {stairs.point}: {type(err).__name__}'))
+                continue
+            if found is None:
+                failures.append(('closest_open_point', f'floor {index}, {stairs.point}: nothing found'))
+    game_map.move_floors(floors[0])
+
+    for index, floor in enumerate(floors):
+        counts = Counter(type(entity) for entity in floor.entities
+                         if isinstance(entity, Enemy) and not isinstance(entity, Chronotherium))
+        for kind, expected in Map.enemy_counts(floor.open_count).items():
+            if counts[kind] != expected:
+                failures.append(('enemies', f'floor {index} has {counts[kind]} {kind.NAME}, expected {expected}'))
+
+    if floor_size is None:
+        failures.extend(check_save(seed))
+
+    return seed, failures, [floor.generate_time for floor in floors]
+
+
+def check_save(seed: int) -> List[Tuple[str, str]]:
+    """
+    Plays the game of seed up the stairs to a floor past the first, saves it and loads it back
+
+    :return: The (check, reason) of every failure
+    """
+    from chronotherium.env import ActionSource
+    from chronotherium.journal import Journal
+    from chronotherium.save import SavedGame, write_save
+    from chronotherium.scene import GameScene
+
+    target = seed % (Map.FLOORS - 1) + 1
+    try:
+        scene = GameScene(seed=seed, keys=ActionSource(Journal(seed)), headless=True)
+        player = scene.player
+        while scene.map.current_floor < target:
+            player.unblock()
+            player.position = scene.map.floor.stairs_up.point
+            player.update_block()
+            if not scene.input.stairs():
+                return [('save', f'floor {scene.map.current_floor}: the stairs up could not be taken')]
+            scene.run_turn()
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'validate.sav')
+            write_save(scene, path)
+            loaded = GameScene(save=SavedGame(path), keys=ActionSource(Journal(seed)), headless=True)
+    except Exception as err:
+        return [('save', f'floor {target}: {type(err).__name__}: {err}')]
+
+    failures = []
+    if loaded.map.current_floor != target or loaded.player.position != player.position:
+        failures.append(('save', f'saved on floor {target} at {player.position}, loaded on floor '
+                                 f'{loaded.map.current_floor} at {loaded.player.position}'))
+    if loaded.map.state_hash != scene.map.state_hash:
+        failures.append(('save', f'floor {target}: the loaded game hashes differently from the saved one'))
+    return failures
+
+
+def percentile(values: List[float], percent: int) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(percent / 100 * len(ordered)) - 1))]
+
+
+def seed_range(value: str) -> range:
+    start, _, stop = value.partition(':')
+    return range(int(start), int(stop)) if stop else range(0, int(start))
+
+
+def floor_size(value: str) -> Size:
+    width, _, height = value.partition('x')
+    return Size(int(width), int(height or width))
+
+
+def main() -> int:
+    parser = ArgumentParser(description='Generate the maps of a range of seeds and check they can be played')
+    parser.add_argument('--seeds', type=seed_range, default=range(0, 1000),
+                        help='Seeds to check, as START:STOP or a count starting from 0')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Worker processes')
+    parser.add_argument('--size', type=floor_size, default=None, help='Size of the floors, as WIDTHxHEIGHT')
+    args = parser.parse_args()
+
+    start = perf_counter()
+    failures = {}
+    failed = set()
+    times = []
+    with Pool(args.workers) as pool:
+        chunksize = max(1, len(args.seeds) // (args.workers * 16))
+        for seed, seed_failures, seed_times in pool.imap_unordered(partial(check, floor_size=args.size), args.seeds,
+                                                                   chunksize):
+            times.extend(seed_times)
+            for name, reason in seed_failures:
+                failures.setdefault(name, []).append((seed, reason))
+                failed.add(seed)
+    elapsed = perf_counter() - start
+
+    for name, listed in sorted(failures.items()):
+        listed.sort()
+        print(f'{name}: {len(listed)} failures')
+        for seed, reason in listed[:SHOWN]:
+            print(f'  seed {seed}: {reason}')
+    print(f'{len(args.seeds)} seeds checked in {elapsed:.1f} s with {args.workers} workers, {len(failed)} failed')
+    if times:
+        print('Floor generation: ' + ', '.join(f'p{percent} {percentile(times, percent) * 1000:.1f} ms'
+                                               for percent in PERCENTILES))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -51,6 +51,8 @@ FONT_SIZE = '18x18'
 CELL_SIZE = '20x20'
 FG_COLOR = Color.BASE1
 BG_COLOR = Color.BASE03
+# Color of tiles that have been seen but are out of sight
+REMEMBERED_COLOR = Color.BASE01
 # Option to draw UI rectangles
 RECTANGLES = False
 MAP_SIZE = Size(30, 30)
@@ -87,6 +89,9 @@ class Window:
         self.symbol_font = SYMBOLA_FONT
         self.title = TITLE
         self.cell_size = CELL_SIZE
+        cell_width, cell_height = CELL_SIZE.split('x')
+        self.cell_width = int(cell_width)
+        self.cell_height = int(cell_height)
         self.spacing = SPACING
         self.fg_color = FG_COLOR
         self.bg_color = BG_COLOR
@@ -96,11 +101,13 @@ class Window:
                           f'font: {self.font}, size={self.font_size}, align=center, spacing={self.spacing}; ' \
                           f'window: size={self.dimensions} title={self.title}, cellsize={self.cell_size}; ' \
                           f'input: filter=[arrow, keypad, keyboard, system]'
-        self.start()
         self.bearlib = bearlib
 
     def start(self):
-        bearlib.open()
+        """
+        Configures the terminal. Call this once the terminal has been opened; constructing the window doesn't
+        touch the terminal.
+        """
         bearlib.color(self.fg_color)
         bearlib.bkcolor(self.bg_color)
         bearlib.set(self.config_str)
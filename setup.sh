@@ -13,6 +13,12 @@ if [[ ! $( pip3 show bearlibterminal ) ]]; then
   sudo -H pip3 install bearlibterminal
 fi
 
+# Install numpy
+if [[ ! $( pip3 show numpy ) ]]; then
+  echo "Installing numpy..."
+  sudo -H pip3 install numpy
+fi
+
 # Install bearlibterminal
 if [[ ! $( pip3 show pyinstaller ) ]]; then
   echo "Installing bearlibterminal..."